@@ -114,6 +114,7 @@ class ArticleCategoryAdmin(admin.ModelAdmin):
 class BookCategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "parent")
     list_filter = ("parent",)
+    list_select_related = ("parent",)
     search_fields = ("name",)
 
 
@@ -121,6 +122,7 @@ class BookCategoryAdmin(admin.ModelAdmin):
 class DissertationCategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "parent")
     list_filter = ("parent",)
+    list_select_related = ("parent",)
     search_fields = ("name",)
 
 
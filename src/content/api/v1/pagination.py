@@ -0,0 +1,151 @@
+"""
+Pagination for content list endpoints.
+
+Page-number pagination stays the default. Sending ``cursor`` (empty for the
+first page) switches to keyset pagination: each page continues strictly
+after the ``(sort value, id)`` of the previous page's last item, so page N
+costs the same indexed range scan as page 1 and no COUNT is run. Both
+modes accept ``ordering`` from ``orderings``; ties are broken on ``-id``.
+
+Page-number counts come from ``utils.counts`` (cached, or a planner
+estimate for large results, flagged by ``count_approximate``).
+"""
+
+import base64
+import binascii
+import json
+from datetime import date
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from content.utils import counts
+
+
+class CountCachingPaginator(Paginator):
+    """Paginator whose count is cached or estimated (see ``utils.counts``)."""
+
+    approximate = False
+
+    @cached_property
+    def count(self):
+        count, self.approximate = counts.get_count(self.object_list)
+        return count
+
+
+class ContentPagination(PageNumberPagination):
+    django_paginator_class = CountCachingPaginator
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    orderings = ("-id", "-views", "-publication_date", "-average_rating")
+    default_ordering = "-id"
+    invalid_cursor_message = "Invalid cursor"
+    # Type of the cursor value of each ordering field
+    cursor_types = {
+        "id": int,
+        "views": int,
+        "average_rating": float,
+        "publication_date": date.fromisoformat,
+    }
+
+    def get_ordering(self, request, queryset):
+        """Requested ordering if allowed for the model, else ``-id``."""
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering not in self.orderings:
+            return self.default_ordering
+        field_names = {field.name for field in queryset.model._meta.get_fields()}
+        if ordering.lstrip("-") not in field_names:
+            return self.default_ordering
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset)
+        self.sort_field = self.ordering.lstrip("-")
+        if self.sort_field == "id":
+            queryset = queryset.order_by("-id")
+        else:
+            queryset = queryset.order_by(self.ordering, "-id")
+
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.filter_after(queryset, *position)
+
+        # One extra row tells whether there is a next page, without a COUNT
+        rows = list(queryset[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def filter_after(self, queryset, value, pk):
+        """Rows strictly after ``(value, pk)`` in descending order."""
+        if self.sort_field == "id":
+            return queryset.filter(pk__lt=pk)
+        field = self.sort_field
+        # The redundant `<=` bound keeps the scan on the composite index
+        return queryset.filter(**{f"{field}__lte": value}).filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "pk__lt": pk})
+        )
+
+    def encode_cursor(self, obj):
+        value = getattr(obj, self.sort_field)
+        if isinstance(value, date):
+            value = value.isoformat()
+        raw = json.dumps([self.ordering, value, obj.pk]).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request):
+        """Return ``(value, pk)`` of the cursor, or None for the first page."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token.encode())
+            ordering, value, pk = json.loads(raw)
+            if ordering != self.ordering:
+                raise ValueError("cursor belongs to another ordering")
+            # Checked here: a bad value would only fail inside the query
+            return self.cursor_types[self.sort_field](value), int(pk)
+        except (binascii.Error, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or self.last is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            response = super().get_paginated_response(data)
+            response.data["count_approximate"] = self.page.paginator.approximate
+            return response
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class TrendingPagination(PageNumberPagination):
+    """Pages of the precomputed trending ranking, with a cached count."""
+
+    django_paginator_class = CountCachingPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_approximate"] = self.page.paginator.approximate
+        return response
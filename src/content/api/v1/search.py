@@ -5,20 +5,37 @@ Search functionality for API v1 with improved error handling.
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
-from elasticsearch import Elasticsearch
+from django.http import JsonResponse
+from django.views import View
 import logging
 from datetime import datetime
+from content import bookmarks, search_cache, search_utils
+from content.authentication.authentication import JWTAuthenticationNoBearerRequired
+from content.utils import local_cache
 
 logger = logging.getLogger(__name__)
 
+UNAVAILABLE_ERROR = {
+    "error": "Search service temporarily unavailable",
+    "message": "Please try again later",
+}
+SEARCH_ERROR = {
+    "error": "Search error occurred",
+    "message": "An error occurred while searching. Please try again.",
+}
+
+
+class SearchUnavailable(Exception):
+    """Elasticsearch did not answer the health check"""
+
 
 class ElasticsearchClient:
     """Singleton pattern for Elasticsearch client"""
 
     _instance = None
-    _client = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -26,20 +43,13 @@ class ElasticsearchClient:
         return cls._instance
 
     def get_client(self):
-        """Get or create Elasticsearch client"""
-        if self._client is None:
-            try:
-                es_url = settings.ELASTICSEARCH_DSL["default"]["hosts"]
-                self._client = Elasticsearch(es_url, timeout=30)
-            except Exception as e:
-                logger.error(f"Failed to create Elasticsearch client: {e}")
-                self._client = None
-        return self._client
+        """Get the shared Elasticsearch client"""
+        return search_utils.get_es_client()
 
     def ping(self):
         """Check if Elasticsearch is available"""
         cache_key = "es_ping_ok"
-        cached = cache.get(cache_key)
+        cached = local_cache.get(cache_key)
         if cached is not None:
             return cached
 
@@ -49,7 +59,7 @@ class ElasticsearchClient:
         except Exception:
             ok = False
 
-        cache.set(cache_key, ok, 5)
+        local_cache.set(cache_key, ok, 5, publish=False)
         return ok
 
 
@@ -61,290 +71,346 @@ class ContentSearchView(APIView):
     Full-text search across all content types using Elasticsearch.
     Implements caching and proper error handling.
     """
+
     throttle_classes = []  # Explicitly disable throttling for search
 
     def get(self, request):
         """Handle search requests"""
         q = request.query_params.get("q", "").strip()
-        page = max(int(request.query_params.get("page", 1)), 1)
+        page = parse_page(request.query_params)
         page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
-        from_ = (page - 1) * page_size
 
-        # Check cache first
         try:
-            version = int(cache.get("content_cache_version") or 0)
-        except Exception:
-            version = 0
+            resp_data = search_cache.get_or_compute(
+                request.query_params,
+                lambda: self._search(request.query_params, q, page, page_size),
+            )
+        except SearchUnavailable:
+            return Response(
+                UNAVAILABLE_ERROR, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except Exception as e:
+            logger.error(f"Elasticsearch search error: {e}")
+            return Response(SEARCH_ERROR, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        cache_key = f"search:v{version}:{request.get_full_path()}"
-        cached = cache.get(cache_key)
-        if cached is not None:
-            return Response(cached)
+        return Response(bookmarks.overlay(resp_data, request.user))
 
-        # Check Elasticsearch availability
+    def _search(self, params, q, page, page_size):
+        """Run the search against Elasticsearch (called on cache miss)"""
         client = es_client.get_client()
         if not es_client.ping():
-            return Response(
-                {
-                    "error": "Search service temporarily unavailable",
-                    "message": "Please try again later",
-                },
-                status=status.HTTP_503_SERVICE_UNAVAILABLE,
-            )
+            raise SearchUnavailable()
+
+        body = build_search_body(params, q, (page - 1) * page_size, page_size)
+        response = client.search(index="articles,books,dissertations", body=body)
+        return build_response_data(response, q, page, page_size)
+
 
-        # Build search query
-        body = self._build_search_body(request, q, from_, page_size)
+class ContentSearchAsyncView(View):
+    """
+    Async variant of ContentSearchView for ASGI workers.
+
+    Accepts the same parameters and returns the same payload, but awaits
+    the cache and Elasticsearch round-trips instead of holding a worker
+    thread for them.
+    """
+
+    async def get(self, request):
+        """Handle search requests"""
+        q = request.GET.get("q", "").strip()
+        page = parse_page(request.GET)
+        page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
 
-        # Execute search
         try:
-            response = client.search(index="articles,books,dissertations", body=body)
+            resp_data = await search_cache.aget_or_compute(
+                request.GET, lambda: self._search(request.GET, q, page, page_size)
+            )
+        except SearchUnavailable:
+            return JsonResponse(
+                UNAVAILABLE_ERROR, status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except Exception as e:
             logger.error(f"Elasticsearch search error: {e}")
-            return Response(
-                {
-                    "error": "Search error occurred",
-                    "message": "An error occurred while searching. Please try again.",
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            return JsonResponse(
+                SEARCH_ERROR, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        # Process results
-        results = self._process_results(response)
+        resp_data = await sync_to_async(self._apply_bookmarks)(request, resp_data)
+        return JsonResponse(resp_data)
 
-        resp_data = {
-            "count": response["hits"]["total"]["value"],
-            "page": page,
-            "page_size": page_size,
-            "has_next": len(results) == page_size,
-            "results": results,
-            "query": q,
-        }
+    @staticmethod
+    def _apply_bookmarks(request, data):
+        """Add is_bookmarked for the JWT user (plain Django views skip DRF auth)"""
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            auth = JWTAuthenticationNoBearerRequired().authenticate(request)
+            user = auth[0] if auth else None
+        return bookmarks.overlay(data, user)
+
+    async def _search(self, params, q, page, page_size):
+        """Run the search against Elasticsearch (called on cache miss)"""
+        client = search_utils.get_async_es_client()
+        if not await self._ping(client):
+            raise SearchUnavailable()
+
+        body = build_search_body(params, q, (page - 1) * page_size, page_size)
+        response = await client.search(index="articles,books,dissertations", body=body)
+        return build_response_data(response, q, page, page_size)
+
+    @staticmethod
+    async def _ping(client):
+        """Check if Elasticsearch is available (shares the sync ping cache)"""
+        cache_key = "es_ping_ok"
+        found, generation = local_cache.get_local_many([cache_key])
+        cached = found.get(cache_key)
+        if cached is None:
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                local_cache.fill({cache_key: cached}, generation, 5)
+        if cached is not None:
+            return cached and client is not None
 
-        # Cache results
         try:
-            cache.set(cache_key, resp_data, 300)
+            ok = bool(client and await client.ping())
         except Exception:
-            pass
+            ok = False
 
-        return Response(resp_data)
-
-    def _build_search_body(self, request, query, from_, size):
-        """Build Elasticsearch query body"""
-        body = {
-            "from": from_,
-            "size": size,
-            "query": {"bool": {"must": [], "filter": []}},
-            "_source": [
-                "title",
-                "author",
-                "language",
-                "average_rating",
-                "rating_count",
-                "views",
-                "publication_date",
-                "image",
-                "epub_file",
-                "cover_image",
-                "source_name",
-                "source_url",
-                "newspaper_or_journal",
-                "author_workplace",
-                "type",
-                "categories",
-            ],
-            "highlight": {
-                "pre_tags": ["<mark>"],
-                "post_tags": ["</mark>"],
-                "fields": {
-                    "title": {"fragment_size": 100, "number_of_fragments": 1},
-                    "content": {"fragment_size": 120, "number_of_fragments": 1},
-                },
-            },
-            "sort": [{"_score": {"order": "desc"}}],
-        }
+        await cache.aset(cache_key, ok, 5)
+        return ok
 
-        # Add search query
-        if query:
-            body["query"]["bool"]["must"].append(
-                {
-                    "multi_match": {
-                        "query": query,
-                        "fields": [
-                            "title^10",
-                            "content^3",
-                            "author^5",
-                            "author_workplace^2",
-                            "source_name^2",
-                            "newspaper_or_journal^2",
-                        ],
-                        "type": "best_fields",
-                        "fuzziness": "AUTO",
-                    }
+
+def parse_page(params):
+    """Page number from query params; missing or malformed values mean 1"""
+    try:
+        return max(int(params.get("page", 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def build_response_data(response, query, page, page_size):
+    """Build the paginated search payload from an Elasticsearch response"""
+    results = process_results(response)
+    return {
+        "count": response["hits"]["total"]["value"],
+        "page": page,
+        "page_size": page_size,
+        "has_next": len(results) == page_size,
+        "results": results,
+        "query": query,
+    }
+
+
+def build_search_body(params, query, from_, size):
+    """Build Elasticsearch query body from query parameters"""
+    body = {
+        "from": from_,
+        "size": size,
+        "query": {"bool": {"must": [], "filter": []}},
+        "_source": [
+            "title",
+            "author",
+            "language",
+            "average_rating",
+            "rating_count",
+            "views",
+            "publication_date",
+            "image",
+            "epub_file",
+            "cover_image",
+            "source_name",
+            "source_url",
+            "newspaper_or_journal",
+            "author_workplace",
+            "type",
+            "categories",
+        ],
+        "highlight": {
+            "pre_tags": ["<mark>"],
+            "post_tags": ["</mark>"],
+            "fields": {
+                "title": {"fragment_size": 100, "number_of_fragments": 1},
+                "content": {"fragment_size": 120, "number_of_fragments": 1},
+            },
+        },
+        "sort": [{"_score": {"order": "desc"}}],
+    }
+
+    # Add search query
+    if query:
+        body["query"]["bool"]["must"].append(
+            {
+                "multi_match": {
+                    "query": query,
+                    "fields": [
+                        "title^10",
+                        "content^3",
+                        "author^5",
+                        "author_workplace^2",
+                        "source_name^2",
+                        "newspaper_or_journal^2",
+                    ],
+                    "type": "best_fields",
+                    "fuzziness": "AUTO",
                 }
-            )
-        else:
-            body["query"]["bool"]["must"].append({"match_all": {}})
+            }
+        )
+    else:
+        body["query"]["bool"]["must"].append({"match_all": {}})
 
-        # Add filters
-        filters = self._build_filters(request)
-        if filters:
-            body["query"]["bool"]["filter"] = filters
+    # Add filters
+    filters = build_filters(params)
+    if filters:
+        body["query"]["bool"]["filter"] = filters
 
-        # Adjust sorting for non-search queries
-        if not query:
-            body["sort"].insert(0, {"average_rating": {"order": "desc"}})
-            body["sort"].append({"views": {"order": "desc"}})
+    # Adjust sorting for non-search queries
+    if not query:
+        body["sort"].insert(0, {"average_rating": {"order": "desc"}})
+        body["sort"].append({"views": {"order": "desc"}})
 
-        return body
+    return body
 
-    def _build_filters(self, request):
-        """Build filter clauses from request parameters"""
-        filters = []
 
-        # Content type filter
-        content_type = request.query_params.get("content_type")
-        if content_type in ["article", "book", "dissertation"]:
-            filters.append({"term": {"_index": f"{content_type}s"}})
+def build_filters(params):
+    """Build filter clauses from query parameters"""
+    filters = []
 
-        # Language filter
-        if request.query_params.get("language"):
-            filters.append(
-                {"term": {"language.keyword": request.query_params["language"]}}
-            )
+    # Content type filter
+    content_type = params.get("content_type")
+    if content_type in ["article", "book", "dissertation"]:
+        # prefix: indices are versioned ("articles_v7") behind the alias
+        filters.append({"prefix": {"_index": f"{content_type}s"}})
 
-        # Type filter (for articles)
-        if request.query_params.get("type"):
-            filters.append({"term": {"type.keyword": request.query_params["type"]}})
+    # Language filter
+    if params.get("language"):
+        filters.append({"term": {"language.keyword": params["language"]}})
 
-        # Author filter
-        if request.query_params.get("author"):
-            filters.append({"term": {"author.keyword": request.query_params["author"]}})
+    # Type filter (for articles)
+    if params.get("type"):
+        filters.append({"term": {"type.keyword": params["type"]}})
 
-        # Date filters
-        if request.query_params.get("publication_date"):
-            filters.append(
-                {"term": {"publication_date": request.query_params["publication_date"]}}
-            )
+    # Author filter
+    if params.get("author"):
+        filters.append({"term": {"author.keyword": params["author"]}})
 
-        if request.query_params.get("publication_date__gte"):
-            filters.append(
-                {
-                    "range": {
-                        "publication_date": {
-                            "gte": request.query_params["publication_date__gte"]
-                        }
-                    }
-                }
-            )
+    # Date filters
+    if params.get("publication_date"):
+        filters.append({"term": {"publication_date": params["publication_date"]}})
+
+    if params.get("publication_date__gte"):
+        filters.append(
+            {"range": {"publication_date": {"gte": params["publication_date__gte"]}}}
+        )
+
+    if params.get("publication_date__lte"):
+        filters.append(
+            {"range": {"publication_date": {"lte": params["publication_date__lte"]}}}
+        )
 
-        if request.query_params.get("publication_date__lte"):
+    # Category filters
+    if params.get("category_id"):
+        try:
+            category_id = int(params["category_id"])
             filters.append(
                 {
-                    "range": {
-                        "publication_date": {
-                            "lte": request.query_params["publication_date__lte"]
-                        }
+                    "nested": {
+                        "path": "categories",
+                        "query": {"term": {"categories.id": category_id}},
                     }
                 }
             )
+        except ValueError:
+            pass
 
-        # Category filters
-        if request.query_params.get("category_id"):
-            try:
-                category_id = int(request.query_params["category_id"])
-                filters.append(
-                    {
-                        "nested": {
-                            "path": "categories",
-                            "query": {"term": {"categories.id": category_id}},
-                        }
-                    }
-                )
-            except ValueError:
-                pass
-
-        if request.query_params.get("category_name"):
+    # Category subtree filter (category and its descendants)
+    if params.get("category_tree"):
+        try:
+            category_id = int(params["category_tree"])
             filters.append(
                 {
                     "nested": {
                         "path": "categories",
-                        "query": {
-                            "match": {
-                                "categories.name": request.query_params["category_name"]
-                            }
-                        },
+                        "query": {"term": {"categories.ancestors": category_id}},
                     }
                 }
             )
+        except ValueError:
+            pass
 
-        return filters
-
-    def _process_results(self, response):
-        """Process Elasticsearch results"""
-        results = []
-        for hit in response["hits"]["hits"]:
-            source = hit["_source"]
-            index_name = hit["_index"]
-            content_type = index_name.rstrip("s")
-
-            base = {
-                "id": int(hit["_id"]),
-                "content_type": content_type,
-                "title": source.get("title", "Untitled"),
-                "author": source.get("author", "Unknown"),
-                "language": source.get("language", "tm"),
-                "average_rating": round(float(source.get("average_rating", 0)), 2),
-                "rating_count": source.get("rating_count", 0),
-                "views": source.get("views", 0),
-                "score": hit.get("_score", 0),
-                "highlight": hit.get("highlight", {}),
+    if params.get("category_name"):
+        filters.append(
+            {
+                "nested": {
+                    "path": "categories",
+                    "query": {"match": {"categories.name": params["category_name"]}},
+                }
             }
+        )
+
+    return filters
+
+
+def process_results(response):
+    """Process Elasticsearch results"""
+    results = []
+    for hit in response["hits"]["hits"]:
+        source = hit["_source"]
+        index_name = hit["_index"]
+        content_type = search_utils.content_type_for_index(index_name)
+
+        base = {
+            "id": int(hit["_id"]),
+            "content_type": content_type,
+            "title": source.get("title", "Untitled"),
+            "author": source.get("author", "Unknown"),
+            "language": source.get("language", "tm"),
+            "average_rating": round(float(source.get("average_rating", 0)), 2),
+            "rating_count": source.get("rating_count", 0),
+            "views": source.get("views", 0),
+            "score": hit.get("_score", 0),
+            "highlight": hit.get("highlight", {}),
+        }
 
-            # Add type-specific fields
-            if content_type == "article":
-                base.update(
-                    {
-                        "author_workplace": source.get("author_workplace"),
-                        "type": source.get("type"),
-                        "publication_date": self._format_date(
-                            source.get("publication_date")
-                        ),
-                        "source_name": source.get("source_name"),
-                        "source_url": source.get("source_url"),
-                        "newspaper_or_journal": source.get("newspaper_or_journal"),
-                        "image": source.get("image"),
-                    }
-                )
-            elif content_type == "book":
-                base.update(
-                    {
-                        "epub_file": source.get("epub_file"),
-                        "cover_image": source.get("cover_image"),
-                    }
-                )
-            elif content_type == "dissertation":
-                base.update(
-                    {
-                        "author_workplace": source.get("author_workplace"),
-                        "publication_date": self._format_date(
-                            source.get("publication_date")
-                        ),
-                    }
-                )
+        # Add type-specific fields
+        if content_type == "article":
+            base.update(
+                {
+                    "author_workplace": source.get("author_workplace"),
+                    "type": source.get("type"),
+                    "publication_date": format_date(source.get("publication_date")),
+                    "source_name": source.get("source_name"),
+                    "source_url": source.get("source_url"),
+                    "newspaper_or_journal": source.get("newspaper_or_journal"),
+                    "image": source.get("image"),
+                }
+            )
+        elif content_type == "book":
+            base.update(
+                {
+                    "epub_file": source.get("epub_file"),
+                    "cover_image": source.get("cover_image"),
+                }
+            )
+        elif content_type == "dissertation":
+            base.update(
+                {
+                    "author_workplace": source.get("author_workplace"),
+                    "publication_date": format_date(source.get("publication_date")),
+                }
+            )
 
-            base["categories"] = source.get("categories", [])
-            results.append(base)
+        base["categories"] = source.get("categories", [])
+        results.append(base)
 
-        return results
+    return results
 
-    @staticmethod
-    def _format_date(date_str):
-        """Format date string to DD.MM.YYYY"""
-        if not date_str:
-            return None
-        try:
-            return datetime.strptime(date_str.split("T")[0], "%Y-%m-%d").strftime(
-                "%d.%m.%Y"
-            )
-        except Exception:
-            return date_str.split("T")[0] if date_str else None
+
+def format_date(date_str):
+    """Format date string to DD.MM.YYYY"""
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(date_str.split("T")[0], "%Y-%m-%d").strftime(
+            "%d.%m.%Y"
+        )
+    except Exception:
+        return date_str.split("T")[0] if date_str else None
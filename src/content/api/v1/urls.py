@@ -8,7 +8,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from content.api.v1 import views
 from content.authentication.views import LogoutView
-from content.api.v1.search import ContentSearchView
+from content.api.v1.search import ContentSearchAsyncView, ContentSearchView
 from content.views import admin_statistics, admin_statistics_data, admin_chart
 
 # Create router for viewsets
@@ -50,6 +50,12 @@ urlpatterns = [
         views.RegisterViewHit.as_view(),
         name="register-view",
     ),
+    path("trending/", views.TrendingView.as_view(), name="trending"),
     # Search
     path("search/", ContentSearchView.as_view(), name="content-search"),
+    path(
+        "search/async/",
+        ContentSearchAsyncView.as_view(),
+        name="content-search-async",
+    ),
 ]
@@ -9,13 +9,11 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.models import User
-from django.db.models import Prefetch, F
-from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from datetime import timedelta
+import logging
 
 from content.models import (
     Article,
@@ -24,10 +22,8 @@ from content.models import (
     ArticleCategory,
     BookCategory,
     DissertationCategory,
-    ContentRating,
-    PendingView,
-    ViewRecord,
     Profile,
+    TrendingScore,
 )
 from content.serializers import (
     ArticleSerializer,
@@ -43,9 +39,20 @@ from content.serializers import (
 )
 from content.utils.mixins import (
     BookmarkAnnotateMixin,
+    CachedListMixin,
     CachedRetrieveMixin,
+    CategoryDailyViewsMixin,
+    CategoryTreeFilterMixin,
+    CategoryTreeMixin,
     ContentListOptimizationMixin,
+    DailyViewsMixin,
+    RatingHistogramMixin,
 )
+from content.view_counter import get_view_counter
+from content import content_types, ratings
+from .pagination import ContentPagination, TrendingPagination
+
+logger = logging.getLogger(__name__)
 
 
 # Optimized category querysets
@@ -58,10 +65,12 @@ dissertation_cat_qs = DissertationCategory.objects.select_related(
 ).prefetch_related("subcategories")
 
 
-@method_decorator(cache_page(60 * 10), name="list")
 class ArticleViewSet(
     BookmarkAnnotateMixin,
+    CachedListMixin,
     CachedRetrieveMixin,
+    DailyViewsMixin,
+    RatingHistogramMixin,
     ContentListOptimizationMixin,
     viewsets.ReadOnlyModelViewSet,
 ):
@@ -77,6 +86,7 @@ class ArticleViewSet(
     )
     serializer_class = ArticleSerializer
     list_serializer_class = ArticleListSerializer
+    pagination_class = ContentPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = {
         "language": ["exact"],
@@ -95,14 +105,18 @@ class ArticleViewSet(
         "views",
         "language",
         "image",
+        "publication_date",
     ]
     cache_timeout = 60
 
 
-@method_decorator(cache_page(60 * 10), name="list")
 class BookViewSet(
     BookmarkAnnotateMixin,
+    CategoryTreeFilterMixin,
+    CachedListMixin,
     CachedRetrieveMixin,
+    DailyViewsMixin,
+    RatingHistogramMixin,
     ContentListOptimizationMixin,
     viewsets.ReadOnlyModelViewSet,
 ):
@@ -115,6 +129,7 @@ class BookViewSet(
     )
     serializer_class = BookSerializer
     list_serializer_class = BookListSerializer
+    pagination_class = ContentPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = {
         "language": ["exact"],
@@ -135,10 +150,13 @@ class BookViewSet(
     cache_timeout = 60
 
 
-@method_decorator(cache_page(60 * 10), name="list")
 class DissertationViewSet(
     BookmarkAnnotateMixin,
+    CategoryTreeFilterMixin,
+    CachedListMixin,
     CachedRetrieveMixin,
+    DailyViewsMixin,
+    RatingHistogramMixin,
     ContentListOptimizationMixin,
     viewsets.ReadOnlyModelViewSet,
 ):
@@ -151,6 +169,7 @@ class DissertationViewSet(
     )
     serializer_class = DissertationSerializer
     list_serializer_class = DissertationListSerializer
+    pagination_class = ContentPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = {
         "language": ["exact"],
@@ -172,17 +191,27 @@ class DissertationViewSet(
     cache_timeout = 60
 
 
-@method_decorator(cache_page(60 * 60), name="list")
-class ArticleCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class ArticleCategoryViewSet(
+    CategoryDailyViewsMixin, CachedListMixin, viewsets.ReadOnlyModelViewSet
+):
     """ViewSet for Article categories"""
 
     queryset = ArticleCategory.objects.all().order_by("name")
     serializer_class = ArticleCategorySerializer
     pagination_class = None
+    list_cache_scope = "article:categories"
+    content_model = Article
+    list_cache_timeout = 60 * 60
+    list_cache_local = True
+    bookmark_overlay = False
 
 
-@method_decorator(cache_page(60 * 60), name="list")
-class BookCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class BookCategoryViewSet(
+    CategoryTreeMixin,
+    CategoryDailyViewsMixin,
+    CachedListMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """ViewSet for Book categories with hierarchy support"""
 
     queryset = book_cat_qs.order_by("name")
@@ -190,10 +219,19 @@ class BookCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = {"parent": ["exact", "isnull"]}
     pagination_class = None
+    list_cache_scope = "book:categories"
+    content_model = Book
+    list_cache_timeout = 60 * 60
+    list_cache_local = True
+    bookmark_overlay = False
 
 
-@method_decorator(cache_page(60 * 60), name="list")
-class DissertationCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class DissertationCategoryViewSet(
+    CategoryTreeMixin,
+    CategoryDailyViewsMixin,
+    CachedListMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """ViewSet for Dissertation categories with hierarchy support"""
 
     queryset = dissertation_cat_qs.order_by("name")
@@ -201,6 +239,11 @@ class DissertationCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = {"parent": ["exact", "isnull"]}
     pagination_class = None
+    list_cache_scope = "dissertation:categories"
+    content_model = Dissertation
+    list_cache_timeout = 60 * 60
+    list_cache_local = True
+    bookmark_overlay = False
 
 
 class RegisterView(generics.CreateAPIView):
@@ -347,69 +390,30 @@ class RegisterViewHit(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        now = timezone.now()
-        ttl_hours = 24
-        cutoff = now - timedelta(hours=ttl_hours)
+        user_id = request.user.id if request.user.is_authenticated else None
+        session_key = None
+        if user_id is None:
+            if not request.session.session_key:
+                request.session.save()
+            session_key = request.session.session_key
 
         try:
-            if request.user.is_authenticated:
-                seen = ViewRecord.objects.filter(
-                    user=request.user,
-                    content_type=content_type,
-                    content_id=pk,
-                    last_seen__gte=cutoff,
-                ).exists()
-
-                if seen:
-                    return Response(
-                        {"accepted": False, "reason": "Already counted"},
-                        status=status.HTTP_200_OK,
-                    )
-
-                ViewRecord.objects.update_or_create(
-                    user=request.user,
-                    content_type=content_type,
-                    content_id=pk,
-                    defaults={"last_seen": now},
-                )
-            else:
-                if not request.session.session_key:
-                    request.session.save()
-                sk = request.session.session_key
-
-                seen = ViewRecord.objects.filter(
-                    session_key=sk,
-                    content_type=content_type,
-                    content_id=pk,
-                    last_seen__gte=cutoff,
-                ).exists()
-
-                if seen:
-                    return Response(
-                        {"accepted": False, "reason": "Already counted"},
-                        status=status.HTTP_200_OK,
-                    )
-
-                ViewRecord.objects.update_or_create(
-                    session_key=sk,
-                    content_type=content_type,
-                    content_id=pk,
-                    defaults={"last_seen": now},
-                )
-
-            # Increment pending view count
-            pv, created = PendingView.objects.get_or_create(
-                content_type=content_type, content_id=pk, defaults={"count": 1}
+            counted = get_view_counter().register_hit(
+                content_type, pk, user_id=user_id, session_key=session_key
             )
-            if not created:
-                PendingView.objects.filter(pk=pv.pk).update(count=F("count") + 1)
-
-        except Exception as e:
+        except Exception:
+            logger.exception("Failed to register view %s#%s", content_type, pk)
             return Response(
                 {"error": "Database error"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+        if not counted:
+            return Response(
+                {"accepted": False, "reason": "Already counted"},
+                status=status.HTTP_200_OK,
+            )
+
         return Response({"accepted": True})
 
 
@@ -470,19 +474,131 @@ class RateContentView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Create or update rating
-        obj, created = ContentRating.objects.update_or_create(
-            user=request.user,
-            content_type=content_type,
-            content_id=content_id,
-            defaults={"rating": rating_value},
-        )
+        # Create or update rating and the item's aggregates
+        try:
+            result = ratings.record_rating(
+                request.user, content_type, content_id, rating_value
+            )
+        except ObjectDoesNotExist:
+            return Response(
+                {"error": "Content not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        created = result["created"]
 
         return Response(
             {
                 "success": True,
                 "message": "Rating updated" if not created else "Rating created",
                 "rating": rating_value,
+                "average_rating": result["average_rating"],
+                "rating_count": result["rating_count"],
             },
             status=status.HTTP_200_OK if not created else status.HTTP_201_CREATED,
         )
+
+
+class TrendingView(APIView):
+    """Items ranked by time-decayed recent activity (see content.trending)"""
+
+    pagination_class = TrendingPagination
+    list_serializers = {
+        "article": ArticleListSerializer,
+        "book": BookListSerializer,
+        "dissertation": DissertationListSerializer,
+    }
+
+    @swagger_auto_schema(
+        operation_description="Trending content, highest score first",
+        manual_parameters=[
+            openapi.Parameter(
+                "content_type",
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=["article", "book", "dissertation"],
+            ),
+            openapi.Parameter("language", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter(
+                "category",
+                openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="Requires content_type; includes subcategories",
+            ),
+        ],
+    )
+    def get(self, request):
+        content_type = request.query_params.get("content_type", "").strip().lower()
+        language = request.query_params.get("language")
+        category = request.query_params.get("category")
+
+        queryset = TrendingScore.objects.order_by(
+            "-score", "content_type", "content_id"
+        )
+        if content_type:
+            if content_type not in self.list_serializers:
+                return Response(
+                    {"error": "Invalid content_type"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = queryset.filter(content_type=content_type)
+        if language:
+            queryset = queryset.filter(language=language)
+        if category:
+            if not content_type:
+                return Response(
+                    {"error": "category requires content_type"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            items = self._category_items(content_type, category)
+            if items is None:
+                return Response(
+                    {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            queryset = queryset.filter(content_id__in=items)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self._serialize(page, request))
+
+    def _category_items(self, content_type, category):
+        """``values("pk")`` of the type's items in ``category`` (and its subtree)."""
+        model = content_types.MODELS[content_type]
+        category_model = model.categories.field.related_model
+        try:
+            node = category_model.objects.filter(pk=int(category)).first()
+        except ValueError:
+            node = None
+        if node is None:
+            return None
+        if hasattr(node, "path"):
+            items = model.objects.filter(categories__path__startswith=node.path)
+        else:
+            items = model.objects.filter(categories=node)
+        return items.values("pk")
+
+    def _serialize(self, page, request):
+        """Page rows as list payloads, one query per content type."""
+        ids_by_type = {}
+        for row in page:
+            ids_by_type.setdefault(row.content_type, []).append(row.content_id)
+
+        payloads = {}
+        for content_type, ids in ids_by_type.items():
+            serializer_class = self.list_serializers[content_type]
+            fields = serializer_class.Meta.fields
+            objs = (
+                content_types.MODELS[content_type]
+                .objects.filter(pk__in=ids)
+                .only(*fields)
+            )
+            data = serializer_class(objs, many=True, context={"request": request}).data
+            for item in data:
+                payloads[content_type, item["id"]] = item
+
+        results = []
+        for row in page:
+            item = payloads.get((row.content_type, row.content_id))
+            if item is not None:  # deleted since the last rebuild
+                results.append(
+                    dict(item, type=row.content_type, score=round(row.score, 4))
+                )
+        return results
@@ -11,7 +11,7 @@ class ContentConfig(AppConfig):
             from . import signals  # noqa: F401
         except Exception:
             pass
-        # Ensure the scheduled `flush_views` PeriodicTask exists (idempotent)
+        # Ensure the scheduled PeriodicTasks exist (idempotent)
         try:
             from django.conf import settings
             from django_celery_beat.models import CrontabSchedule, PeriodicTask
@@ -34,6 +34,106 @@ class ContentConfig(AppConfig):
                     "enabled": True,
                 },
             )
+
+            # Drain the coalescing search index queue every minute
+            every_minute, _ = CrontabSchedule.objects.get_or_create(
+                minute="*",
+                hour="*",
+                day_of_week="*",
+                day_of_month="*",
+                month_of_year="*",
+                timezone=tz,
+            )
+            PeriodicTask.objects.update_or_create(
+                name="process_index_queue_every_minute",
+                defaults={
+                    "crontab": every_minute,
+                    "task": "content.tasks.process_index_queue_task",
+                    "enabled": True,
+                },
+            )
+
+            # Nightly reconciliation of the search indices with the database
+            nightly, _ = CrontabSchedule.objects.get_or_create(
+                minute="0",
+                hour="3",
+                day_of_week="*",
+                day_of_month="*",
+                month_of_year="*",
+                timezone=tz,
+            )
+            PeriodicTask.objects.update_or_create(
+                name="incremental_reindex_nightly",
+                defaults={
+                    "crontab": nightly,
+                    "task": "content.tasks.incremental_reindex_task",
+                    "enabled": True,
+                },
+            )
+
+            # Nightly repair of rating aggregates
+            nightly_ratings, _ = CrontabSchedule.objects.get_or_create(
+                minute="30",
+                hour="3",
+                day_of_week="*",
+                day_of_month="*",
+                month_of_year="*",
+                timezone=tz,
+            )
+            PeriodicTask.objects.update_or_create(
+                name="recompute_ratings_nightly",
+                defaults={
+                    "crontab": nightly_ratings,
+                    "task": "content.tasks.recompute_ratings_task",
+                    "enabled": True,
+                },
+            )
+
+            # Daily ViewRecord partitions: create upcoming, drop expired
+            view_records, _ = CrontabSchedule.objects.get_or_create(
+                minute="15",
+                hour="0",
+                day_of_week="*",
+                day_of_month="*",
+                month_of_year="*",
+                timezone=tz,
+            )
+            PeriodicTask.objects.update_or_create(
+                name="maintain_view_records_daily",
+                defaults={
+                    "crontab": view_records,
+                    "task": "content.tasks.maintain_view_records_task",
+                    "enabled": True,
+                },
+            )
+
+            # Trending ranking, refreshed a few times an hour
+            every_15_minutes, _ = CrontabSchedule.objects.get_or_create(
+                minute="*/15",
+                hour="*",
+                day_of_week="*",
+                day_of_month="*",
+                month_of_year="*",
+                timezone=tz,
+            )
+            PeriodicTask.objects.update_or_create(
+                name="compute_trending_every_15_minutes",
+                defaults={
+                    "crontab": every_15_minutes,
+                    "task": "content.tasks.compute_trending_task",
+                    "enabled": True,
+                },
+            )
+
+            # Admin dashboard statistics snapshots
+            PeriodicTask.objects.update_or_create(
+                name="statistics_snapshot_every_15_minutes",
+                defaults={
+                    "crontab": every_15_minutes,
+                    "task": "content.tasks.take_statistics_snapshot_task",
+                    "enabled": True,
+                },
+            )
         except Exception:
             # Avoid breaking app startup if DB/migrations not ready
             pass
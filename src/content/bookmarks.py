@@ -0,0 +1,203 @@
+"""
+Per-user bookmark id sets.
+
+Shared (cached) list, search and detail payloads cannot carry a per-user
+``is_bookmarked`` flag, so it is applied on top of them from a small set
+of bookmarked ids per user and content type. With Redis the sets are
+native Redis sets built lazily from the three ``Profile`` M2M tables and
+updated in place when bookmarks change (``ToggleBookmarkView``, admin),
+through the M2M signals in ``signals.py``; otherwise the ids are kept in
+the Django cache and rebuilt after each change.
+
+A rebuild that read the tables just before a bookmark change committed
+must not store what it read. Every rebuild first sets a build marker,
+every change deletes it, and a rebuild whose marker is gone by the time
+it stores drops its result.
+"""
+
+import logging
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import WatchError
+
+from .models import Profile
+from .utils.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = ("article", "book", "dissertation")
+
+BOOKMARK_FIELDS = {
+    "article": "bookmarked_articles",
+    "book": "bookmarked_books",
+    "dissertation": "bookmarked_dissertations",
+}
+
+# Member stored in every built set so an empty set still exists (ids start at 1)
+SENTINEL = 0
+
+# Seconds a rebuild may take before its marker expires
+BUILD_TIMEOUT = 30
+
+
+def _ttl():
+    return int(getattr(settings, "BOOKMARK_SET_TTL", 24 * 60 * 60))
+
+
+def _key(user_id, content_type):
+    return f"bookmarks:{user_id}:{content_type}"
+
+
+def _cache_key(user_id):
+    return f"bookmarks:{user_id}"
+
+
+def _build_key(user_id):
+    return f"bookmarks:{user_id}:building"
+
+
+def _load(user_id):
+    """Read all bookmark ids of a user from the M2M tables (3 queries)."""
+    ids = {}
+    for content_type, field in BOOKMARK_FIELDS.items():
+        through = getattr(Profile, field).through
+        column = f"{content_type}_id"
+        ids[content_type] = set(
+            through.objects.filter(profile__user_id=user_id).values_list(
+                column, flat=True
+            )
+        )
+    return ids
+
+
+def get_bookmark_ids(user_id):
+    """
+    Return the bookmarked ids of a user, building the sets on first use.
+
+    Returns:
+        dict: content_type -> set of ids
+    """
+    client = get_redis_connection()
+    if client is None:
+        ids = cache.get(_cache_key(user_id))
+        if ids is None:
+            token = uuid.uuid4().hex
+            cache.set(_build_key(user_id), token, BUILD_TIMEOUT)
+            ids = _load(user_id)
+            if cache.get(_build_key(user_id)) == token:
+                cache.set(_cache_key(user_id), ids, _ttl())
+        return ids
+
+    pipe = client.pipeline(transaction=False)
+    for content_type in CONTENT_TYPES:
+        pipe.smembers(_key(user_id, content_type))
+    replies = pipe.execute()
+
+    if all(replies):
+        return {
+            content_type: {int(m) for m in members} - {SENTINEL}
+            for content_type, members in zip(CONTENT_TYPES, replies)
+        }
+
+    token = uuid.uuid4().hex
+    marker = _build_key(user_id)
+    client.set(marker, token, ex=BUILD_TIMEOUT)
+    ids = _load(user_id)
+    with client.pipeline(transaction=True) as pipe:
+        try:
+            pipe.watch(marker)
+            if pipe.get(marker) not in (token, token.encode()):
+                # a change committed meanwhile: serve, but don't store
+                return ids
+            pipe.multi()
+            pipe.delete(marker)
+            for content_type in CONTENT_TYPES:
+                key = _key(user_id, content_type)
+                pipe.delete(key)
+                pipe.sadd(key, SENTINEL, *ids[content_type])
+                pipe.expire(key, _ttl())
+            pipe.execute()
+        except WatchError:
+            pass
+    return ids
+
+
+def add(user_id, content_type, content_ids):
+    _update(user_id, content_type, content_ids, added=True)
+
+
+def remove(user_id, content_type, content_ids):
+    _update(user_id, content_type, content_ids, added=False)
+
+
+def _update(user_id, content_type, content_ids, added):
+    content_ids = [int(i) for i in content_ids]
+    client = get_redis_connection()
+    if client is None:
+        cache.delete_many([_cache_key(user_id), _build_key(user_id)])
+        return
+    if not content_ids:
+        return
+
+    # Cancel a rebuild that may have read the rows before this change
+    client.delete(_build_key(user_id))
+    key = _key(user_id, content_type)
+    # Only touch a built set; a missing one is rebuilt from the DB on read
+    if client.exists(key):
+        if added:
+            client.sadd(key, *content_ids)
+        else:
+            client.srem(key, *content_ids)
+
+
+def invalidate(user_id):
+    """Drop the sets of a user, e.g. after bookmarks changed in the admin."""
+    client = get_redis_connection()
+    if client is None:
+        cache.delete_many([_cache_key(user_id), _build_key(user_id)])
+        return
+    client.delete(_build_key(user_id), *[_key(user_id, ct) for ct in CONTENT_TYPES])
+
+
+def apply_bookmarks(items, user, content_type=None):
+    """
+    Set ``is_bookmarked`` on serialized items in place.
+
+    Args:
+        items: List of dicts with "id" (and "content_type" unless given)
+        user: Request user; anonymous users get False everywhere
+        content_type: Content type of all items, for single-type lists
+
+    Returns:
+        The same list
+    """
+    if user is not None and user.is_authenticated:
+        ids = get_bookmark_ids(user.id)
+    else:
+        ids = {}
+    for item in items:
+        ct = content_type or item.get("content_type")
+        item["is_bookmarked"] = item.get("id") in ids.get(ct, ())
+    return items
+
+
+def overlay(data, user, content_type=None):
+    """
+    Return a copy of a shared list payload with ``is_bookmarked`` applied.
+
+    Args:
+        data: Paginated dict with "results", or a plain list of items
+        user: Request user
+        content_type: Content type of all items, for single-type lists
+
+    Returns:
+        A new payload; the cached one is left untouched
+    """
+    if isinstance(data, dict):
+        data = dict(data)
+        items = data["results"] = [dict(item) for item in data.get("results", [])]
+    else:
+        items = data = [dict(item) for item in data]
+    apply_bookmarks(items, user, content_type)
+    return data
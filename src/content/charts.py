@@ -0,0 +1,163 @@
+"""
+Admin dashboard charts.
+
+Each chart is built by ``utils.svg_charts`` from the data of a statistics
+snapshot. ``prerender`` (run by the snapshot task right after a new
+snapshot is taken) renders all of them into the cache together with their
+ETags, keyed by snapshot id; ``admin_chart`` then only serves those bytes.
+A chart missing from the cache (evicted, or before the first run) is
+rendered once on demand and cached the same way.
+"""
+
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+
+from .statistics_snapshot import top_items
+from .utils import svg_charts
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_COLORS = ["#10b981", "#3b82f6", "#7c3aed"]
+RATING_COLORS = ["#ef4444", "#f97316", "#f59e0b", "#10b981", "#3b82f6"]
+TITLE_LENGTH = 40
+SPARK_SIZE = {"width": 300, "height": 60}
+
+
+def _title(title):
+    if len(title) > TITLE_LENGTH:
+        return title[:TITLE_LENGTH] + "…"
+    return title
+
+
+def _lang(data):
+    languages = data["languages"]
+    return svg_charts.pie_chart(
+        ["TM", "RU", "EN"],
+        [languages.get("tm", 0), languages.get("ru", 0), languages.get("en", 0)],
+        colors=LANGUAGE_COLORS,
+        title="Language distribution",
+    )
+
+
+def _ratings(data):
+    histogram = data["ratings_histogram"]
+    return svg_charts.bar_chart(
+        list(histogram),
+        list(histogram.values()),
+        colors=RATING_COLORS,
+        title="Ratings distribution",
+        ylabel="Count",
+    )
+
+
+def _new(data):
+    new_items = data["new_items"]
+    return svg_charts.line_chart(
+        [day[5:] for day in new_items["dates"]],  # MM-DD
+        new_items["counts"],
+        title="New items (last 30 days)",
+        ylabel="Count",
+    )
+
+
+def _top(data):
+    items = top_items(data["types"], 8)
+    return svg_charts.hbar_chart(
+        [_title(item["title"]) for item in items],
+        [item["views"] for item in items],
+        title="Top materials by views",
+    )
+
+
+def _spark_new(data):
+    return svg_charts.sparkline(data["new_items"]["counts"], **SPARK_SIZE)
+
+
+def _spark_ratings(data):
+    return svg_charts.sparkline(
+        list(data["ratings_histogram"].values()), "#10b981", "bar", **SPARK_SIZE
+    )
+
+
+def _spark_users(data):
+    return svg_charts.sparkline(data["users"]["registrations"], "#7c3aed", **SPARK_SIZE)
+
+
+def _spark_top(data):
+    views = [item["views"] for item in top_items(data["types"], 6)]
+    return svg_charts.sparkline(views, kind="bar", **SPARK_SIZE)
+
+
+CHARTS = {
+    "lang": _lang,
+    "ratings": _ratings,
+    "new": _new,
+    "top": _top,
+    "spark_new": _spark_new,
+    "spark_ratings": _spark_ratings,
+    "spark_users": _spark_users,
+    "spark_top": _spark_top,
+}
+
+
+def _key(chart_name, snapshot_id):
+    return f"chart:{chart_name}:svg:{snapshot_id}"
+
+
+def _timeout():
+    return int(getattr(settings, "STATISTICS_SNAPSHOT_CACHE_TTL", 3600))
+
+
+def render(chart_name, data):
+    """
+    Render one chart of snapshot ``data``.
+
+    Returns:
+        dict: {"svg": bytes, "etag": unquoted ETag value}
+    """
+    svg = CHARTS[chart_name](data).encode("utf-8")
+    return {"svg": svg, "etag": hashlib.md5(svg).hexdigest()}
+
+
+def prerender(snapshot):
+    """
+    Render all charts of ``snapshot`` (as returned by
+    ``statistics_snapshot.latest``) into the cache.
+
+    Returns:
+        int: Number of charts rendered
+    """
+    entries = {
+        _key(chart_name, snapshot["id"]): render(chart_name, snapshot["data"])
+        for chart_name in CHARTS
+    }
+    try:
+        cache.set_many(entries, _timeout())
+    except Exception:
+        logger.exception("Failed to cache rendered charts")
+    return len(entries)
+
+
+def get(chart_name, snapshot):
+    """
+    Cached chart of ``snapshot``, rendered on a cache miss.
+
+    Returns:
+        dict: {"svg", "etag"}, or None for an unknown chart name
+    """
+    if chart_name not in CHARTS:
+        return None
+    key = _key(chart_name, snapshot["id"])
+    try:
+        entry = cache.get(key)
+    except Exception:
+        entry = None
+    if entry is None:
+        entry = render(chart_name, snapshot["data"])
+        try:
+            cache.set(key, entry, _timeout())
+        except Exception:
+            pass
+    return entry
@@ -0,0 +1,11 @@
+"""
+Content types by name.
+
+Ratings, daily views and trending scores refer to an item by a
+``content_type`` string and its id; ``MODELS`` maps that string to the
+model.
+"""
+
+from .models import Article, Book, Dissertation
+
+MODELS = {"article": Article, "book": Book, "dissertation": Dissertation}
@@ -0,0 +1,105 @@
+"""
+Per-day view counts.
+
+``flush_views`` adds each flushed batch to ``DailyView`` under the day of
+the flush, so counts buffered across midnight land on the next day. The
+series helpers read contiguous day ranges from it and fill the days
+without views with zeros.
+"""
+
+from datetime import date, timedelta
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import DailyView
+from .utils.bulk import upsert_increment_many
+
+
+def record(content_type, counts, day=None):
+    """
+    Add flushed view counts to the rollup.
+
+    Args:
+        content_type: "article", "book" or "dissertation"
+        counts: Dict of content_id -> views
+        day: Day to count the views under (default: today, UTC)
+    """
+    day = day or timezone.now().date()
+    upsert_increment_many(
+        DailyView,
+        ("content_type", "content_id", "day"),
+        "views",
+        ((content_type, content_id, day, n) for content_id, n in counts.items() if n),
+    )
+
+
+def parse_range(params):
+    """
+    Read ``from``/``to`` (ISO dates, inclusive) from query params.
+
+    Defaults to the last ``DAILY_VIEWS_DEFAULT_DAYS`` days up to today;
+    ranges are capped at ``DAILY_VIEWS_MAX_DAYS``.
+
+    Returns:
+        tuple: (start, end)
+
+    Raises:
+        ValidationError: Malformed, reversed or too long range
+    """
+    max_days = int(getattr(settings, "DAILY_VIEWS_MAX_DAYS", 366))
+    default_days = int(getattr(settings, "DAILY_VIEWS_DEFAULT_DAYS", 30))
+    try:
+        end = date.fromisoformat(params["to"]) if params.get("to") else None
+        start = date.fromisoformat(params["from"]) if params.get("from") else None
+    except ValueError:
+        raise ValidationError({"error": "from/to must be dates (YYYY-MM-DD)"})
+
+    end = end or timezone.now().date()
+    start = start or end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValidationError({"error": "from must not be after to"})
+    if (end - start).days >= max_days:
+        raise ValidationError({"error": f"Range is limited to {max_days} days"})
+    return start, end
+
+
+def _series(queryset, start, end):
+    per_day = dict(
+        queryset.filter(day__range=(start, end))
+        .values("day")
+        .annotate(n=Sum("views"))
+        .values_list("day", "n")
+        .order_by()
+    )
+    series = []
+    day = start
+    while day <= end:
+        series.append({"day": day.isoformat(), "views": per_day.get(day, 0)})
+        day += timedelta(days=1)
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "total": sum(point["views"] for point in series),
+        "series": series,
+    }
+
+
+def item_series(content_type, content_id, start, end):
+    """Daily views of one item: {"from", "to", "total", "series": [...]}."""
+    queryset = DailyView.objects.filter(
+        content_type=content_type, content_id=content_id
+    )
+    return _series(queryset, start, end)
+
+
+def items_series(content_type, ids, start, end):
+    """
+    Daily views summed over a set of items (e.g. a category).
+
+    Args:
+        ids: Primary keys, or a ``values("pk")`` queryset (used as subquery)
+    """
+    queryset = DailyView.objects.filter(content_type=content_type, content_id__in=ids)
+    return _series(queryset, start, end)
@@ -0,0 +1,216 @@
+"""
+Coalescing queue for Elasticsearch indexing.
+
+Signal handlers and ``flush_views`` push ``(model, id)`` pairs into a Redis
+set instead of enqueuing one Celery task per change, so an item that is
+saved, rated and viewed many times within a minute is indexed once. The
+``process_index_queue_task`` drains the set (periodically, or early when it
+grows past ``SEARCH_INDEX_QUEUE_BATCH_SIZE``) and sends one bulk request per
+index. Without a Redis cache the pairs are handed to ``index_objects_task``
+directly.
+
+Changes that only touch counters (views, ratings) go to a separate set and
+are sent as partial ``update`` actions instead of full documents. They are
+also logged with a timestamp for ``SEARCH_COUNTER_LOG_SECONDS``, so a full
+reindex can resend the counters that changed while it was building.
+"""
+
+import logging
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "search:index_queue"
+COUNTER_QUEUE_KEY = "search:index_queue:counters"
+SCHEDULED_KEY = "search:index_queue:scheduled"
+COUNTER_LOG_KEY = "search:index_queue:counter_log"
+
+
+def _member(model, obj_id):
+    return f"{model._meta.app_label}.{model.__name__}:{int(obj_id)}"
+
+
+def _parse_member(member):
+    if isinstance(member, bytes):
+        member = member.decode()
+    model_label, _, obj_id = member.rpartition(":")
+    app_label, _, model_name = model_label.partition(".")
+    return app_label, model_name, int(obj_id)
+
+
+def _queue_key(counters_only):
+    return COUNTER_QUEUE_KEY if counters_only else QUEUE_KEY
+
+
+def batch_size():
+    return int(getattr(settings, "SEARCH_INDEX_QUEUE_BATCH_SIZE", 500))
+
+
+def counter_log_seconds():
+    return int(getattr(settings, "SEARCH_COUNTER_LOG_SECONDS", 86400))
+
+
+def enqueue(model, ids, counters_only=False):
+    """
+    Schedule ``ids`` of ``model`` for (re)indexing.
+
+    Args:
+        model: Content model class
+        ids: Iterable of primary keys
+        counters_only: Only views/rating fields changed; send a partial update
+    """
+    ids = [int(i) for i in ids]
+    if not ids:
+        return
+
+    client = get_redis_connection()
+    if client is None:
+        from .tasks import index_objects_task
+
+        index_objects_task.delay(
+            model._meta.app_label, model.__name__, ids, counters_only=counters_only
+        )
+        return
+
+    key = _queue_key(counters_only)
+    members = [_member(model, i) for i in ids]
+    pipe = client.pipeline(transaction=False)
+    pipe.sadd(key, *members)
+    if counters_only:
+        now = time.time()
+        pipe.zadd(COUNTER_LOG_KEY, dict.fromkeys(members, now))
+        pipe.zremrangebyscore(COUNTER_LOG_KEY, "-inf", now - counter_log_seconds())
+    pipe.scard(key)
+    size = pipe.execute()[-1]
+
+    # Size trigger: drain early, but schedule at most one extra run at a time
+    if size >= batch_size() and cache.add(SCHEDULED_KEY, 1, 30):
+        from .tasks import process_index_queue_task
+
+        process_index_queue_task.delay()
+
+
+def _requeue(model, ids, counters_only=False):
+    """Put ids back without triggering another drain."""
+    client = get_redis_connection()
+    if client is not None and ids:
+        client.sadd(_queue_key(counters_only), *[_member(model, i) for i in ids])
+
+
+def counters_changed_since(model, since):
+    """
+    Ids of ``model`` whose counters were enqueued at or after ``since``.
+
+    Returns:
+        list: Primary keys, or None when the log cannot answer (no Redis,
+        or ``since`` is older than ``SEARCH_COUNTER_LOG_SECONDS``)
+    """
+    client = get_redis_connection()
+    if client is None:
+        return None
+    start = since.timestamp()
+    if time.time() - start > counter_log_seconds():
+        return None
+
+    label = (model._meta.app_label, model.__name__)
+    ids = []
+    for member in client.zrangebyscore(COUNTER_LOG_KEY, start, "+inf"):
+        try:
+            app_label, model_name, obj_id = _parse_member(member)
+        except (TypeError, ValueError):
+            continue
+        if (app_label, model_name) == label:
+            ids.append(obj_id)
+    return ids
+
+
+def pop_batch(count=None, counters_only=False):
+    """
+    Atomically remove up to ``count`` pending pairs from the queue.
+
+    Returns:
+        dict: (app_label, model_name) -> list of ids
+    """
+    client = get_redis_connection()
+    if client is None:
+        return {}
+
+    members = client.spop(_queue_key(counters_only), count or batch_size()) or []
+    grouped = {}
+    for member in members:
+        try:
+            app_label, model_name, obj_id = _parse_member(member)
+        except (TypeError, ValueError):
+            logger.warning("Dropping malformed index queue entry %r", member)
+            continue
+        grouped.setdefault((app_label, model_name), []).append(obj_id)
+    return grouped
+
+
+def _send(model, ids, counters_only):
+    from . import search_utils
+
+    if counters_only:
+        return search_utils.update_counters(model, ids)
+    return search_utils.index_objects(model, ids, refresh=False)
+
+
+def process_queue(max_batches=20):
+    """
+    Drain both queues and send the pending objects to Elasticsearch.
+
+    Full documents go first; counter-only entries follow as partial updates.
+    Documents that failed transiently (ES down, throttled, 5xx) are pushed
+    back so the next run retries them; permanently rejected ones (mapping
+    or parse errors) are logged and dropped. Counter updates for documents
+    missing from the index are promoted to a full index.
+
+    Returns:
+        dict: {"indexed": n, "skipped": n, "failed": n}
+    """
+    totals = {"indexed": 0, "skipped": 0, "failed": 0}
+    retry = []
+    cache.delete(SCHEDULED_KEY)
+
+    es_down = False
+    for counters_only in (False, True):
+        for _ in range(max_batches):
+            if es_down:
+                break
+            grouped = pop_batch(counters_only=counters_only)
+            if not grouped:
+                break
+
+            for (app_label, model_name), ids in grouped.items():
+                try:
+                    model = apps.get_model(app_label, model_name)
+                except LookupError:
+                    logger.warning(
+                        "Unknown model in index queue: %s.%s", app_label, model_name
+                    )
+                    totals["skipped"] += len(ids)
+                    continue
+
+                stats = None if es_down else _send(model, ids, counters_only)
+                if stats is None:
+                    # ES unavailable: put the popped pairs back and stop
+                    es_down = True
+                    retry.append((model, ids, counters_only))
+                    totals["failed"] += len(ids)
+                    continue
+
+                for key in totals:
+                    totals[key] += stats[key]
+                if stats["failed_ids"]:
+                    retry.append((model, stats["failed_ids"], counters_only))
+                if stats.get("missing_ids"):
+                    retry.append((model, stats["missing_ids"], False))
+
+    for model, ids, counters_only in retry:
+        _requeue(model, ids, counters_only)
+    return totals
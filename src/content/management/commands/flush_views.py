@@ -1,56 +1,73 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from django.db.models import F
-from content.models import PendingView, Article, Book, Dissertation
-from content.tasks import index_object_task
+from content.models import Article, Book, Dissertation
+from content import daily_views, index_queue
+from content.utils.bulk import increment_from_values
+from content.view_counter import DatabaseViewCounter, get_view_counter
 import logging
 
 logger = logging.getLogger(__name__)
 
+MODEL_MAP = {"article": Article, "book": Book, "dissertation": Dissertation}
+
 
 class Command(BaseCommand):
     help = "Flush PendingView buffer into actual models (increment views) and reindex"
 
     def handle(self, *args, **options):
-        pending = list(PendingView.objects.all())
-        if not pending:
-            self.stdout.write("No pending views to flush.")
-            return
+        counter = get_view_counter()
+        redis_drained = {}
 
-        for pv in pending:
-            model = None
-            if pv.content_type == "article":
-                model = Article
-            elif pv.content_type == "book":
-                model = Book
-            elif pv.content_type == "dissertation":
-                model = Dissertation
+        try:
+            with transaction.atomic():
+                # PendingView rows are always drained, even with the Redis
+                # backend, so rows left over from a backend switch are kept.
+                pending = DatabaseViewCounter().drain()
 
-            if model is None:
-                self.stdout.write(f"Unknown content_type: {pv.content_type}")
-                continue
+                if not isinstance(counter, DatabaseViewCounter):
+                    redis_drained = counter.drain()
+                    for content_type, counts in redis_drained.items():
+                        merged = pending.setdefault(content_type, {})
+                        for content_id, count in counts.items():
+                            merged[content_id] = merged.get(content_id, 0) + count
 
-            try:
-                with transaction.atomic():
-                    updated = model.objects.filter(id=pv.content_id).update(
-                        views=F("views") + pv.count
+                if not pending:
+                    self.stdout.write("No pending views to flush.")
+                    return
+
+                updated = {}
+                for content_type, counts in pending.items():
+                    model = MODEL_MAP.get(content_type)
+                    if model is None:
+                        self.stdout.write(f"Unknown content_type: {content_type}")
+                        continue
+
+                    # one UPDATE ... FROM (VALUES ...) per content type
+                    ids = increment_from_values(model, "views", counts)
+                    updated[content_type] = ids
+                    daily_views.record(content_type, {i: counts[i] for i in ids})
+                    missing = len(counts) - len(ids)
+                    self.stdout.write(
+                        f"Flushed {sum(counts[i] for i in ids)} views to "
+                        f"{len(ids)} {content_type}(s)"
+                        + (f", {missing} not found" if missing else "")
                     )
-                    if updated:
-                        # enqueue indexing as a Celery task so retries are handled by Celery
-                        index_object_task.delay(
-                            model._meta.app_label, model.__name__, pv.content_id
-                        )
-                        self.stdout.write(
-                            f"Flushed {pv.count} views to {pv.content_type}#{pv.content_id}"
-                        )
-                    else:
-                        self.stdout.write(
-                            f"Target not found: {pv.content_type}#{pv.content_id}"
-                        )
-                    # delete pending row
-                    pv.delete()
-            except Exception as e:
-                logger.exception("Error flushing PendingView %s", pv)
-                self.stdout.write(f"Error flushing {pv}: {e}")
+        except Exception as e:
+            logger.exception("Error flushing pending views")
+            if redis_drained:
+                # the DB transaction rolled back; give the drained counts back
+                try:
+                    counter.requeue(redis_drained)
+                except Exception:
+                    logger.exception("Failed to requeue drained view counts")
+            self.stdout.write(self.style.ERROR(f"Error flushing views: {e}"))
+            return
+
+        # queue reindexing; the index queue coalesces repeated ids
+        for content_type, ids in updated.items():
+            try:
+                index_queue.enqueue(MODEL_MAP[content_type], ids, counters_only=True)
+            except Exception:
+                logger.exception("Failed to enqueue reindex for %s", content_type)
 
         self.stdout.write(self.style.SUCCESS("Flush completed."))
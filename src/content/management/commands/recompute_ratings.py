@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from content import ratings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute rating aggregates (average, count, sum, star histogram) of "
+        "all content from ContentRating and fix the rows that drifted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the rows whose stored aggregates differ",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="Differences to print per content type (0 = none)",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        try:
+            drift = ratings.recompute(dry_run=dry_run)
+        except Exception as e:
+            logger.exception("Error recomputing ratings")
+            self.stdout.write(self.style.ERROR(f"Error recomputing ratings: {e}"))
+            return
+
+        for content_type, changed in drift.items():
+            verb = "would be fixed" if dry_run else "fixed"
+            self.stdout.write(f"{len(changed)} {content_type}(s) {verb}")
+            for pk, (stored, expected) in list(changed.items())[: options["limit"]]:
+                diff = ", ".join(
+                    f"{field} {old} -> {new}"
+                    for field, old, new in zip(
+                        ratings.AGGREGATE_FIELDS, stored, expected
+                    )
+                    if old != new
+                )
+                self.stdout.write(f"  {content_type} #{pk}: {diff}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Dry run completed." if dry_run else "Recompute completed."
+            )
+        )
@@ -1,183 +1,350 @@
 # content/management/commands/reindex_search.py
 
-from django.core.management.base import BaseCommand
-from elasticsearch import Elasticsearch
+import re
+from datetime import datetime, time, timedelta
 from django.conf import settings
-from content.models import Article, Book, Dissertation
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from elasticsearch import NotFoundError, helpers
+from content.models import Article, Book, Dissertation, SearchSyncState
+from content import index_queue, search_cache, search_utils
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = "Полная переиндексация всех материалов в Elasticsearch"
+    help = (
+        "Полная переиндексация всех материалов в Elasticsearch без простоя: "
+        "данные пишутся в новый версионный индекс (articles_vN), после чего "
+        "алиас атомарно переключается на него. С --incremental или --since "
+        "обновляются только изменённые записи"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--fast", action="store_true", help="Только создать индексы"
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Документов в одном bulk-запросе",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Потоков для parallel_bulk (1 = streaming_bulk)",
+        )
+        parser.add_argument(
+            "--keep-old",
+            type=int,
+            default=0,
+            help="Сколько предыдущих версий индекса оставить после переключения",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Переключить алиас, даже если часть документов не проиндексирована",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Переиндексировать только записи, изменённые после прошлого прохода",
+        )
+        parser.add_argument(
+            "--since",
+            help="Переиндексировать записи, изменённые после даты (ISO 8601)",
+        )
 
     def handle(self, *args, **options):
-        es_url = settings.ELASTICSEARCH_DSL["default"]["hosts"]
-        es = Elasticsearch(es_url, timeout=30)
+        es = search_utils.get_es_client()
 
-        if not es.ping():
+        if es is None or not es.ping():
             self.stdout.write(self.style.ERROR("Elasticsearch недоступен!"))
             return
 
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size и --workers должны быть больше 0")
+
         indices = [
             ("articles", Article),
             ("books", Book),
             ("dissertations", Dissertation),
         ]
 
-        for index_name, Model in indices:
-            self.stdout.write(f"\nОбработка: {index_name.upper()}")
-
-            # Удаляем и создаём индекс
-            if es.indices.exists(index=index_name):
-                es.indices.delete(index=index_name)
-                self.stdout.write(self.style.WARNING(f"Удалён индекс: {index_name}"))
-
-            mapping = {
-                "mappings": {
-                    "properties": {
-                        "title": {"type": "text", "analyzer": "standard"},
-                        "content": {"type": "text", "analyzer": "standard"},
-                        "author": {"type": "text"},
-                        "author_workplace": {"type": "text"},
-                        "source_name": {"type": "text"},
-                        "source_url": {"type": "keyword"},
-                        "newspaper_or_journal": {"type": "text"},
-                        "type": {"type": "keyword"},
-                        "language": {"type": "keyword"},
-                        "publication_date": {"type": "date"},
-                        "average_rating": {"type": "float"},
-                        "rating_count": {"type": "integer"},
-                        "views": {"type": "integer"},
-                        "image": {"type": "keyword"},
-                        "epub_file": {"type": "keyword"},
-                        "cover_image": {"type": "keyword"},
-                        "categories": {
-                            "type": "nested",
-                            "properties": {
-                                "id": {"type": "integer"},
-                                "name": {
-                                    "type": "text",
-                                    "fields": {"keyword": {"type": "keyword"}},
-                                },
-                                "parent": {
-                                    "type": "integer",
-                                    "null_value": None,
-                                },  # ← Поддержка null
-                            },
-                        },
-                    }
-                }
-            }
+        since = self._parse_since(options["since"]) if options["since"] else None
+        if options["incremental"] or since is not None:
+            for alias, Model in indices:
+                self._incremental(es, alias, Model, since, options)
+            return
 
-            es.indices.create(index=index_name, body=mapping)
-            self.stdout.write(self.style.SUCCESS(f"Создан индекс: {index_name}"))
+        for alias, Model in indices:
+            self.stdout.write(f"\nОбработка: {alias.upper()}")
 
-            if options["fast"]:
-                continue
+            started = timezone.now()
+            index_name = f"{alias}_v{self._next_version(es, alias)}"
+            # Refresh is disabled while building and restored before the swap
+            es.indices.create(
+                index=index_name,
+                mappings=search_utils.INDEX_MAPPING,
+                settings={"refresh_interval": "-1"},
+            )
+            self.stdout.write(self.style.SUCCESS(f"Создан индекс: {index_name}"))
 
-            count = 0
-            total = Model.objects.count()
-            self.stdout.write(f"Индексируем {total} записей...")
-
-            # Process in chunks and prefetch related categories to avoid N+1 queries
-            chunk_size = 500
-            pks_qs = Model.objects.values_list("pk", flat=True).order_by("pk")
-            for start in range(0, total, chunk_size):
-                batch_pks = list(pks_qs[start : start + chunk_size])
-                if not batch_pks:
-                    continue
-                batch_qs = Model.objects.filter(pk__in=batch_pks).prefetch_related(
-                    "categories"
+            count, failed = 0, 0
+            if not options["fast"]:
+                count, failed = self._build(
+                    es, Model.objects.all(), index_name, options
                 )
-                for obj in batch_qs:
-                    try:
-                        doc = {
-                            "title": obj.title,
-                            "author": obj.author,
-                            "language": obj.language,
-                            "average_rating": round(float(obj.average_rating), 2),
-                            "rating_count": obj.rating_count,
-                            "views": obj.views,
-                        }
-
-                        if isinstance(obj, Article):
-                            doc.update(
-                                {
-                                    "content": obj.content,
-                                    "author_workplace": obj.author_workplace or None,
-                                    "type": obj.type,
-                                    "publication_date": obj.publication_date.isoformat()
-                                    if obj.publication_date
-                                    else None,
-                                    "source_name": obj.source_name,
-                                    "source_url": obj.source_url,
-                                    "newspaper_or_journal": obj.newspaper_or_journal,
-                                    "image": obj.image.url if obj.image else None,
-                                }
-                            )
-
-                        if isinstance(obj, Book):
-                            doc.update(
-                                {
-                                    "content": obj.content or None,
-                                    "epub_file": obj.epub_file.url
-                                    if obj.epub_file
-                                    else None,
-                                    "cover_image": obj.cover_image.url
-                                    if obj.cover_image
-                                    else None,
-                                }
-                            )
-
-                        if isinstance(obj, Dissertation):
-                            doc.update(
-                                {
-                                    "content": obj.content,
-                                    "author_workplace": obj.author_workplace or None,
-                                    "publication_date": obj.publication_date.isoformat()
-                                    if obj.publication_date
-                                    else None,
-                                }
-                            )
-
-                        # ← КЛЮЧЕВОЕ ИСПРАВЛЕНИЕ: проверяем, есть ли parent!
-                        doc["categories"] = [
-                            {
-                                "id": cat.id,
-                                "name": cat.name,
-                                "parent": getattr(cat, "parent_id", None)
-                                or None,  # ← БЕЗОПАСНО!
-                            }
-                            for cat in obj.categories.all()
-                        ]
-
-                        es.index(index=index_name, id=obj.id, body=doc)
-                        count += 1
-
-                        if count % 50 == 0:
-                            self.stdout.write(f"   → {count}/{total}")
-
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f"Ошибка при {obj.__class__.__name__} ID={obj.id}: {e}"
-                            )
-                        )
 
+            es.indices.put_settings(
+                index=index_name, settings={"refresh_interval": None}
+            )
             es.indices.refresh(index=index_name)
+
+            if failed and not options["force"]:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{failed} ошибок: алиас {alias} не переключён, "
+                        f"индекс {index_name} оставлен для проверки"
+                    )
+                )
+                continue
+
+            self._swap_alias(es, alias, index_name, options["keep_old"])
+            if not options["fast"]:
+                self._catch_up(es, alias, Model, started, options)
+            search_cache.invalidate(search_utils.content_type_for_index(alias))
+            if not options["fast"]:
+                self._save_watermark(alias, started)
             self.stdout.write(
                 self.style.SUCCESS(
-                    f"ГОТОВО → {count} {Model.__name__} проиндексировано"
+                    f"ГОТОВО → {count} {Model.__name__} проиндексировано, "
+                    f"{alias} → {index_name}"
                 )
             )
 
         self.stdout.write(
             self.style.SUCCESS("\nВСЁ ГОТОВО! ЭЛАСТИК ПОЛНОСТЬЮ ОБНОВЛЁН!")
         )
+
+    def _parse_since(self, value):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f"Неверная дата для --since: {value}")
+            parsed = datetime.combine(day, time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def _save_watermark(self, alias, synced_until):
+        SearchSyncState.objects.update_or_create(
+            index_name=alias, defaults={"synced_until": synced_until}
+        )
+
+    def _incremental(self, es, alias, Model, since, options):
+        """Bulk-index rows changed since ``since`` (or the stored watermark)."""
+        self.stdout.write(f"\nОбработка: {alias.upper()} (инкрементально)")
+
+        state = SearchSyncState.objects.filter(index_name=alias).first()
+        # An explicit --since past the stored mark leaves a gap: keep the mark
+        advance = state is None or since is None or since <= state.synced_until
+        if since is None:
+            if state is not None:
+                # Overlap covers transactions that committed after the last
+                # pass started but carry an earlier updated_at
+                overlap = getattr(settings, "SEARCH_SYNC_OVERLAP_SECONDS", 300)
+                since = state.synced_until - timedelta(seconds=overlap)
+
+        started = timezone.now()
+        queryset = Model.objects.all()
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+            self.stdout.write(f"Изменения с {since.isoformat()}")
+        else:
+            self.stdout.write(
+                self.style.WARNING("Нет сохранённой отметки: обновляются все записи")
+            )
+
+        # Writes go through the alias to whichever version is live
+        count, failed = self._build(es, queryset, alias, options)
+        if failed:
+            self.stdout.write(
+                self.style.ERROR(f"{failed} ошибок: отметка {alias} не сдвинута")
+            )
+            return
+
+        if count:
+            # searchable first, or a racing search re-caches the old results
+            es.indices.refresh(index=alias)
+            search_cache.invalidate(search_utils.content_type_for_index(alias))
+        if advance:
+            self._save_watermark(alias, started)
+        self.stdout.write(
+            self.style.SUCCESS(f"ГОТОВО → {count} {Model.__name__} обновлено")
+        )
+
+    def _catch_up(self, es, alias, Model, started, options):
+        """
+        Re-send what was written to the previous index during the build.
+
+        Until the swap, changes went through the alias to the old version,
+        so rows the build had already passed are stale in the new one.
+        Edited rows are found by ``updated_at``. Counters (views, ratings)
+        change without touching it, so their partial updates are resent
+        for the ids the index queue logged since the build started.
+        """
+        overlap = getattr(settings, "SEARCH_SYNC_OVERLAP_SECONDS", 300)
+        since = started - timedelta(seconds=overlap)
+        count, failed = self._build(
+            es, Model.objects.filter(updated_at__gte=since), alias, options
+        )
+        if count:
+            es.indices.refresh(index=alias)
+
+        for ids in self._counter_batches(Model, since, options["chunk_size"]):
+            stats = search_utils.update_counters(Model, ids)
+            if stats is None:
+                failed += len(ids)
+                break
+            failed += stats["failed"]
+            # created while the catch-up ran: send the full document
+            if stats["missing_ids"]:
+                index_queue.enqueue(Model, stats["missing_ids"])
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f"Догоняющий проход {alias}: {failed} ошибок")
+            )
+        else:
+            self.stdout.write(f"Догоняющий проход {alias}: {count} изменённых записей")
+
+    def _counter_batches(self, Model, since, chunk_size):
+        """
+        Ids whose counters may be stale after the swap, in batches.
+
+        Without a counter log reaching back to ``since`` every row is
+        resent, streaming the primary keys instead of loading them at once.
+        """
+        ids = index_queue.counters_changed_since(Model, since)
+        if ids is not None:
+            for start in range(0, len(ids), chunk_size):
+                yield ids[start : start + chunk_size]
+            return
+
+        self.stdout.write(
+            self.style.WARNING("Нет журнала счётчиков: обновляются все записи")
+        )
+        batch = []
+        pks = Model.objects.order_by("pk").values_list("pk", flat=True)
+        for pk in pks.iterator(chunk_size=chunk_size):
+            batch.append(pk)
+            if len(batch) == chunk_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _versions(self, es, alias):
+        """Existing versioned indices of ``alias`` as {version: index_name}."""
+        pattern = re.compile(rf"^{re.escape(alias)}_v(\d+)$")
+        try:
+            names = es.indices.get(index=f"{alias}_v*").keys()
+        except NotFoundError:
+            return {}
+        versions = {}
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                versions[int(match.group(1))] = name
+        return versions
+
+    def _next_version(self, es, alias):
+        return max(self._versions(es, alias), default=0) + 1
+
+    def _iter_objects(self, queryset, chunk_size):
+        """Walk the rows by primary key (keyset pagination, no OFFSET)."""
+        last_pk = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .prefetch_related("categories")[:chunk_size]
+            )
+            if not batch:
+                return
+            yield from batch
+            last_pk = batch[-1].pk
+
+    def _build(self, es, queryset, index_name, options):
+        Model = queryset.model
+        chunk_size = options["chunk_size"]
+        total = queryset.count()
+        self.stdout.write(f"Индексируем {total} записей...")
+
+        actions = (
+            {
+                "_index": index_name,
+                "_id": obj.pk,
+                "_source": search_utils._build_doc(obj),
+            }
+            for obj in self._iter_objects(queryset, chunk_size)
+        )
+        if options["workers"] > 1:
+            results = helpers.parallel_bulk(
+                es,
+                actions,
+                thread_count=options["workers"],
+                chunk_size=chunk_size,
+                raise_on_error=False,
+            )
+        else:
+            results = helpers.streaming_bulk(
+                es, actions, chunk_size=chunk_size, raise_on_error=False
+            )
+
+        count, failed = 0, 0
+        for ok, item in results:
+            if ok:
+                count += 1
+                if count % chunk_size == 0:
+                    self.stdout.write(f"   → {count}/{total}")
+                continue
+            failed += 1
+            info = next(iter(item.values()), {})
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Ошибка при {Model.__name__} ID={info.get('_id')}: "
+                    f"{info.get('error')}"
+                )
+            )
+        return count, failed
+
+    def _swap_alias(self, es, alias, index_name, keep_old):
+        """Point ``alias`` at ``index_name`` in a single atomic request."""
+        actions = []
+        try:
+            current = list(es.indices.get_alias(name=alias).keys())
+        except NotFoundError:
+            current = []
+        for name in current:
+            actions.append({"remove": {"index": name, "alias": alias}})
+
+        # An index created before aliases were introduced occupies the name;
+        # it is dropped in the same request that creates the alias.
+        if not current and es.indices.exists(index=alias):
+            actions.append({"remove_index": {"index": alias}})
+            self.stdout.write(self.style.WARNING(f"Удалён индекс: {alias}"))
+
+        actions.append({"add": {"index": index_name, "alias": alias}})
+        es.indices.update_aliases(actions=actions)
+
+        old = sorted(v for v, n in self._versions(es, alias).items() if n != index_name)
+        for version in old[: max(len(old) - keep_old, 0)]:
+            name = f"{alias}_v{version}"
+            es.indices.delete(index=name)
+            self.stdout.write(self.style.WARNING(f"Удалён индекс: {name}"))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.11 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    """Compute path and full_name for existing categories, parents first."""
+    for model_name in ("BookCategory", "DissertationCategory"):
+        Category = apps.get_model("content", model_name)
+        rows = {
+            row["id"]: row for row in Category.objects.values("id", "name", "parent_id")
+        }
+        paths = {}
+
+        def path_of(pk, seen=()):
+            if pk not in paths:
+                parent_id = rows[pk]["parent_id"]
+                if parent_id is None or parent_id in seen:
+                    paths[pk] = f"/{pk}/"
+                else:
+                    paths[pk] = f"{path_of(parent_id, seen + (pk,))}{pk}/"
+            return paths[pk]
+
+        for pk, row in rows.items():
+            parent = rows.get(row["parent_id"])
+            full_name = f"{parent['name']} > {row['name']}" if parent else row["name"]
+            Category.objects.filter(pk=pk).update(path=path_of(pk), full_name=full_name)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0019_search_sync_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookcategory",
+            name="full_name",
+            field=models.CharField(default="", editable=False, max_length=203),
+        ),
+        migrations.AddField(
+            model_name="bookcategory",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.AddField(
+            model_name="dissertationcategory",
+            name="full_name",
+            field=models.CharField(default="", editable=False, max_length=203),
+        ),
+        migrations.AddField(
+            model_name="dissertationcategory",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.11 on 2026-10-16 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0020_category_paths"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(fields=["views", "id"], name="article_views_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["publication_date", "id"], name="article_pubdate_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["average_rating", "id"], name="article_rating_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["views", "id"], name="book_views_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["average_rating", "id"], name="book_rating_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dissertation",
+            index=models.Index(fields=["views", "id"], name="diss_views_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="dissertation",
+            index=models.Index(
+                fields=["publication_date", "id"], name="diss_pubdate_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dissertation",
+            index=models.Index(
+                fields=["average_rating", "id"], name="diss_rating_id_idx"
+            ),
+        ),
+    ]
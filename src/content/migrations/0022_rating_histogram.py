@@ -0,0 +1,139 @@
+# Generated by Django 4.2.11 on 2026-10-16 23:18
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_histograms(apps, schema_editor):
+    """Compute rating_sum and the star histogram from existing ratings."""
+    ContentRating = apps.get_model("content", "ContentRating")
+    for content_type, model_name in (
+        ("article", "Article"),
+        ("book", "Book"),
+        ("dissertation", "Dissertation"),
+    ):
+        Model = apps.get_model("content", model_name)
+        stats = {}
+        rows = (
+            ContentRating.objects.filter(content_type=content_type)
+            .values("content_id", "rating")
+            .annotate(n=Count("id"))
+        )
+        for row in rows:
+            item = stats.setdefault(row["content_id"], {})
+            item[row["rating"]] = row["n"]
+
+        objs = list(Model.objects.filter(pk__in=stats.keys()))
+        for obj in objs:
+            item = stats[obj.pk]
+            for star in range(1, 6):
+                setattr(obj, f"rating_{star}", item.get(star, 0))
+            obj.rating_sum = sum(star * n for star, n in item.items())
+            obj.rating_count = sum(item.values())
+            obj.average_rating = round(obj.rating_sum / obj.rating_count, 2)
+        Model.objects.bulk_update(
+            objs,
+            [f"rating_{star}" for star in range(1, 6)]
+            + ["rating_sum", "rating_count", "average_rating"],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0021_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dissertation",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dissertation",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dissertation",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dissertation",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dissertation",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dissertation",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.2.11 on 2026-10-16 23:24
+
+import datetime
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def clear_view_records(apps, schema_editor):
+    """
+    Drop the existing dedupe rows.
+
+    They only matter for the dedupe TTL (a day), have no ``visitor``/``day``
+    yet and may contain duplicates the new unique constraint rejects.
+    """
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("TRUNCATE TABLE content_viewrecord")
+    else:
+        apps.get_model("content", "ViewRecord").objects.all().delete()
+
+
+def partition_by_day(apps, schema_editor):
+    """Recreate the (empty) table on PostgreSQL range-partitioned by ``day``."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP TABLE content_viewrecord")
+    schema_editor.execute(
+        """
+        CREATE TABLE content_viewrecord (
+            id bigint GENERATED BY DEFAULT AS IDENTITY,
+            session_key varchar(40) NULL,
+            visitor varchar(48) NOT NULL,
+            content_type varchar(20) NOT NULL,
+            content_id integer NOT NULL CHECK (content_id >= 0),
+            day date NOT NULL,
+            last_seen timestamp with time zone NOT NULL,
+            user_id integer NULL
+                REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+            PRIMARY KEY (id, day),
+            CONSTRAINT viewrec_day_visitor_uniq
+                UNIQUE (day, visitor, content_type, content_id)
+        ) PARTITION BY RANGE (day)
+        """
+    )
+    schema_editor.execute(
+        "CREATE INDEX content_viewrecord_user_id_idx ON content_viewrecord (user_id)"
+    )
+    # UTC, like the ``day`` the view counter writes and maintenance creates
+    today = timezone.now().date()
+    for offset in range(-1, 8):
+        day = today + datetime.timedelta(days=offset)
+        upper = day + datetime.timedelta(days=1)
+        schema_editor.execute(
+            f"CREATE TABLE content_viewrecord_p{day:%Y%m%d} "
+            f"PARTITION OF content_viewrecord "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+
+
+def unpartition(apps, schema_editor):
+    """
+    Reverse of ``partition_by_day``: replace the partitioned table with a
+    plain one for the earlier operations to unwind. Its rows are only
+    dedupe state and are dropped, as the forward direction does.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP TABLE content_viewrecord")
+    schema_editor.create_model(apps.get_model("content", "ViewRecord"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0022_rating_histogram"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_view_records, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="viewrecord",
+            name="content_vie_session_2bc873_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="viewrecord",
+            name="content_vie_user_id_cf26d5_idx",
+        ),
+        migrations.AddField(
+            model_name="viewrecord",
+            name="day",
+            field=models.DateField(default=datetime.date(1970, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="viewrecord",
+            name="visitor",
+            field=models.CharField(default="", max_length=48),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="viewrecord",
+            name="session_key",
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="viewrecord",
+            constraint=models.UniqueConstraint(
+                fields=("day", "visitor", "content_type", "content_id"),
+                name="viewrec_day_visitor_uniq",
+            ),
+        ),
+        migrations.RunPython(partition_by_day, unpartition),
+    ]
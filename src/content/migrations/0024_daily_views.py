@@ -0,0 +1,61 @@
+# Generated by Django 4.2.11 on 2026-10-16 23:26
+
+from django.db import migrations, models
+
+
+def add_brin_index(apps, schema_editor):
+    """BRIN on ``day``: rows arrive in day order, so the index stays tiny."""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX dailyview_day_brin ON content_dailyview USING brin (day)"
+        )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS dailyview_day_brin")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0023_partition_viewrecord"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyView",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.CharField(
+                        choices=[
+                            ("article", "Article"),
+                            ("book", "Book"),
+                            ("dissertation", "Dissertation"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("content_id", models.PositiveIntegerField()),
+                ("day", models.DateField()),
+                ("views", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="dailyview",
+            constraint=models.UniqueConstraint(
+                fields=("content_type", "content_id", "day"),
+                name="dailyview_item_day_uniq",
+            ),
+        ),
+        migrations.RunPython(add_brin_index, drop_brin_index),
+    ]
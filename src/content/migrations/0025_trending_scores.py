@@ -0,0 +1,65 @@
+# Generated by Django 4.2.11 on 2026-10-16 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0024_daily_views"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_type",
+                    models.CharField(
+                        choices=[
+                            ("article", "Article"),
+                            ("book", "Book"),
+                            ("dissertation", "Dissertation"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("content_id", models.PositiveIntegerField()),
+                (
+                    "language",
+                    models.CharField(
+                        choices=[
+                            ("tm", "Turkmen"),
+                            ("ru", "Russian"),
+                            ("en", "English"),
+                        ],
+                        max_length=2,
+                    ),
+                ),
+                ("score", models.FloatField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-score"], name="trending_score_idx"),
+                    models.Index(
+                        fields=["content_type", "-score"],
+                        name="trending_type_score_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="trendingscore",
+            constraint=models.UniqueConstraint(
+                fields=("content_type", "content_id"), name="trending_item_uniq"
+            ),
+        ),
+    ]
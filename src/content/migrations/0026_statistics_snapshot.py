@@ -0,0 +1,34 @@
+# Generated by Django 4.2.11 on 2026-10-16 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0025_trending_scores"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatisticsSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("total_materials", models.PositiveIntegerField(default=0)),
+                ("total_views", models.BigIntegerField(default=0)),
+                ("total_users", models.PositiveIntegerField(default=0)),
+                ("data", models.JSONField(default=dict)),
+            ],
+            options={
+                "get_latest_by": "created_at",
+            },
+        ),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from ckeditor.fields import RichTextField
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 
 
 # =============Categories=============
@@ -17,7 +20,17 @@ class ArticleCategory(models.Model):
         return self.name
 
 
-class BookCategory(models.Model):
+class HierarchicalCategory(models.Model):
+    """
+    Category tree stored as an adjacency list plus a materialized path.
+
+    ``path`` holds the ids from the root down to the node ("/1/5/12/") and is
+    maintained on save, so a subtree is one indexed prefix lookup
+    (``path__startswith``). ``full_name`` caches the "Parent > Child" label
+    used by ``__str__``. A save and the rewrites of the subtree it causes
+    are one transaction; the cache and search signals act on commit.
+    """
+
     name = models.CharField(max_length=100)
     parent = models.ForeignKey(
         "self",
@@ -26,32 +39,94 @@ class BookCategory(models.Model):
         blank=True,
         related_name="subcategories",
     )
+    path = models.CharField(max_length=255, db_index=True, editable=False, default="")
+    full_name = models.CharField(max_length=203, editable=False, default="")
 
     class Meta:
-        unique_together = ("name", "parent")
-        verbose_name_plural = "Book Categories"
+        abstract = True
 
     def __str__(self):
-        return f"{self.parent.name} > {self.name}" if self.parent else self.name
+        return self.full_name or self.name
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id:
+            parent_path = (
+                type(self)
+                .objects.filter(pk=self.parent_id)
+                .values_list("path", flat=True)
+                .first()
+            )
+            if parent_path and f"/{self.pk}/" in parent_path:
+                raise ValidationError(
+                    {"parent": "A category cannot be moved below itself."}
+                )
+
+    def build_path(self):
+        parent_path = self.parent.path if self.parent_id else "/"
+        return f"{parent_path}{self.pk}/"
+
+    def build_full_name(self):
+        return f"{self.parent.name} > {self.name}" if self.parent_id else self.name
 
+    def save(self, *args, **kwargs):
+        model = type(self)
+        with transaction.atomic():
+            old = None
+            if self.pk:
+                old = model.objects.filter(pk=self.pk).values("path", "name").first()
+            if old is not None:
+                # The id is known: write path and label with the row itself
+                self.path, self.full_name = self.build_path(), self.build_full_name()
+                if kwargs.get("update_fields") is not None:
+                    kwargs["update_fields"] = {
+                        *kwargs["update_fields"],
+                        "path",
+                        "full_name",
+                    }
+            super().save(*args, **kwargs)
+
+            path, full_name = self.build_path(), self.build_full_name()
+            if (path, full_name) != (self.path, self.full_name):
+                # New row: the id (and so the path) exists only now
+                self.path, self.full_name = path, full_name
+                model.objects.filter(pk=self.pk).update(path=path, full_name=full_name)
+
+            if old is None:
+                return
+            if old["path"] and old["path"] != path:
+                # Moved: rewrite the prefix of the whole subtree in one UPDATE
+                model.objects.filter(path__startswith=old["path"]).exclude(
+                    pk=self.pk
+                ).update(path=Concat(Value(path), Substr("path", len(old["path"]) + 1)))
+            if old["name"] != self.name:
+                self.subcategories.update(
+                    full_name=Concat(Value(f"{self.name} > "), F("name"))
+                )
+
+    def get_descendants(self, include_self=True):
+        queryset = type(self).objects.filter(path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    @property
+    def ancestor_ids(self):
+        """Ids from the root down to this category (itself included)."""
+        return [int(part) for part in self.path.strip("/").split("/") if part]
+
+
+class BookCategory(HierarchicalCategory):
+    class Meta:
+        unique_together = ("name", "parent")
+        verbose_name_plural = "Book Categories"
 
-class DissertationCategory(models.Model):
-    name = models.CharField(max_length=100)
-    parent = models.ForeignKey(
-        "self",
-        on_delete=models.CASCADE,
-        null=True,
-        blank=True,
-        related_name="subcategories",
-    )
 
+class DissertationCategory(HierarchicalCategory):
     class Meta:
         unique_together = ("name", "parent")
         verbose_name_plural = "Dissertation Categories"
 
-    def __str__(self):
-        return f"{self.parent.name} > {self.name}" if self.parent else self.name
-
 
 # =============User_Profile=============
 class Profile(models.Model):
@@ -97,6 +172,13 @@ class Article(models.Model):
     rating = models.FloatField(default=0.0)
     average_rating = models.FloatField(default=0.0)
     rating_count = models.PositiveIntegerField(default=0)
+    # Maintained incrementally by content.ratings
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
     views = models.IntegerField(default=0, db_index=True)
     language = models.CharField(
         max_length=2, choices=LANGUAGE_CHOICES, default="tm", db_index=True
@@ -112,6 +194,17 @@ class Article(models.Model):
         ArticleCategory, related_name="articles", blank=True
     )
     image = models.ImageField(upload_to="books/article_images/", blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Keyset pagination: (sort value, id) descending scans
+        indexes = [
+            models.Index(fields=["views", "id"], name="article_views_id_idx"),
+            models.Index(
+                fields=["publication_date", "id"], name="article_pubdate_id_idx"
+            ),
+            models.Index(fields=["average_rating", "id"], name="article_rating_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.language})"
@@ -128,11 +221,26 @@ class Book(models.Model):
     rating = models.FloatField(default=0.0)
     average_rating = models.FloatField(default=0.0)
     rating_count = models.PositiveIntegerField(default=0)
+    # Maintained incrementally by content.ratings
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
     views = models.IntegerField(default=0, db_index=True)
     language = models.CharField(
         max_length=2, choices=LANGUAGE_CHOICES, default="tm", db_index=True
     )
     categories = models.ManyToManyField(BookCategory, related_name="books", blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Keyset pagination: (sort value, id) descending scans
+        indexes = [
+            models.Index(fields=["views", "id"], name="book_views_id_idx"),
+            models.Index(fields=["average_rating", "id"], name="book_rating_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.author})"
@@ -153,6 +261,13 @@ class Dissertation(models.Model):
     rating = models.FloatField(default=0.0)
     average_rating = models.FloatField(default=0.0)
     rating_count = models.PositiveIntegerField(default=0)
+    # Maintained incrementally by content.ratings
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
     language = models.CharField(
         max_length=2, choices=LANGUAGE_CHOICES, default="tm", db_index=True
     )
@@ -161,6 +276,15 @@ class Dissertation(models.Model):
     categories = models.ManyToManyField(
         DissertationCategory, related_name="dissertations", blank=True
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Keyset pagination: (sort value, id) descending scans
+        indexes = [
+            models.Index(fields=["views", "id"], name="diss_views_id_idx"),
+            models.Index(fields=["publication_date", "id"], name="diss_pubdate_id_idx"),
+            models.Index(fields=["average_rating", "id"], name="diss_rating_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.author})"
@@ -207,19 +331,119 @@ class PendingView(models.Model):
         return f"PendingView {self.content_type}#{self.content_id} = {self.count}"
 
 
+class DailyView(models.Model):
+    """
+    Views of one item on one (UTC) day, rolled up by ``flush_views``.
+
+    Rows are appended in day order, so on PostgreSQL a BRIN index on
+    ``day`` (migration 0024) serves date-range scans across items.
+    """
+
+    content_type = models.CharField(max_length=20, choices=PendingView.CONTENT_CHOICES)
+    content_id = models.PositiveIntegerField()
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "content_id", "day"],
+                name="dailyview_item_day_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"DailyView {self.content_type}#{self.content_id} {self.day} = {self.views}"
+        )
+
+
+class TrendingScore(models.Model):
+    """
+    Precomputed trending score of an item, rebuilt by ``trending.compute_scores``.
+
+    Only items with recent activity have a row; ``language`` is copied
+    from the item so the common filter needs no join.
+    """
+
+    content_type = models.CharField(max_length=20, choices=PendingView.CONTENT_CHOICES)
+    content_id = models.PositiveIntegerField()
+    language = models.CharField(max_length=2, choices=Article.LANGUAGE_CHOICES)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "content_id"], name="trending_item_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["-score"], name="trending_score_idx"),
+            models.Index(
+                fields=["content_type", "-score"], name="trending_type_score_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"TrendingScore {self.content_type}#{self.content_id} = {self.score:.2f}"
+
+
+class StatisticsSnapshot(models.Model):
+    """
+    Admin dashboard statistics at one point in time.
+
+    Taken periodically by ``statistics_snapshot.take``; the headline totals
+    are columns so the history can be read without loading ``data``.
+    """
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    total_materials = models.PositiveIntegerField(default=0)
+    total_views = models.BigIntegerField(default=0)
+    total_users = models.PositiveIntegerField(default=0)
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        get_latest_by = "created_at"
+
+    def __str__(self):
+        return f"StatisticsSnapshot @ {self.created_at}"
+
+
+class SearchSyncState(models.Model):
+    """High-water mark of the last successful reindex pass, per search index."""
+
+    index_name = models.CharField(max_length=50, unique=True)
+    synced_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.index_name} synced until {self.synced_until}"
+
+
 class ViewRecord(models.Model):
-    """Track recent views per user or per session to avoid double-counting within TTL."""
+    """
+    Track recent views per user or per session to avoid double-counting within TTL.
+
+    Rows are keyed by the UTC ``day`` of the view. On PostgreSQL the table
+    is range-partitioned by ``day`` (migration 0023), so expired days are
+    dropped as whole partitions (see ``view_counter.maintain_view_records``).
+    """
 
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
-    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
+    session_key = models.CharField(max_length=40, null=True, blank=True)
+    # "u<user id>" or "s<session key>": one non-null dedupe key for both
+    visitor = models.CharField(max_length=48)
     content_type = models.CharField(max_length=20)
     content_id = models.PositiveIntegerField()
+    day = models.DateField()
     last_seen = models.DateTimeField(auto_now=True)
 
     class Meta:
-        indexes = [
-            models.Index(fields=["session_key", "content_type", "content_id"]),
-            models.Index(fields=["user", "content_type", "content_id"]),
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "visitor", "content_type", "content_id"],
+                name="viewrec_day_visitor_uniq",
+            ),
         ]
 
     def __str__(self):
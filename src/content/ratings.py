@@ -0,0 +1,208 @@
+"""
+Incrementally maintained rating aggregates.
+
+Every content item stores ``rating_sum``, ``rating_count``, a 1-5 star
+histogram (``rating_1`` .. ``rating_5``) and the derived
+``average_rating``. A vote adjusts them by its delta with ``F()``
+expressions in the same transaction as the ``ContentRating`` write, so it
+costs O(1) regardless of how many ratings the item has; a re-vote moves
+one star between histogram buckets.
+
+``recompute`` rebuilds the aggregates from ``ContentRating`` to repair
+drift (rows written outside ``record_rating``, deleted ratings).
+"""
+
+import logging
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+
+from . import index_queue
+from .content_types import MODELS
+from .models import ContentRating
+from .utils import bulk, cache_versions
+
+logger = logging.getLogger(__name__)
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def histogram_field(star):
+    return f"rating_{star}"
+
+
+HISTOGRAM_FIELDS = tuple(histogram_field(star) for star in STARS)
+
+AGGREGATE_FIELDS = ("rating_count", "rating_sum", "average_rating") + HISTOGRAM_FIELDS
+
+
+def average(rating_sum, rating_count):
+    return round(rating_sum / rating_count, 2) if rating_count else 0.0
+
+
+@transaction.atomic
+def record_rating(user, content_type, content_id, value):
+    """
+    Create or change ``user``'s rating of an item and update its aggregates.
+
+    Args:
+        user: Voting user
+        content_type: "article", "book" or "dissertation"
+        content_id: Primary key of the item
+        value: Stars, 1-5
+
+    Returns:
+        dict: {"created", "average_rating", "rating_count"}
+
+    Raises:
+        Model.DoesNotExist: The item does not exist (nothing is written)
+    """
+    model = MODELS[content_type]
+    lookup = {"user": user, "content_type": content_type, "content_id": content_id}
+
+    rating = ContentRating.objects.select_for_update().filter(**lookup).first()
+    created = rating is None
+    if created:
+        try:
+            with transaction.atomic():
+                rating = ContentRating.objects.create(rating=value, **lookup)
+        except IntegrityError:
+            # a concurrent first vote of the same user won the insert
+            rating = ContentRating.objects.select_for_update().get(**lookup)
+            created = False
+
+    previous = None if created else rating.rating
+    updates = {}
+    if created:
+        updates = {
+            "rating_sum": F("rating_sum") + value,
+            "rating_count": F("rating_count") + 1,
+            histogram_field(value): F(histogram_field(value)) + 1,
+        }
+    elif previous != value:
+        rating.rating = value
+        rating.save(update_fields=["rating"])
+        updates = {
+            "rating_sum": F("rating_sum") + (value - previous),
+            histogram_field(value): F(histogram_field(value)) + 1,
+            histogram_field(previous): F(histogram_field(previous)) - 1,
+        }
+
+    items = model.objects.filter(pk=content_id)
+    if updates and not items.update(**updates):
+        raise model.DoesNotExist(f"{content_type} {content_id} not found")
+
+    # The row stays locked by the UPDATE until commit, so this is consistent
+    rating_sum, rating_count = items.values_list("rating_sum", "rating_count").get()
+    average_rating = average(rating_sum, rating_count)
+    if updates:
+        items.update(average_rating=average_rating)
+
+    return {
+        "created": created,
+        "average_rating": average_rating,
+        "rating_count": rating_count,
+    }
+
+
+def histogram(obj):
+    """Star histogram of one item as {"1": n, ..., "5": n}."""
+    return {str(star): getattr(obj, histogram_field(star)) for star in STARS}
+
+
+def global_histogram():
+    """
+    Star histogram over all content, summed from the per-item histograms.
+
+    Returns:
+        dict: {"1": n, ..., "5": n}
+    """
+    totals = dict.fromkeys(STARS, 0)
+    for model in MODELS.values():
+        sums = model.objects.aggregate(
+            **{f"r{star}": Sum(histogram_field(star)) for star in STARS}
+        )
+        for star in STARS:
+            totals[star] += sums[f"r{star}"] or 0
+    return {str(star): count for star, count in totals.items()}
+
+
+def _aggregates(stars):
+    """Values of ``AGGREGATE_FIELDS`` for a {star: count} histogram."""
+    rating_count = sum(stars.values())
+    rating_sum = sum(star * n for star, n in stars.items())
+    return (
+        rating_count,
+        rating_sum,
+        average(rating_sum, rating_count),
+    ) + tuple(stars.get(star, 0) for star in STARS)
+
+
+def recompute(dry_run=False):
+    """
+    Rebuild the rating aggregates of all content from ``ContentRating``.
+
+    Ratings are grouped once by (content_type, content_id, rating); only
+    rows whose stored aggregates differ are written, with one set-based
+    UPDATE per type. On PostgreSQL the ratings table is share-locked
+    meanwhile, so a vote committing during the pass cannot have its delta
+    overwritten; votes wait until the pass commits.
+
+    Args:
+        dry_run: Only report the differences
+
+    Returns:
+        dict: content_type -> {id: (stored, expected)}, both tuples in
+        ``AGGREGATE_FIELDS`` order
+    """
+    drift = {content_type: {} for content_type in MODELS}
+    with transaction.atomic():
+        if not dry_run and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "LOCK TABLE %s IN SHARE MODE"
+                    % connection.ops.quote_name(ContentRating._meta.db_table)
+                )
+
+        stars = {content_type: {} for content_type in MODELS}
+        rows = (
+            ContentRating.objects.values_list("content_type", "content_id", "rating")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        for content_type, content_id, star, n in rows:
+            if content_type in stars:
+                stars[content_type].setdefault(content_id, {})[star] = n
+
+        for content_type, model in MODELS.items():
+            stored_rows = model.objects.values_list("id", *AGGREGATE_FIELDS)
+            for pk, *stored in stored_rows.iterator(chunk_size=5000):
+                expected = _aggregates(stars[content_type].get(pk, {}))
+                if tuple(stored) != expected:
+                    drift[content_type][pk] = (tuple(stored), expected)
+
+            if not dry_run:
+                bulk.assign_from_values(
+                    model,
+                    AGGREGATE_FIELDS,
+                    {pk: expected for pk, (_, expected) in drift[content_type].items()},
+                )
+
+    if not dry_run:
+        for content_type, changed in drift.items():
+            if changed:
+                _refresh(content_type, list(changed))
+    return drift
+
+
+def _refresh(content_type, ids):
+    """Push corrected counters to the search index and drop cached payloads."""
+    try:
+        index_queue.enqueue(MODELS[content_type], ids, counters_only=True)
+    except Exception:
+        logger.exception("Failed to enqueue reindex for %s", content_type)
+    try:
+        cache_versions.bump_versions(
+            [content_type] + [f"{content_type}:{pk}" for pk in ids]
+        )
+    except Exception:
+        logger.exception("Failed to invalidate cache for %s", content_type)
@@ -0,0 +1,162 @@
+"""
+Search result cache with canonical keys and stale-while-revalidate.
+
+Keys are built from the whitelisted, normalized search parameters, so
+``?q=a&page=1`` and ``?page=1&q=a`` share an entry. Each entry records the
+versions of the indices it was computed from (see ``utils.cache_versions``);
+``search_utils`` bumps an index's version whenever documents in it change.
+
+An entry that has expired or whose index versions moved on is stale, not
+gone: one request takes a short lock and recomputes it while concurrent
+requests keep getting the stale copy (see ``utils.single_flight``; on a
+cold miss they wait for the one computation instead). Stale copies are
+also served when Elasticsearch fails during the refresh.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from django.conf import settings
+
+from .utils import cache_versions, single_flight
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = ("article", "book", "dissertation")
+
+# Parameters that affect the result
+SEARCH_PARAMS = (
+    "q",
+    "page",
+    "content_type",
+    "language",
+    "type",
+    "author",
+    "publication_date",
+    "publication_date__gte",
+    "publication_date__lte",
+    "category_id",
+    "category_tree",
+    "category_name",
+)
+
+
+def _setting(name, default):
+    return int(getattr(settings, name, default))
+
+
+def normalize_params(params):
+    """
+    Reduce query parameters to the canonical set that affects results.
+
+    Unknown parameters, empty values and defaults are dropped, and the
+    query's whitespace is collapsed. Other values are kept verbatim since
+    they are used as-is in term filters.
+
+    Returns:
+        dict: Canonical parameters
+    """
+    canonical = {}
+    for name in SEARCH_PARAMS:
+        value = params.get(name)
+        if value is None:
+            continue
+        if name == "q":
+            value = " ".join(str(value).split())
+        if not value:
+            continue
+        if name in ("page", "category_id", "category_tree"):
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+            if name == "page" and value <= 1:
+                continue
+        elif name == "content_type" and value not in CONTENT_TYPES:
+            continue
+        canonical[name] = value
+    return canonical
+
+
+def build_key(params):
+    """
+    Return the cache key and the version scopes (indices) a search depends on.
+
+    Returns:
+        tuple: (key, tuple of scopes such as "search:article")
+    """
+    canonical = normalize_params(params)
+    content_type = canonical.get("content_type")
+    content_types = (content_type,) if content_type else CONTENT_TYPES
+    scopes = tuple(search_scope(ct) for ct in content_types)
+    raw = json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return f"search:{digest}", scopes
+
+
+def search_scope(content_type):
+    """Version scope of the search index of ``content_type``."""
+    return f"search:{content_type}"
+
+
+def invalidate(content_type):
+    """Mark cached searches over ``content_type``'s index as stale."""
+    cache_versions.bump_version(search_scope(content_type))
+
+
+def _is_fresh(entry, versions):
+    return entry["versions"] == versions and entry["fresh_until"] > time.time()
+
+
+def _entry(data, versions):
+    return {
+        "data": data,
+        "versions": versions,
+        "fresh_until": time.time() + _setting("SEARCH_CACHE_TTL", 300),
+    }
+
+
+def _timeout():
+    return _setting("SEARCH_CACHE_TTL", 300) + _setting("SEARCH_CACHE_STALE_TTL", 600)
+
+
+def get_or_compute(params, compute):
+    """
+    Return the cached search payload for ``params`` or compute it.
+
+    Args:
+        params: Query parameters (QueryDict or dict)
+        compute: Callable returning the payload; may raise
+
+    Returns:
+        The payload (possibly stale while another request refreshes it)
+    """
+    key, scopes = build_key(params)
+    versions = cache_versions.get_versions(scopes)
+    entry = single_flight.get_or_compute(
+        key,
+        lambda: _entry(compute(), versions),
+        _timeout(),
+        is_fresh=lambda entry: _is_fresh(entry, versions),
+        lock_timeout=_setting("SEARCH_CACHE_LOCK_TIMEOUT", 10),
+    )
+    return entry["data"]
+
+
+async def aget_or_compute(params, compute):
+    """Async variant of ``get_or_compute``; ``compute`` is a coroutine function."""
+    key, scopes = build_key(params)
+    versions = await cache_versions.aget_versions(scopes)
+
+    async def build():
+        return _entry(await compute(), versions)
+
+    entry = await single_flight.aget_or_compute(
+        key,
+        build,
+        _timeout(),
+        is_fresh=lambda entry: _is_fresh(entry, versions),
+        lock_timeout=_setting("SEARCH_CACHE_LOCK_TIMEOUT", 10),
+    )
+    return entry["data"]
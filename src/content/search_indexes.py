@@ -10,11 +10,24 @@ from elasticsearch_dsl import (
     Nested,
     InnerDoc,
 )
-from elasticsearch_dsl.connections import connections
 from .models import Article, Book, Dissertation
+from .search_utils import get_es_client
 
-# Подключение к Elasticsearch
-connections.create_connection(hosts=["http://127.0.0.1:9200"], timeout=30)
+# Клиент не регистрируется в реестре elasticsearch-dsl при импорте:
+# документы берут его из get_es_client() при каждом обращении, поэтому
+# форкнутые воркеры Celery/gunicorn получают собственный пул соединений.
+
+
+class ProcessClientDocument(Document):
+    """Document whose default connection is this process's shared client."""
+
+    @classmethod
+    def _get_using(cls, using=None):
+        return using or get_es_client()
+
+    @classmethod
+    def init(cls, index=None, using=None):
+        return super().init(index=index, using=cls._get_using(using))
 
 
 class CategoryDoc(InnerDoc):
@@ -24,7 +37,7 @@ class CategoryDoc(InnerDoc):
 
 
 # ======================= СТАТЬИ =======================
-class ArticleDoc(Document):
+class ArticleDoc(ProcessClientDocument):
     title = Text(analyzer="standard", fields={"keyword": Keyword()})
     content = Text(analyzer="standard")
     author = Text(fields={"keyword": Keyword()})
@@ -72,7 +85,7 @@ class ArticleDoc(Document):
 
 
 # ======================= КНИГИ =======================
-class BookDoc(Document):
+class BookDoc(ProcessClientDocument):
     title = Text(analyzer="standard", fields={"keyword": Keyword()})
     content = Text(analyzer="standard")
     author = Text(fields={"keyword": Keyword()})
@@ -123,7 +136,7 @@ class BookDoc(Document):
 
 
 # ======================= ДИССЕРТАЦИИ =======================
-class DissertationDoc(Document):
+class DissertationDoc(ProcessClientDocument):
     title = Text(analyzer="standard", fields={"keyword": Keyword()})
     content = Text(analyzer="standard")
     author = Text(fields={"keyword": Keyword()})
@@ -1,23 +1,200 @@
+import asyncio
 import logging
 import threading
 import os
+import re
 import time
-from elasticsearch import Elasticsearch
+import weakref
+from elasticsearch import AsyncElasticsearch, Elasticsearch, helpers
 from django.conf import settings
 from elastic_transport import ConnectionError as ESConnectionError
 
 logger = logging.getLogger(__name__)
 
 
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _client_options():
+    """Build ``Elasticsearch(...)`` kwargs from ``settings.ELASTICSEARCH_DSL``."""
+    conf = settings.ELASTICSEARCH_DSL.get("default", {})
+    hosts = os.environ.get("ELASTICSEARCH_URL") or conf.get("hosts")
+    options = {
+        "hosts": hosts,
+        # urllib3 pool size per node; idle sockets are kept alive and reused
+        "connections_per_node": int(conf.get("connections_per_node", 10)),
+        "request_timeout": float(conf.get("request_timeout", 30)),
+        "retry_on_timeout": bool(conf.get("retry_on_timeout", True)),
+        "max_retries": int(conf.get("max_retries", 3)),
+        "http_compress": bool(conf.get("http_compress", False)),
+    }
+    if conf.get("sniff"):
+        options.update(
+            sniff_on_start=True,
+            sniff_on_node_failure=True,
+            min_delay_between_sniffing=float(conf.get("sniff_interval", 60)),
+        )
+    return options
+
+
 def get_es_client():
+    """Return the process-wide Elasticsearch client, creating it on first use.
+
+    The client owns a connection pool, so it is shared by every caller in
+    the process. It is keyed by pid: a Celery or gunicorn worker forked
+    after the parent created a client builds its own instead of sharing
+    the parent's sockets.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            try:
+                _client = Elasticsearch(**_client_options())
+                _client_pid = pid
+            except Exception as e:
+                logger.exception("Failed to create ES client: %s", e)
+                return None
+    return _client
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_es_client():
+    """Return the AsyncElasticsearch client for the running event loop.
+
+    An aiohttp session is bound to the loop it was created on, so clients
+    are cached per loop: under an ASGI worker every request shares one.
+    Returns None outside of a running loop.
+    """
     try:
-        es_url = os.environ.get("ELASTICSEARCH_URL")
-        if not es_url:
-            es_url = settings.ELASTICSEARCH_DSL.get("default", {}).get("hosts")
-        return Elasticsearch(es_url, timeout=30)
-    except Exception as e:
-        logger.exception("Failed to create ES client: %s", e)
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
         return None
+    client = _async_clients.get(loop)
+    if client is None:
+        try:
+            client = AsyncElasticsearch(**_client_options())
+        except Exception as e:
+            logger.exception("Failed to create async ES client: %s", e)
+            return None
+        _async_clients[loop] = client
+    return client
+
+
+INDEX_NAMES = {
+    "article": "articles",
+    "book": "books",
+    "dissertation": "dissertations",
+}
+
+
+def get_index_name(model_or_obj):
+    """Return the ES index for a content model/instance, or None if unsupported."""
+    model = model_or_obj if isinstance(model_or_obj, type) else type(model_or_obj)
+    return INDEX_NAMES.get(model.__name__.lower())
+
+
+def content_type_for_index(index_name):
+    """Map a concrete index name ("articles" or "articles_v7") to its content type."""
+    base = re.sub(r"_v\d+$", "", index_name or "")
+    for content_type, name in INDEX_NAMES.items():
+        if name == base:
+            return content_type
+    return base.rstrip("s")
+
+
+def _retriable(item):
+    """Whether a failed bulk item may succeed when sent again.
+
+    Throttling (429) and server-side errors are transient; anything else
+    (mapping or parse errors) fails the same way on every retry.
+    """
+    status = item.get("status")
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+def _failed_ids(index, errors, missing=None):
+    """Ids of retriable failed bulk items; permanent failures are logged.
+
+    With a ``missing`` list, items that failed with 404 are collected there.
+    """
+    ids = []
+    for error in errors:
+        item = next(iter(error.values()), {})
+        try:
+            obj_id = int(item.get("_id"))
+        except (TypeError, ValueError):
+            continue
+        if missing is not None and item.get("status") == 404:
+            missing.append(obj_id)
+        elif _retriable(item):
+            ids.append(obj_id)
+        else:
+            logger.error(
+                "Elasticsearch rejected %s id=%s: %s", index, obj_id, item.get("error")
+            )
+    return ids
+
+
+def _invalidate_searches(index_name):
+    """Cached searches over ``index_name`` are stale once its documents change."""
+    from .search_cache import invalidate
+
+    invalidate(content_type_for_index(index_name))
+
+
+# Shared by all content indices; documents are built by `_build_doc`
+INDEX_MAPPING = {
+    "properties": {
+        "title": {"type": "text", "analyzer": "standard"},
+        "content": {"type": "text", "analyzer": "standard"},
+        "author": {"type": "text"},
+        "author_workplace": {"type": "text"},
+        "source_name": {"type": "text"},
+        "source_url": {"type": "keyword"},
+        "newspaper_or_journal": {"type": "text"},
+        "type": {"type": "keyword"},
+        "language": {"type": "keyword"},
+        "publication_date": {"type": "date"},
+        "average_rating": {"type": "float"},
+        "rating_count": {"type": "integer"},
+        "views": {"type": "integer"},
+        "image": {"type": "keyword"},
+        "epub_file": {"type": "keyword"},
+        "cover_image": {"type": "keyword"},
+        "categories": {
+            "type": "nested",
+            "properties": {
+                "id": {"type": "integer"},
+                "name": {
+                    "type": "text",
+                    "fields": {"keyword": {"type": "keyword"}},
+                },
+                "parent": {"type": "integer", "null_value": None},
+                # The category and its ancestors, for subtree filters
+                "ancestors": {"type": "integer"},
+            },
+        },
+    }
+}
+
+
+# Fields that change without the rest of the document (views, ratings)
+COUNTER_FIELDS = ("views", "average_rating", "rating_count")
+
+
+def _build_counter_doc(views, average_rating, rating_count):
+    return {
+        "views": views or 0,
+        "average_rating": round(float(average_rating or 0), 2),
+        "rating_count": rating_count or 0,
+    }
 
 
 def _build_doc(obj):
@@ -25,9 +202,11 @@ def _build_doc(obj):
         "title": getattr(obj, "title", None),
         "author": getattr(obj, "author", None),
         "language": getattr(obj, "language", None),
-        "average_rating": round(float(getattr(obj, "average_rating", 0) or 0), 2),
-        "rating_count": getattr(obj, "rating_count", 0) or 0,
-        "views": getattr(obj, "views", 0) or 0,
+        **_build_counter_doc(
+            getattr(obj, "views", 0),
+            getattr(obj, "average_rating", 0),
+            getattr(obj, "rating_count", 0),
+        ),
     }
 
     # Article specific
@@ -80,6 +259,7 @@ def _build_doc(obj):
                 "id": c.id,
                 "name": c.name,
                 "parent": getattr(c, "parent_id", None) or None,
+                "ancestors": getattr(c, "ancestor_ids", None) or [c.id],
             }
             for c in obj.categories.all()
         ]
@@ -96,15 +276,8 @@ def index_object(obj):
         logger.warning("Elasticsearch client unavailable; skipping indexing")
         return False
 
-    # Determine index name
-    model_name = obj.__class__.__name__.lower()
-    if model_name == "article":
-        index = "articles"
-    elif model_name == "book":
-        index = "books"
-    elif model_name == "dissertation":
-        index = "dissertations"
-    else:
+    index = get_index_name(obj)
+    if index is None:
         logger.warning("Unsupported model for indexing: %s", obj.__class__)
         return False
 
@@ -124,6 +297,7 @@ def index_object(obj):
                     exc_info=True,
                 )
             logger.info("Indexed %s id=%s", index, obj.id)
+            _invalidate_searches(index)
             return True
         except ESConnectionError as e:
             logger.warning("ES connection failed (attempt %d): %s", attempt + 1, e)
@@ -141,26 +315,171 @@ def index_object(obj):
     return False
 
 
+def index_objects(model, ids, chunk_size=500, refresh=True):
+    """Index many instances of one model with a single streamed bulk request.
+
+    Objects are loaded in chunks with categories prefetched. With
+    ``refresh=False`` no refresh is forced: the request waits for the
+    index's next scheduled refresh instead. Either way the documents are
+    searchable before cached searches are invalidated, so a search racing
+    the invalidation can't re-cache the old results under the new version.
+
+    Returns:
+        dict: {"indexed", "skipped", "failed", "failed_ids"} where skipped
+        counts ids no longer in the database and ``failed_ids`` lists the
+        failures worth retrying, or None if ES is unavailable
+    """
+    client = get_es_client()
+    if not client:
+        logger.warning("Elasticsearch client unavailable; skipping bulk indexing")
+        return None
+
+    ids = sorted(set(int(i) for i in ids))
+    stats = {"indexed": 0, "skipped": 0, "failed": 0, "failed_ids": []}
+
+    index = get_index_name(model)
+    if index is None:
+        logger.warning("Unsupported model for indexing: %s", model)
+        stats["skipped"] = len(ids)
+        return stats
+
+    found = set()
+
+    def actions():
+        for start in range(0, len(ids), chunk_size):
+            batch = model.objects.filter(
+                pk__in=ids[start : start + chunk_size]
+            ).prefetch_related("categories")
+            for obj in batch:
+                found.add(obj.id)
+                yield {"_index": index, "_id": obj.id, "_source": _build_doc(obj)}
+
+    try:
+        indexed, errors = helpers.bulk(
+            client,
+            actions(),
+            chunk_size=chunk_size,
+            raise_on_error=False,
+            refresh=False if refresh else "wait_for",
+        )
+    except ESConnectionError:
+        logger.warning("ES connection failed during bulk indexing of %s", index)
+        return None
+
+    stats["indexed"] = indexed
+    stats["failed_ids"] = _failed_ids(index, errors)
+    stats["failed"] = len(errors)
+    stats["skipped"] = len(ids) - len(found)
+
+    if refresh:
+        try:
+            client.indices.refresh(index=index)
+        except Exception:
+            logger.debug("Failed to refresh index %s after bulk", index, exc_info=True)
+    if stats["indexed"]:
+        _invalidate_searches(index)
+    logger.info(
+        "Bulk indexed %s: %d ok, %d skipped, %d failed",
+        index,
+        stats["indexed"],
+        stats["skipped"],
+        stats["failed"],
+    )
+    return stats
+
+
+def update_counters(model, ids, chunk_size=1000):
+    """Send partial updates with only the counter fields of many objects.
+
+    Reads ``views``/``average_rating``/``rating_count`` straight from the
+    table and issues bulk ``update`` actions, so the stored document (and
+    its large ``content`` field) is neither rebuilt nor re-analyzed.
+    Documents missing from the index are reported in ``missing_ids`` so
+    the caller can schedule a full index for them.
+
+    Returns:
+        dict: {"indexed", "skipped", "failed", "failed_ids", "missing_ids"},
+        or None if ES is unavailable
+    """
+    client = get_es_client()
+    if not client:
+        logger.warning("Elasticsearch client unavailable; skipping counter update")
+        return None
+
+    ids = sorted(set(int(i) for i in ids))
+    stats = {
+        "indexed": 0,
+        "skipped": 0,
+        "failed": 0,
+        "failed_ids": [],
+        "missing_ids": [],
+    }
+
+    index = get_index_name(model)
+    if index is None:
+        stats["skipped"] = len(ids)
+        return stats
+
+    found = set()
+
+    def actions():
+        for start in range(0, len(ids), chunk_size):
+            rows = model.objects.filter(
+                pk__in=ids[start : start + chunk_size]
+            ).values_list("id", *COUNTER_FIELDS)
+            for obj_id, views, average_rating, rating_count in rows:
+                found.add(obj_id)
+                yield {
+                    "_op_type": "update",
+                    "_index": index,
+                    "_id": obj_id,
+                    "doc": _build_counter_doc(views, average_rating, rating_count),
+                }
+
+    try:
+        # wait_for: searchable before cached searches are invalidated
+        updated, errors = helpers.bulk(
+            client,
+            actions(),
+            chunk_size=chunk_size,
+            raise_on_error=False,
+            refresh="wait_for",
+        )
+    except ESConnectionError:
+        logger.warning("ES connection failed during counter update of %s", index)
+        return None
+
+    stats["indexed"] = updated
+    stats["failed_ids"] = _failed_ids(index, errors, stats["missing_ids"])
+    stats["failed"] = len(errors) - len(stats["missing_ids"])
+    stats["skipped"] = len(ids) - len(found)
+    if stats["indexed"]:
+        _invalidate_searches(index)
+    logger.info(
+        "Counter update %s: %d ok, %d missing, %d failed",
+        index,
+        stats["indexed"],
+        len(stats["missing_ids"]),
+        stats["failed"],
+    )
+    return stats
+
+
 def delete_object(obj):
     client = get_es_client()
     if not client:
         logger.warning("Elasticsearch client unavailable; skipping delete")
         return False
 
-    model_name = obj.__class__.__name__.lower()
-    if model_name == "article":
-        index = "articles"
-    elif model_name == "book":
-        index = "books"
-    elif model_name == "dissertation":
-        index = "dissertations"
-    else:
+    index = get_index_name(obj)
+    if index is None:
         return False
 
     try:
         if client.exists(index=index, id=obj.id):
-            client.delete(index=index, id=obj.id)
+            client.delete(index=index, id=obj.id, refresh="wait_for")
             logger.info("Deleted %s id=%s from index", index, obj.id)
+            _invalidate_searches(index)
         return True
     except Exception:
         logger.exception(
@@ -1,21 +1,50 @@
 import logging
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from .models import Article, Book, Dissertation, ContentRating
-from .tasks import index_object_task, delete_object_task
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from .models import (
+    Article,
+    ArticleCategory,
+    Book,
+    BookCategory,
+    ContentRating,
+    Dissertation,
+    DissertationCategory,
+    Profile,
+)
+from .tasks import delete_object_task
+from . import bookmarks, index_queue
+from .search_utils import COUNTER_FIELDS
+from .utils import cache_versions
 
 logger = logging.getLogger(__name__)
 
 
+def _counters_only(update_fields):
+    """True when a save touched nothing but the denormalized counters."""
+    return bool(update_fields) and set(update_fields) <= set(COUNTER_FIELDS)
+
+
+def _invalidate(content_type, pk):
+    """Drop cached detail payloads of the object and its type's lists."""
+    try:
+        cache_versions.invalidate_object(content_type, pk)
+    except Exception:
+        logger.exception("Failed to invalidate cache for %s id=%s", content_type, pk)
+
+
 @receiver(post_save, sender=Article)
 def article_saved(sender, instance, **kwargs):
     try:
-        index_object_task.delay(
-            instance._meta.app_label, instance.__class__.__name__, instance.id
+        index_queue.enqueue(
+            sender,
+            [instance.id],
+            counters_only=_counters_only(kwargs.get("update_fields")),
         )
     except Exception:
-        logger.exception("Failed to enqueue index task for Article id=%s", instance.id)
+        logger.exception("Failed to enqueue indexing for Article id=%s", instance.id)
+    _invalidate("article", instance.id)
 
 
 @receiver(post_delete, sender=Article)
@@ -26,22 +55,20 @@ def article_deleted(sender, instance, **kwargs):
         )
     except Exception:
         logger.exception("Failed to enqueue delete task for Article id=%s", instance.id)
-    # bump global cache version to invalidate per-object/list caches
-    try:
-        v = cache.get("content_cache_version") or 0
-        cache.set("content_cache_version", int(v) + 1)
-    except Exception:
-        pass
+    _invalidate("article", instance.id)
 
 
 @receiver(post_save, sender=Book)
 def book_saved(sender, instance, **kwargs):
     try:
-        index_object_task.delay(
-            instance._meta.app_label, instance.__class__.__name__, instance.id
+        index_queue.enqueue(
+            sender,
+            [instance.id],
+            counters_only=_counters_only(kwargs.get("update_fields")),
         )
     except Exception:
-        logger.exception("Failed to enqueue index task for Book id=%s", instance.id)
+        logger.exception("Failed to enqueue indexing for Book id=%s", instance.id)
+    _invalidate("book", instance.id)
 
 
 @receiver(post_delete, sender=Book)
@@ -52,23 +79,22 @@ def book_deleted(sender, instance, **kwargs):
         )
     except Exception:
         logger.exception("Failed to enqueue delete task for Book id=%s", instance.id)
-    try:
-        v = cache.get("content_cache_version") or 0
-        cache.set("content_cache_version", int(v) + 1)
-    except Exception:
-        pass
+    _invalidate("book", instance.id)
 
 
 @receiver(post_save, sender=Dissertation)
 def dissertation_saved(sender, instance, **kwargs):
     try:
-        index_object_task.delay(
-            instance._meta.app_label, instance.__class__.__name__, instance.id
+        index_queue.enqueue(
+            sender,
+            [instance.id],
+            counters_only=_counters_only(kwargs.get("update_fields")),
         )
     except Exception:
         logger.exception(
-            "Failed to enqueue index task for Dissertation id=%s", instance.id
+            "Failed to enqueue indexing for Dissertation id=%s", instance.id
         )
+    _invalidate("dissertation", instance.id)
 
 
 @receiver(post_delete, sender=Dissertation)
@@ -81,35 +107,166 @@ def dissertation_deleted(sender, instance, **kwargs):
         logger.exception(
             "Failed to enqueue delete task for Dissertation id=%s", instance.id
         )
-    try:
-        v = cache.get("content_cache_version") or 0
-        cache.set("content_cache_version", int(v) + 1)
-    except Exception:
-        pass
+    _invalidate("dissertation", instance.id)
 
 
 # When a rating is added/updated, reindex the corresponding content
 @receiver(post_save, sender=ContentRating)
 def content_rating_saved(sender, instance, **kwargs):
+    # The aggregates are updated later in the same transaction
+    # (content.ratings); act on them once they are committed
+    transaction.on_commit(lambda: _rating_committed(instance))
+
+
+def _rating_committed(instance):
     try:
         ct = instance.content_type
         cid = instance.content_id
         model_map = {"article": Article, "book": Book, "dissertation": Dissertation}
         Model = model_map.get(ct)
         if Model:
-            try:
-                # enqueue reindex for the rated object
-                index_object_task.delay(Model._meta.app_label, Model.__name__, cid)
-            except Model.DoesNotExist:
-                logger.warning("Rated object not found for indexing: %s id=%s", ct, cid)
-        # rating change affects aggregated values and search ranking -> bump cache
-        try:
-            v = cache.get("content_cache_version") or 0
-            cache.set("content_cache_version", int(v) + 1)
-        except Exception:
-            pass
+            # only the rating fields of the document change: partial update
+            index_queue.enqueue(Model, [cid], counters_only=True)
     except Exception:
         logger.exception(
             "Failed handling ContentRating save for id=%s",
             getattr(instance, "id", None),
         )
+    # rating change affects the object's aggregates and its type's lists
+    _invalidate(instance.content_type, instance.content_id)
+
+
+# Category names are embedded in detail payloads and lists
+CATEGORY_CONTENT_TYPES = {
+    ArticleCategory: "article",
+    BookCategory: "book",
+    DissertationCategory: "dissertation",
+}
+
+
+@receiver(post_save, sender=ArticleCategory)
+@receiver(post_save, sender=BookCategory)
+@receiver(post_save, sender=DissertationCategory)
+@receiver(post_delete, sender=ArticleCategory)
+@receiver(post_delete, sender=BookCategory)
+@receiver(post_delete, sender=DissertationCategory)
+def category_changed(sender, instance, **kwargs):
+    # Hierarchical categories write their path and rewrite their subtree
+    # after post_save, in the same transaction: invalidate once it commits
+    transaction.on_commit(lambda: _categories_committed(sender))
+
+
+def _categories_committed(sender):
+    try:
+        cache_versions.invalidate_categories(CATEGORY_CONTENT_TYPES[sender])
+    except Exception:
+        logger.exception("Failed to invalidate categories cache for %s", sender)
+
+
+CATEGORY_CONTENT_MODELS = {
+    ArticleCategory: Article,
+    BookCategory: Book,
+    DissertationCategory: Dissertation,
+}
+
+
+@receiver(post_save, sender=ArticleCategory)
+@receiver(post_save, sender=BookCategory)
+@receiver(post_save, sender=DissertationCategory)
+def category_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: _category_committed(sender, instance))
+
+
+def _category_committed(sender, instance):
+    # Names and ancestor ids are copied into the search documents of the
+    # category's items, and of its subtree's items after a move
+    try:
+        Model = CATEGORY_CONTENT_MODELS[sender]
+        if hasattr(instance, "get_descendants"):
+            categories = instance.get_descendants()
+        else:
+            categories = [instance]
+        ids = (
+            Model.objects.filter(categories__in=categories)
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+        index_queue.enqueue(Model, ids)
+    except Exception:
+        logger.exception("Failed to enqueue items of category %r", instance)
+
+
+@receiver(m2m_changed, sender=Article.categories.through)
+@receiver(m2m_changed, sender=Book.categories.through)
+@receiver(m2m_changed, sender=Dissertation.categories.through)
+def content_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        # category.articles.add(...): pk_set holds the content objects
+        content_type = CATEGORY_CONTENT_TYPES[type(instance)]
+        if pk_set is None:
+            # post_clear does not say which objects were detached
+            cache_versions.invalidate_categories(content_type)
+        for pk in pk_set or ():
+            _invalidate(content_type, pk)
+    else:
+        _invalidate(instance.__class__.__name__.lower(), instance.pk)
+
+
+# Keep the per-user bookmark id sets in step with the Profile M2M tables
+BOOKMARK_CONTENT_TYPES = {
+    Profile.bookmarked_articles.through: "article",
+    Profile.bookmarked_books.through: "book",
+    Profile.bookmarked_dissertations.through: "dissertation",
+}
+
+
+@receiver(m2m_changed, sender=Profile.bookmarked_articles.through)
+@receiver(m2m_changed, sender=Profile.bookmarked_books.through)
+@receiver(m2m_changed, sender=Profile.bookmarked_dissertations.through)
+def bookmarks_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # article.bookmarked_by.clear(): remember who loses the bookmark
+        instance._bookmark_user_ids = list(
+            instance.bookmarked_by.values_list("user_id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    # m2m_changed fires before commit: a set rebuilt in between would read
+    # the old rows, so the sets are only touched once the change is visible
+    if reverse:
+        # article.bookmarked_by.add(profile): rebuild the affected users
+        if action == "post_clear":
+            user_ids = instance.__dict__.pop("_bookmark_user_ids", [])
+        else:
+            user_ids = list(
+                Profile.objects.filter(pk__in=pk_set).values_list("user_id", flat=True)
+            )
+        for user_id in user_ids:
+            transaction.on_commit(
+                lambda user_id=user_id: _bookmarks_committed(user_id, "post_clear")
+            )
+        return
+
+    content_type = BOOKMARK_CONTENT_TYPES[sender]
+    pk_set = set(pk_set or ())
+    transaction.on_commit(
+        lambda: _bookmarks_committed(instance.user_id, action, content_type, pk_set)
+    )
+
+
+def _bookmarks_committed(user_id, action, content_type=None, pk_set=None):
+    try:
+        if action == "post_add":
+            bookmarks.add(user_id, content_type, pk_set)
+        elif action == "post_remove":
+            bookmarks.remove(user_id, content_type, pk_set)
+        else:
+            bookmarks.invalidate(user_id)
+        cache.delete(f"user_bookmarks:{user_id}")
+    except Exception:
+        logger.exception("Failed to update bookmark set of user id=%s", user_id)
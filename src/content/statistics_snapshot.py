@@ -0,0 +1,276 @@
+"""
+Precomputed admin dashboard statistics.
+
+``take`` (Celery beat) collects everything the dashboard, its JSON
+endpoint and the charts show in a handful of set-based queries: per
+(type, language) aggregates of the three content tables in one
+``UNION ALL``, new items per day in another, bookmark counts in a third,
+plus the top items and user figures. The result is stored as a
+``StatisticsSnapshot``; views read the latest one (cached), so a
+dashboard load costs the same however large the library is. Snapshots
+are kept for ``STATISTICS_SNAPSHOT_RETENTION_DAYS`` as history.
+"""
+
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import CharField, Count, Q, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Article, Book, Dissertation, Profile, StatisticsSnapshot
+from .ratings import HISTOGRAM_FIELDS, STARS, histogram_field
+from .utils import local_cache
+
+logger = logging.getLogger(__name__)
+
+TYPES = (("article", Article), ("book", Book), ("dissertation", Dissertation))
+LANGUAGES = ("tm", "ru", "en")
+BOOKMARK_FIELDS = {
+    "article": "bookmarked_articles",
+    "book": "bookmarked_books",
+    "dissertation": "bookmarked_dissertations",
+}
+# Types with a publication_date ("new items")
+DATED_TYPES = ("article", "dissertation")
+TOP_SIZE = 7
+DAYS = 30
+
+LATEST_KEY = "statistics_snapshot:latest"
+
+
+def _kind(content_type):
+    return Value(content_type, output_field=CharField())
+
+
+def _content_rows():
+    """Count, views, sum of average ratings and star histogram per (type, language)."""
+    querysets = [
+        model.objects.annotate(kind=_kind(content_type))
+        .values("kind", "language")
+        .annotate(
+            n=Count("id"),
+            views=Sum("views"),
+            average_rating_total=Sum("average_rating"),
+            **{field: Sum(field) for field in HISTOGRAM_FIELDS},
+        )
+        .order_by()
+        for content_type, model in TYPES
+    ]
+    return querysets[0].union(*querysets[1:], all=True)
+
+
+def _new_rows(since):
+    """Items per (type, publication_date) since ``since``."""
+    models = dict(TYPES)
+    querysets = [
+        models[content_type]
+        .objects.filter(publication_date__gte=since)
+        .annotate(kind=_kind(content_type))
+        .values("kind", "publication_date")
+        .annotate(n=Count("id"))
+        .order_by()
+        for content_type in DATED_TYPES
+    ]
+    return querysets[0].union(*querysets[1:], all=True)
+
+
+def _bookmark_rows():
+    """Bookmarks per type, counted on the m2m through tables."""
+    querysets = [
+        getattr(Profile, field)
+        .through.objects.annotate(kind=_kind(content_type))
+        .values("kind")
+        .annotate(n=Count("id"))
+        .order_by()
+        for content_type, field in BOOKMARK_FIELDS.items()
+    ]
+    return querysets[0].union(*querysets[1:], all=True)
+
+
+def _daily(counts, start, days):
+    return [counts.get(start + timedelta(days=i), 0) for i in range(days)]
+
+
+def collect(now=None):
+    """
+    Compute the dashboard statistics.
+
+    Returns:
+        dict: JSON-serializable statistics (see ``take``)
+    """
+    now = now or timezone.now()
+    today = now.date()
+    first_day = today - timedelta(days=DAYS - 1)
+    last_month = today - timedelta(days=DAYS)
+
+    types = {
+        content_type: {"count": 0, "total_views": 0, "average_rating_total": 0.0}
+        for content_type, _ in TYPES
+    }
+    languages = dict.fromkeys(LANGUAGES, 0)
+    stars = dict.fromkeys(STARS, 0)
+    for row in _content_rows():
+        stats = types[row["kind"]]
+        stats["count"] += row["n"]
+        stats["total_views"] += row["views"] or 0
+        stats["average_rating_total"] += row["average_rating_total"] or 0
+        if row["language"] in languages:
+            languages[row["language"]] += row["n"]
+        for star in STARS:
+            stars[star] += row[histogram_field(star)] or 0
+
+    new_per_day, new_last_month = {}, dict.fromkeys(DATED_TYPES, 0)
+    for row in _new_rows(last_month):
+        new_last_month[row["kind"]] += row["n"]
+        day = row["publication_date"]
+        if day >= first_day:
+            new_per_day[day] = new_per_day.get(day, 0) + row["n"]
+
+    for content_type, model in TYPES:
+        stats = types[content_type]
+        average_rating_total = stats.pop("average_rating_total")
+        stats["avg_rating"] = (
+            round(average_rating_total / stats["count"], 2) if stats["count"] else 0
+        )
+        stats["new_last_month"] = new_last_month.get(content_type)
+        stats["top"] = list(
+            model.objects.order_by("-views").values("id", "title", "author", "views")[
+                :TOP_SIZE
+            ]
+        )
+
+    bookmarks = dict.fromkeys(BOOKMARK_FIELDS, 0)
+    for row in _bookmark_rows():
+        bookmarks[row["kind"]] = row["n"]
+
+    users = User.objects.aggregate(
+        total=Count("id"),
+        active_last_week=Count("id", filter=Q(last_login__gte=now - timedelta(days=7))),
+    )
+    registrations = dict(
+        User.objects.filter(date_joined__gte=now - timedelta(days=DAYS))
+        .annotate(day=TruncDate("date_joined"))
+        .values("day")
+        .annotate(n=Count("id"))
+        .values_list("day", "n")
+        .order_by()
+    )
+
+    return {
+        "generated_at": now.isoformat(),
+        "types": types,
+        "languages": languages,
+        "ratings_histogram": {str(star): n for star, n in stars.items()},
+        "bookmarks": bookmarks,
+        "users": {
+            "total": users["total"],
+            "active_last_week": users["active_last_week"],
+            "registrations": _daily(registrations, first_day, DAYS),
+        },
+        "new_items": {
+            "dates": [(first_day + timedelta(days=i)).isoformat() for i in range(DAYS)],
+            "counts": _daily(new_per_day, first_day, DAYS),
+        },
+    }
+
+
+def top_items(types, limit):
+    """Most viewed items across all types, from a snapshot's per-type tops."""
+    items = [
+        dict(item, type=content_type)
+        for content_type, stats in types.items()
+        for item in stats["top"]
+    ]
+    return sorted(items, key=lambda x: x["views"], reverse=True)[:limit]
+
+
+def _payload(snapshot):
+    return {
+        "id": snapshot.pk,
+        "created_at": snapshot.created_at.isoformat(),
+        "data": snapshot.data,
+    }
+
+
+def _timeout():
+    return int(getattr(settings, "STATISTICS_SNAPSHOT_CACHE_TTL", 3600))
+
+
+def take(now=None):
+    """
+    Store a new snapshot, prune expired ones and make it the latest.
+
+    Returns:
+        StatisticsSnapshot
+    """
+    data = collect(now)
+    types = data["types"].values()
+    snapshot = StatisticsSnapshot.objects.create(
+        total_materials=sum(stats["count"] for stats in types),
+        total_views=sum(stats["total_views"] for stats in types),
+        total_users=data["users"]["total"],
+        data=data,
+    )
+
+    retention = int(getattr(settings, "STATISTICS_SNAPSHOT_RETENTION_DAYS", 90))
+    StatisticsSnapshot.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=retention)
+    ).delete()
+
+    try:
+        local_cache.set(LATEST_KEY, _payload(snapshot), _timeout())
+    except Exception:
+        pass  # Cache failure shouldn't break the snapshot
+    return snapshot
+
+
+def latest():
+    """
+    The most recent snapshot as {"id", "created_at", "data"}.
+
+    Served from the cache; falls back to the table and, before the first
+    scheduled run, takes a snapshot inline.
+    """
+    try:
+        payload = local_cache.get(LATEST_KEY)
+    except Exception:
+        payload = None
+    if payload is not None:
+        return payload
+
+    snapshot = StatisticsSnapshot.objects.order_by("-created_at").first()
+    if snapshot is None:
+        return _payload(take())
+    payload = _payload(snapshot)
+    try:
+        local_cache.set(LATEST_KEY, payload, _timeout(), publish=False)
+    except Exception:
+        pass
+    return payload
+
+
+def history(days=DAYS):
+    """
+    Headline totals of the last snapshot of each of the last ``days`` days.
+
+    Returns:
+        list: [{"date", "total_materials", "total_views", "total_users"}]
+    """
+    rows = (
+        StatisticsSnapshot.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=days)
+        )
+        .order_by("created_at")
+        .values_list("created_at", "total_materials", "total_views", "total_users")
+    )
+    per_day = {}
+    for created_at, materials, views, users in rows.iterator():
+        # later snapshots of a day overwrite earlier ones
+        per_day[timezone.localdate(created_at).isoformat()] = {
+            "total_materials": materials,
+            "total_views": views,
+            "total_users": users,
+        }
+    return [{"date": day, **totals} for day, totals in per_day.items()]
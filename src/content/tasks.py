@@ -2,7 +2,7 @@ from __future__ import annotations
 from celery import shared_task
 from django.core.management import call_command
 from celery.utils.log import get_task_logger
-from typing import Optional
+from typing import List, Optional
 
 logger = get_task_logger(__name__)
 
@@ -16,6 +16,56 @@ def flush_views_task(self):
     call_command("flush_views")
 
 
+@shared_task(bind=True)
+def incremental_reindex_task(self):
+    """Reindex rows changed since the last successful pass.
+
+    Scheduled nightly by django-celery-beat to reconcile changes whose
+    per-save indexing was lost (e.g. while Celery was down).
+    """
+    call_command("reindex_search", "--incremental")
+
+
+@shared_task(bind=True)
+def recompute_ratings_task(self):
+    """Rebuild rating aggregates from ContentRating and fix drifted rows.
+
+    Scheduled nightly by django-celery-beat; the per-vote updates keep the
+    aggregates current, this only repairs what they missed.
+    """
+    call_command("recompute_ratings")
+
+
+@shared_task(bind=True)
+def maintain_view_records_task(self) -> dict:
+    """Create upcoming ViewRecord partitions and drop the expired ones."""
+    from content import view_counter
+
+    result = view_counter.maintain_view_records()
+    logger.info("ViewRecord maintenance: %s", result)
+    return result
+
+
+@shared_task(bind=True)
+def compute_trending_task(self) -> int:
+    """Rebuild the time-decayed trending ranking (see content.trending)."""
+    from content import trending
+
+    ranked = trending.compute_scores()
+    logger.info("Trending ranking rebuilt: %d items", ranked)
+    return ranked
+
+
+@shared_task(bind=True)
+def take_statistics_snapshot_task(self) -> int:
+    """Store a new admin dashboard statistics snapshot and render its charts."""
+    from content import charts, statistics_snapshot
+
+    snapshot = statistics_snapshot.take()
+    charts.prerender(statistics_snapshot.latest())
+    return snapshot.pk
+
+
 @shared_task(bind=True, max_retries=5, default_retry_delay=30)
 def index_object_task(
     self, app_label: str, model_name: str, obj_id: int
@@ -65,6 +115,80 @@ def index_object_task(
             return False
 
 
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def index_objects_task(
+    self,
+    app_label: str,
+    model_name: str,
+    obj_ids: List[int],
+    counters_only: bool = False,
+) -> Optional[dict]:
+    """Index many instances of one model with a single bulk request.
+
+    Used when no Redis cache is available for the index queue. With
+    `counters_only` only the views/rating fields are sent as partial
+    updates. Returns the indexed/skipped/failed counts.
+    """
+    try:
+        from django.apps import apps
+        from content import search_utils
+
+        model = apps.get_model(app_label, model_name)
+        if counters_only:
+            stats = search_utils.update_counters(model, obj_ids)
+            if stats and stats["missing_ids"]:
+                # not in the index yet: fall back to full documents
+                full = search_utils.index_objects(model, stats["missing_ids"])
+                if full is None:
+                    stats = None
+                else:
+                    for key in ("indexed", "skipped", "failed"):
+                        stats[key] += full[key]
+        else:
+            stats = search_utils.index_objects(model, obj_ids)
+        if stats is None:
+            raise Exception("Elasticsearch unavailable; will retry")
+
+        if stats["failed"]:
+            logger.warning(
+                "Bulk indexing %s.%s: %d documents failed",
+                app_label,
+                model_name,
+                stats["failed"],
+            )
+        return {k: stats[k] for k in ("indexed", "skipped", "failed")}
+    except Exception as exc:
+        try:
+            raise self.retry(exc=exc)
+        except self.MaxRetriesExceededError:
+            logger.exception(
+                "Max retries exceeded for bulk indexing %s.%s (%d ids)",
+                app_label,
+                model_name,
+                len(obj_ids),
+            )
+            return None
+
+
+@shared_task(bind=True)
+def process_index_queue_task(self) -> dict:
+    """Drain the coalescing index queue and bulk-index pending objects.
+
+    Scheduled every minute by django-celery-beat and enqueued early by
+    `index_queue.enqueue` when the queue grows past its batch size.
+    """
+    from content import index_queue
+
+    stats = index_queue.process_queue()
+    logger.info(
+        "Index queue processed: %d indexed, %d skipped, %d failed",
+        stats["indexed"],
+        stats["skipped"],
+        stats["failed"],
+    )
+    return stats
+
+
 @shared_task(bind=True, max_retries=5, default_retry_delay=30)
 def delete_object_task(
     self, app_label: str, model_name: str, obj_id: int
@@ -1,10 +1,18 @@
 # content/tests.py
 
 from rest_framework.test import APITestCase
-from django.test import override_settings
-from unittest.mock import patch
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+import base64
+import fakeredis
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
 from types import SimpleNamespace
 from django.urls import reverse
+from django.core.management import CommandError, call_command
+from io import StringIO
 from django.contrib.auth.models import User
 from content.models import (
     Article,
@@ -13,8 +21,33 @@ from content.models import (
     ArticleCategory,
     BookCategory,
     DissertationCategory,
+    PendingView,
+    SearchSyncState,
+    DailyView,
+    ContentRating,
+    ViewRecord,
+    TrendingScore,
 )
-from datetime import date
+from content.views import admin_chart, admin_statistics, admin_statistics_data
+from content.view_counter import DatabaseViewCounter, maintain_view_records
+from content import (
+    bookmarks,
+    charts,
+    daily_views,
+    index_queue,
+    ratings,
+    search_cache,
+    search_indexes,
+    search_utils,
+    statistics_snapshot,
+    tasks,
+    trending,
+)
+from content.utils import cache_versions, local_cache
+from content.utils.local_cache import MISSING, LocalCache
+from content.utils import counts, single_flight, svg_charts
+from datetime import date, timedelta
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 
@@ -350,3 +383,1222 @@ class ContentAPITestCase(APITestCase):
             self.get_es_patcher.stop()
         except Exception:
             pass
+
+
+class ViewCounterTestCase(TestCase):
+    def test_database_counter_dedupes_per_visitor(self):
+        counter = DatabaseViewCounter()
+        self.assertTrue(counter.register_hit("article", 1, session_key="s1"))
+        self.assertFalse(counter.register_hit("article", 1, session_key="s1"))
+        self.assertTrue(counter.register_hit("article", 1, session_key="s2"))
+
+        pv = PendingView.objects.get(content_type="article", content_id=1)
+        self.assertEqual(pv.count, 2)
+
+    def test_expired_record_counts_again_and_is_pruned(self):
+        counter = DatabaseViewCounter()
+        self.assertTrue(counter.register_hit("book", 3, session_key="s1"))
+        old = timezone.now() - timedelta(days=2)
+        ViewRecord.objects.update(day=old.date(), last_seen=old)
+
+        self.assertTrue(counter.register_hit("book", 3, session_key="s1"))
+        self.assertFalse(counter.register_hit("book", 3, session_key="s1"))
+
+        self.assertEqual(maintain_view_records()["deleted"], 1)
+        self.assertEqual(ViewRecord.objects.get().day, timezone.now().date())
+
+
+class FlushViewsTestCase(TestCase):
+    def setUp(self):
+        self.article = Article.objects.create(
+            title="Makala",
+            content="Mazmuny",
+            author="Awtor",
+            language="tm",
+            type="local",
+            views=5,
+            publication_date=timezone.now().date(),
+        )
+
+    def _flush(self):
+        out = StringIO()
+        call_command("flush_views", stdout=out)
+        return out.getvalue()
+
+    @patch("content.management.commands.flush_views.index_queue.enqueue")
+    @patch(
+        "content.management.commands.flush_views.get_view_counter",
+        return_value=DatabaseViewCounter(),
+    )
+    def test_flushes_pending_views(self, _counter, enqueue):
+        PendingView.objects.create(
+            content_type="article", content_id=self.article.pk, count=3
+        )
+        PendingView.objects.create(content_type="article", content_id=999, count=2)
+
+        self.assertIn("1 not found", self._flush())
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 8)
+        self.assertFalse(PendingView.objects.exists())
+        self.assertEqual(DailyView.objects.get(content_id=self.article.pk).views, 3)
+        enqueue.assert_called_once_with(Article, [self.article.pk], counters_only=True)
+
+    def test_requeues_drained_counts_on_failure(self):
+        PendingView.objects.create(
+            content_type="article", content_id=self.article.pk, count=3
+        )
+        drained = {"article": {self.article.pk: 4}}
+        counter = MagicMock()
+        counter.drain.return_value = drained
+        with patch(
+            "content.management.commands.flush_views.get_view_counter",
+            return_value=counter,
+        ), patch(
+            "content.management.commands.flush_views.increment_from_values",
+            side_effect=RuntimeError("boom"),
+        ):
+            self.assertIn("Error flushing views", self._flush())
+
+        counter.requeue.assert_called_once_with(drained)
+        # the PendingView drain rolled back with the failed transaction
+        self.assertEqual(PendingView.objects.get().count, 3)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 5)
+
+
+class SearchClientTestCase(TestCase):
+    def test_documents_use_the_current_process_client(self):
+        first, second = MagicMock(), MagicMock()
+        with patch("content.search_indexes.get_es_client", return_value=first):
+            self.assertIs(search_indexes.ArticleDoc._get_connection(), first)
+        # e.g. after a fork: the new client is picked up, nothing is pinned
+        with patch("content.search_indexes.get_es_client", return_value=second):
+            self.assertIs(search_indexes.BookDoc._get_connection(), second)
+            self.assertIs(search_indexes.ArticleDoc._get_connection(), second)
+
+    def test_explicit_using_wins(self):
+        client = MagicMock()
+        with patch("content.search_indexes.get_es_client") as get_client:
+            self.assertIs(
+                search_indexes.DissertationDoc._get_connection(client), client
+            )
+        get_client.assert_not_called()
+
+
+class IndexQueueTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.articles = Article.objects.bulk_create(
+            Article(
+                title=f"Makala {i}",
+                content="Mazmuny",
+                author="Awtor",
+                language="tm",
+                type="local",
+                publication_date=timezone.now().date(),
+            )
+            for i in range(3)
+        )
+        self.ids = [article.pk for article in self.articles]
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch(
+            "content.index_queue.get_redis_connection", return_value=self.redis
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _queued(self, counters_only=False):
+        members = self.redis.smembers(index_queue._queue_key(counters_only))
+        return sorted(index_queue._parse_member(m)[2] for m in members)
+
+    def test_enqueue_dedupes_and_groups(self):
+        index_queue.enqueue(Article, [1, 2, 2])
+        index_queue.enqueue(Article, [1])
+        index_queue.enqueue(Book, [3])
+        index_queue.enqueue(Book, [3], counters_only=True)
+
+        grouped = index_queue.pop_batch()
+        self.assertEqual(
+            {key: sorted(ids) for key, ids in grouped.items()},
+            {("content", "Article"): [1, 2], ("content", "Book"): [3]},
+        )
+        self.assertEqual(index_queue.pop_batch(), {})
+        self.assertEqual(self._queued(counters_only=True), [3])
+
+    def test_requeues_only_transient_failures(self):
+        throttled, rejected = self.ids[1], self.ids[2]
+
+        def bulk(client, actions, **kwargs):
+            sent = list(actions)
+            errors = [
+                {"index": {"_id": str(throttled), "status": 429}},
+                {"index": {"_id": str(rejected), "status": 400, "error": "mapping"}},
+            ]
+            return len(sent) - len(errors), errors
+
+        index_queue.enqueue(Article, self.ids)
+        with patch(
+            "content.search_utils.get_es_client", return_value=MagicMock()
+        ), patch("content.search_utils.helpers.bulk", side_effect=bulk):
+            totals = index_queue.process_queue()
+
+        self.assertEqual(totals, {"indexed": 1, "skipped": 0, "failed": 2})
+        self.assertEqual(self._queued(), [throttled])
+
+    def test_requeues_everything_when_es_is_down(self):
+        index_queue.enqueue(Article, self.ids)
+        with patch("content.search_utils.get_es_client", return_value=None):
+            totals = index_queue.process_queue()
+        self.assertEqual(totals["failed"], 3)
+        self.assertEqual(self._queued(), self.ids)
+
+
+class CounterUpdateTestCase(TestCase):
+    def setUp(self):
+        self.articles = Article.objects.bulk_create(
+            Article(
+                title=f"Makala {i}",
+                content="Mazmuny",
+                author="Awtor",
+                language="tm",
+                type="local",
+                views=7,
+                publication_date=timezone.now().date(),
+            )
+            for i in range(2)
+        )
+
+    @patch("content.signals.index_queue.enqueue")
+    def test_counter_saves_enqueue_partial_updates(self, enqueue):
+        article = self.articles[0]
+        article.save(update_fields=["views", "rating_count"])
+        self.assertTrue(enqueue.call_args.kwargs["counters_only"])
+        article.save(update_fields=["views", "title"])
+        self.assertFalse(enqueue.call_args.kwargs["counters_only"])
+        article.save()
+        self.assertFalse(enqueue.call_args.kwargs["counters_only"])
+
+    def test_partial_update_actions_and_missing_documents(self):
+        indexed, missing = self.articles
+        sent = []
+
+        def bulk(client, actions, **kwargs):
+            sent.extend(actions)
+            return 1, [{"update": {"_id": str(missing.pk), "status": 404}}]
+
+        redis = fakeredis.FakeRedis()
+        with patch(
+            "content.index_queue.get_redis_connection", return_value=redis
+        ), patch("content.search_utils.get_es_client", return_value=MagicMock()), patch(
+            "content.search_utils.helpers.bulk", side_effect=bulk
+        ):
+            index_queue.enqueue(Article, [indexed.pk, missing.pk], counters_only=True)
+            index_queue.process_queue(max_batches=1)
+            self.assertEqual(
+                index_queue.pop_batch(), {("content", "Article"): [missing.pk]}
+            )
+
+        self.assertEqual({action["_op_type"] for action in sent}, {"update"})
+        self.assertEqual(
+            sent[0]["doc"], {"views": 7, "average_rating": 0.0, "rating_count": 0}
+        )
+
+    def _counters_task(self, full):
+        """Run the no-Redis counter task with one document missing."""
+        ids = [article.pk for article in self.articles]
+        counters = {
+            "indexed": 1,
+            "skipped": 0,
+            "failed": 0,
+            "failed_ids": [],
+            "missing_ids": ids[1:],
+        }
+        with patch(
+            "content.search_utils.update_counters", return_value=counters
+        ), patch("content.search_utils.index_objects", return_value=full) as index:
+            result = tasks.index_objects_task.run(
+                "content", "Article", ids, counters_only=True
+            )
+        index.assert_called_once_with(Article, ids[1:])
+        return result
+
+    def test_task_counts_full_index_fallback(self):
+        full = {"indexed": 0, "skipped": 0, "failed": 1, "failed_ids": [1]}
+        self.assertEqual(
+            self._counters_task(full), {"indexed": 1, "skipped": 0, "failed": 1}
+        )
+
+    def test_task_retries_when_fallback_is_unavailable(self):
+        with self.assertRaisesMessage(Exception, "Elasticsearch unavailable"):
+            self._counters_task(None)
+
+
+class ReindexSearchTestCase(TestCase):
+    def setUp(self):
+        self.article = Article.objects.create(
+            title="Makala",
+            content="Mazmuny",
+            author="Awtor",
+            language="tm",
+            type="local",
+            publication_date=timezone.now().date(),
+        )
+        self.es = MagicMock()
+        self.es.indices.get.side_effect = lambda index: {f"{index[:-3]}_v1": {}}
+        self.es.indices.get_alias.side_effect = lambda name: {f"{name}_v1": {}}
+        self.sent = []
+        self.failing = set()
+
+        def streaming_bulk(client, actions, **kwargs):
+            for action in actions:
+                self.sent.append((action["_index"], action["_id"]))
+                ok = action["_id"] not in self.failing
+                yield ok, {"index": {"_id": action["_id"], "error": "mapping"}}
+
+        self.counter_bulk = MagicMock(return_value=(1, []))
+        for target, kwargs in (
+            ("content.search_utils.get_es_client", {"return_value": self.es}),
+            (
+                "content.management.commands.reindex_search.helpers.streaming_bulk",
+                {"side_effect": streaming_bulk},
+            ),
+            ("content.search_utils.helpers.bulk", {"side_effect": self.counter_bulk}),
+        ):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _reindex(self, *args):
+        out = StringIO()
+        call_command("reindex_search", *args, stdout=out)
+        return out.getvalue()
+
+    def test_builds_new_version_and_swaps_alias(self):
+        self._reindex()
+
+        created = [c.kwargs["index"] for c in self.es.indices.create.call_args_list]
+        self.assertEqual(created, ["articles_v2", "books_v2", "dissertations_v2"])
+        self.es.indices.update_aliases.assert_any_call(
+            actions=[
+                {"remove": {"index": "articles_v1", "alias": "articles"}},
+                {"add": {"index": "articles_v2", "alias": "articles"}},
+            ]
+        )
+        self.es.indices.delete.assert_any_call(index="articles_v1")
+        # built into the new version, then re-sent through the swapped alias
+        self.assertEqual(
+            self.sent,
+            [("articles_v2", self.article.pk), ("articles", self.article.pk)],
+        )
+        # counters resent for the one article only; the other tables are empty
+        self.assertEqual(self.counter_bulk.call_count, 1)
+        self.assertTrue(SearchSyncState.objects.filter(index_name="articles").exists())
+
+    def _mark(self, synced_until):
+        SearchSyncState.objects.create(index_name="articles", synced_until=synced_until)
+
+    def _synced_until(self):
+        return SearchSyncState.objects.get(index_name="articles").synced_until
+
+    def test_incremental_uses_overlap_window(self):
+        mark = timezone.now() - timedelta(hours=1)
+        self._mark(mark)
+        older = Article.objects.create(
+            title="Köne",
+            content="M",
+            author="A",
+            language="tm",
+            type="local",
+            publication_date=timezone.now().date(),
+        )
+        Article.objects.filter(pk=self.article.pk).update(
+            updated_at=mark - timedelta(seconds=200)
+        )
+        Article.objects.filter(pk=older.pk).update(
+            updated_at=mark - timedelta(seconds=400)
+        )
+
+        with override_settings(SEARCH_SYNC_OVERLAP_SECONDS=300):
+            self._reindex("--incremental")
+        self.assertEqual(self.sent, [("articles", self.article.pk)])
+        self.assertGreater(self._synced_until(), mark)
+
+    def test_failures_keep_watermark(self):
+        mark = timezone.now() - timedelta(hours=1)
+        self._mark(mark)
+        self.failing.add(self.article.pk)
+        self.assertIn("не сдвинута", self._reindex("--incremental"))
+        self.assertEqual(self._synced_until(), mark)
+
+    def test_since_parsing(self):
+        mark = timezone.now() - timedelta(days=30)
+        self._mark(mark)
+        Article.objects.filter(pk=self.article.pk).update(
+            updated_at=timezone.now() - timedelta(days=10)
+        )
+
+        self._reindex(
+            "--since", (timezone.now() - timedelta(days=5)).date().isoformat()
+        )
+        self.assertEqual(self.sent, [])
+        # a --since past the stored mark would leave a gap: mark kept
+        self.assertEqual(self._synced_until(), mark)
+
+        self._reindex("--since", (timezone.now() - timedelta(days=40)).isoformat())
+        self.assertEqual(self.sent, [("articles", self.article.pk)])
+        self.assertGreater(self._synced_until(), mark)
+
+        with self.assertRaises(CommandError):
+            self._reindex("--since", "yesterday")
+
+    def _counter_ids(self):
+        """Ids sent as counter updates, per bulk call."""
+        batches = []
+
+        def bulk(client, actions, **kwargs):
+            batches.append([action["_id"] for action in actions])
+            return len(batches[-1]), []
+
+        self.counter_bulk.side_effect = bulk
+        return batches
+
+    def _article(self, title):
+        return Article.objects.create(
+            title=title,
+            content="M",
+            author="A",
+            language="tm",
+            type="local",
+            publication_date=timezone.now().date(),
+        )
+
+    def test_catch_up_resends_counters_logged_during_build(self):
+        viewed, earlier = self._article("Okalan"), self._article("Öňki")
+        redis = fakeredis.FakeRedis()
+        redis.zadd(
+            index_queue.COUNTER_LOG_KEY,
+            {index_queue._member(Article, earlier.pk): time.time() - 3600},
+        )
+        batches = self._counter_ids()
+        with patch("content.index_queue.get_redis_connection", return_value=redis):
+            index_queue.enqueue(Article, [viewed.pk], counters_only=True)
+            with override_settings(SEARCH_SYNC_OVERLAP_SECONDS=300):
+                self._reindex()
+        # only the articles index has logged counter changes
+        self.assertEqual(batches, [[viewed.pk]])
+
+    def test_catch_up_streams_all_counters_without_log(self):
+        others = [self._article(f"Makala {i}") for i in range(2)]
+        batches = self._counter_ids()
+        self._reindex("--chunk-size", "2")
+        self.assertEqual(batches, [[self.article.pk, others[0].pk], [others[1].pk]])
+
+
+class AsyncSearchViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_async_search_uses_shared_query_building(self):
+        bodies = []
+
+        async def fake_search(index, body):
+            bodies.append(body)
+            hit = {
+                "_id": "1",
+                "_index": "books_v2",
+                "_score": 1.0,
+                "_source": {"title": "Kitap", "author": "Awtor"},
+            }
+            return {"hits": {"total": {"value": 1}, "hits": [hit]}}
+
+        async def fake_ping():
+            return True
+
+        fake_client = SimpleNamespace(search=fake_search, ping=fake_ping)
+        with patch(
+            "content.search_utils.get_async_es_client", return_value=fake_client
+        ):
+            response = self.client.get(
+                reverse("api_v1:content-search-async") + "?q=kitap&content_type=book"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(data["results"][0]["content_type"], "book")
+        self.assertIn(
+            {"prefix": {"_index": "books"}}, bodies[0]["query"]["bool"]["filter"]
+        )
+
+        # a malformed page is page 1 (and the same cache entry)
+        with patch(
+            "content.search_utils.get_async_es_client", return_value=fake_client
+        ):
+            response = self.client.get(
+                reverse("api_v1:content-search-async")
+                + "?q=kitap&content_type=book&page=abc"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["page"], 1)
+
+
+class SearchCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_key_ignores_param_order_and_unknown_params(self):
+        key, scopes = search_cache.build_key({"q": "a", "page": "2"})
+        same, _ = search_cache.build_key({"page": "2", "q": " a ", "utm": "x"})
+        self.assertEqual(key, same)
+        self.assertEqual(len(scopes), 3)
+
+        _, scopes = search_cache.build_key({"q": "a", "content_type": "book"})
+        self.assertEqual(scopes, (search_cache.search_scope("book"),))
+
+    def test_stale_entry_served_while_another_request_refreshes(self):
+        params = {"q": "a", "content_type": "book"}
+        self.assertEqual(search_cache.get_or_compute(params, lambda: "v1"), "v1")
+        self.assertEqual(search_cache.get_or_compute(params, lambda: "v2"), "v1")
+
+        search_cache.invalidate("book")
+        key, _ = search_cache.build_key(params)
+        cache.add(f"{key}:lock", 1, 10)
+        self.assertEqual(search_cache.get_or_compute(params, lambda: "v2"), "v1")
+
+        cache.delete(f"{key}:lock")
+        self.assertEqual(search_cache.get_or_compute(params, lambda: "v2"), "v2")
+
+    def test_invalidates_once_documents_are_searchable(self):
+        book = Book.objects.create(
+            title="Kitap", author="Awtor", language="tm", content="Mazmuny"
+        )
+        calls = []
+        client = MagicMock()
+        client.indices.refresh.side_effect = lambda index: calls.append("refresh")
+
+        def bulk(client, actions, **kwargs):
+            list(actions)
+            calls.append(("bulk", kwargs["refresh"]))
+            return 1, []
+
+        with patch("content.search_utils.get_es_client", return_value=client), patch(
+            "content.search_utils.helpers.bulk", side_effect=bulk
+        ), patch(
+            "content.search_cache.invalidate",
+            side_effect=lambda content_type: calls.append("invalidate"),
+        ):
+            search_utils.index_objects(Book, [book.pk])
+            search_utils.index_objects(Book, [book.pk], refresh=False)
+            search_utils.update_counters(Book, [book.pk])
+
+        self.assertEqual(
+            calls,
+            [
+                ("bulk", False),
+                "refresh",
+                "invalidate",
+                ("bulk", "wait_for"),
+                "invalidate",
+                ("bulk", "wait_for"),
+                "invalidate",
+            ],
+        )
+
+
+class CacheVersionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_rating_invalidates_only_the_rated_object(self):
+        other = cache_versions.object_version_token("article", 7)
+        before = cache_versions.object_version_token("article", 42)
+        books = cache_versions.get_version("book")
+
+        cache_versions.invalidate_object("article", 42)
+
+        self.assertNotEqual(cache_versions.object_version_token("article", 42), before)
+        self.assertEqual(cache_versions.object_version_token("article", 7), other)
+        self.assertEqual(cache_versions.get_version("article"), 1)
+        self.assertEqual(cache_versions.get_version("book"), books)
+
+
+class SharedDetailCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = Article.objects.create(
+            title="Umumy",
+            content="Mazmuny",
+            author="Awtor",
+            language="tm",
+            type="local",
+            publication_date=date(2025, 1, 1),
+        )
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.other = User.objects.create_user(username="other", password="pass12345")
+        self.reader.profile.bookmarked_articles.add(self.article)
+
+    def test_one_cached_payload_with_per_user_bookmark_flag(self):
+        url = reverse("api_v1:article-detail", kwargs={"pk": self.article.pk})
+
+        self.client.force_authenticate(self.reader)
+        self.assertTrue(self.client.get(url).data["is_bookmarked"])
+
+        self.client.force_authenticate(self.other)
+        self.client.get(url)  # builds the user's bookmark id set
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data["title"], "Umumy")
+        self.assertFalse(response.data["is_bookmarked"])
+
+        self.client.force_authenticate(None)
+        self.assertFalse(self.client.get(url).data["is_bookmarked"])
+
+
+class BookmarkSetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = Article.objects.create(
+            title="Umumy",
+            content="Mazmuny",
+            author="Awtor",
+            language="tm",
+            type="local",
+            publication_date=date(2025, 1, 1),
+        )
+        self.user = User.objects.create_user(username="reader", password="pass12345")
+
+    def test_set_follows_m2m_changes(self):
+        self.assertEqual(bookmarks.get_bookmark_ids(self.user.id)["article"], set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.bookmarked_articles.add(self.article)
+        self.assertEqual(
+            bookmarks.get_bookmark_ids(self.user.id)["article"], {self.article.pk}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.bookmarked_by.clear()
+        self.assertEqual(bookmarks.get_bookmark_ids(self.user.id)["article"], set())
+
+    def _racing_load(self):
+        """``_load`` that reads, then sees a bookmark change commit."""
+        load = bookmarks._load
+
+        def racing_load(user_id):
+            ids = load(user_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.profile.bookmarked_articles.add(self.article)
+            return ids
+
+        return patch("content.bookmarks._load", side_effect=racing_load)
+
+    def test_change_during_rebuild_cancels_it(self):
+        with self._racing_load():
+            self.assertEqual(bookmarks.get_bookmark_ids(self.user.id)["article"], set())
+        self.assertEqual(
+            bookmarks.get_bookmark_ids(self.user.id)["article"], {self.article.pk}
+        )
+
+    def test_change_during_redis_rebuild_cancels_it(self):
+        redis = fakeredis.FakeRedis()
+        with patch("content.bookmarks.get_redis_connection", return_value=redis):
+            with self._racing_load():
+                ids = bookmarks.get_bookmark_ids(self.user.id)
+            self.assertEqual(ids["article"], set())
+            self.assertFalse(redis.exists(bookmarks._key(self.user.id, "article")))
+
+            ids = bookmarks.get_bookmark_ids(self.user.id)
+            self.assertEqual(ids["article"], {self.article.pk})
+            self.assertTrue(redis.exists(bookmarks._key(self.user.id, "article")))
+
+    def test_cached_list_page_gets_per_user_flag(self):
+        url = reverse("api_v1:article-list")
+        self.client.force_authenticate(self.user)
+        self.assertFalse(self.client.get(url).data["results"][0]["is_bookmarked"])
+
+        toggle = reverse("api_v1:toggle-bookmark", kwargs={"pk": self.article.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(toggle, {"type": "article"})
+
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertTrue(response.data["results"][0]["is_bookmarked"])
+
+        self.client.force_authenticate(None)
+        self.assertFalse(self.client.get(url).data["results"][0]["is_bookmarked"])
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = Article.objects.create(
+            title="Umumy",
+            content="Mazmuny",
+            author="Awtor",
+            language="tm",
+            type="local",
+            publication_date=date(2025, 1, 1),
+        )
+
+    def test_list_etag_and_304(self):
+        url = reverse("api_v1:article-list")
+        etag = self.client.get(url)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Weak validators (after GZipMiddleware) match too
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f"W/{etag}")
+        self.assertEqual(response.status_code, 304)
+
+    def test_edit_invalidates_list_page_and_etag(self):
+        url = reverse("api_v1:article-list")
+        etag = self.client.get(url)["ETag"]
+
+        self.article.title = "Täze"
+        self.article.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["title"], "Täze")
+
+    def test_detail_etag_depends_on_bookmark(self):
+        url = reverse("api_v1:article-detail", kwargs={"pk": self.article.pk})
+        etag = self.client.get(url)["ETag"]
+
+        user = User.objects.create_user(username="reader", password="pass12345")
+        user.profile.bookmarked_articles.add(self.article)
+        self.client.force_authenticate(user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["is_bookmarked"])
+
+    def test_list_cache_is_per_scheme(self):
+        Article.objects.bulk_create(
+            Article(
+                title=f"Makala {i}",
+                content="Mazmuny",
+                author="Awtor",
+                language="tm",
+                type="local",
+                publication_date=date(2025, 1, 1),
+            )
+            for i in range(8)
+        )
+        url = reverse("api_v1:article-list")
+        self.assertTrue(self.client.get(url).data["next"].startswith("http://"))
+        next_link = self.client.get(url, secure=True).data["next"]
+        self.assertTrue(next_link.startswith("https://"))
+
+    def test_category_list_etag(self):
+        url = reverse("api_v1:article-category-list")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ArticleCategory.objects.create(name="Taryh")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class LocalCacheTestCase(TestCase):
+    def test_lru_bound(self):
+        local = LocalCache(max_entries=2)
+        local.set("a", 1, 60)
+        local.set("b", 2, 60)
+        local.get("a")
+        local.set("c", 3, 60)
+        self.assertEqual(local.get("a"), 1)
+        self.assertIs(local.get("b"), MISSING)
+
+    def test_ttl_bound(self):
+        local = LocalCache()
+        with patch("content.utils.local_cache.time.monotonic", return_value=100):
+            local.set("a", 1, 5)
+        with patch("content.utils.local_cache.time.monotonic", return_value=106):
+            self.assertIs(local.get("a"), MISSING)
+
+    def test_fill_after_eviction_is_dropped(self):
+        local = LocalCache()
+        generation = local.generation
+        local.evict(["a"])  # invalidation arrives while "a" is being fetched
+        local.set("a", "old", 60, generation)
+        self.assertIs(local.get("a"), MISSING)
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.02)
+
+    def test_published_invalidation_evicts_local_copy(self):
+        server = fakeredis.FakeServer()
+        with patch(
+            "content.utils.local_cache.get_redis_connection",
+            side_effect=lambda: fakeredis.FakeRedis(server=server),
+        ), patch.object(local_cache, "_subscriber", local_cache._Subscriber()):
+            local_cache.get("k")  # starts the listener
+            self._wait_for(lambda: local_cache.local.enabled)
+            local_cache.local.set("k", "stale", 60)
+
+            # another process overwrites the key
+            other = fakeredis.FakeRedis(server=server)
+            other.publish("cache:l1:invalidate", json.dumps(["k"]))
+            self._wait_for(lambda: local_cache.local.get("k") is MISSING)
+
+            # a lost channel turns the L1 off (and stops the listener)
+            server.connected = False
+            self._wait_for(lambda: not local_cache.local.enabled)
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    single_flight.get_or_compute("hot", compute, 60)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 5)
+
+    def test_stale_value_served_while_locked(self):
+        cache.set("hot", "old", 60)
+        cache.add("hot:lock", 1, 10)
+        value = single_flight.get_or_compute(
+            "hot", lambda: "new", 60, is_fresh=lambda value: False
+        )
+        self.assertEqual(value, "old")
+
+
+class CategoryTreeTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.science = BookCategory.objects.create(name="Ylym")
+        self.physics = BookCategory.objects.create(name="Fizika", parent=self.science)
+        self.optics = BookCategory.objects.create(name="Optika", parent=self.physics)
+        self.history = BookCategory.objects.create(name="Taryh")
+
+    def test_paths_and_names_maintained(self):
+        self.assertEqual(
+            self.optics.path, f"/{self.science.pk}/{self.physics.pk}/{self.optics.pk}/"
+        )
+        self.assertEqual(str(self.optics), "Fizika > Optika")
+
+        self.physics.parent = self.history
+        self.physics.name = "Fizika taryhy"
+        self.physics.save()
+        self.optics.refresh_from_db()
+        self.assertEqual(
+            self.optics.path, f"/{self.history.pk}/{self.physics.pk}/{self.optics.pk}/"
+        )
+        self.assertEqual(str(self.optics), "Fizika taryhy > Optika")
+
+    def test_invalidation_sees_the_final_tree(self):
+        url = reverse("api_v1:book-category-tree")
+        self.client.get(url)
+        seen = []
+        invalidate = cache_versions.invalidate_categories
+
+        def spy(content_type):
+            seen.append(BookCategory.objects.get(pk=self.optics.pk).path)
+            invalidate(content_type)
+
+        with patch(
+            "content.signals.cache_versions.invalidate_categories", side_effect=spy
+        ), self.captureOnCommitCallbacks(execute=True):
+            self.physics.parent = self.history
+            self.physics.save()
+            chemistry = BookCategory.objects.create(name="Himiýa", parent=self.science)
+
+        # the subtree was rewritten before the cache was invalidated
+        expected = f"/{self.history.pk}/{self.physics.pk}/{self.optics.pk}/"
+        self.assertEqual(seen, [expected, expected])
+        tree = self.client.get(url).data
+        self.assertEqual(tree[0]["children"][0]["children"][0]["name"], "Optika")
+        self.assertEqual(tree[1]["children"][0]["id"], chemistry.pk)
+        self.assertEqual(
+            BookCategory.objects.get(pk=chemistry.pk).path,
+            f"/{self.science.pk}/{chemistry.pk}/",
+        )
+
+    def test_tree_endpoint_in_one_query(self):
+        url = reverse("api_v1:book-category-tree")
+        with self.assertNumQueries(1):
+            tree = self.client.get(url).data
+        self.assertEqual([node["name"] for node in tree], ["Taryh", "Ylym"])
+        self.assertEqual(tree[1]["children"][0]["children"][0]["name"], "Optika")
+
+    def _book_ids(self, **params):
+        response = self.client.get(reverse("api_v1:book-list"), params)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_category_tree_filter_includes_descendants(self):
+        book = Book.objects.create(
+            title="Ýagtylyk", author="Awtor", language="tm", content="Mazmuny"
+        )
+        book.categories.add(self.optics)
+
+        self.assertEqual(self._book_ids(category_tree=self.science.pk), [book.pk])
+        self.assertEqual(self._book_ids(categories=self.science.pk), [])
+        self.assertEqual(self._book_ids(category_tree=self.history.pk), [])
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        Article.objects.bulk_create(
+            Article(
+                title=f"Makala {i}",
+                content="Mazmuny",
+                author="Awtor",
+                language="tm",
+                type="local",
+                views=i % 3,  # ties are broken on id
+                publication_date=date(2025, 1, 1),
+            )
+            for i in range(20)
+        )
+
+    def _walk(self, **params):
+        ids, url = [], reverse("api_v1:article-list")
+        params["cursor"] = ""
+        while url:
+            response = self.client.get(url, params)
+            self.assertNotIn("count", response.data)
+            ids += [item["id"] for item in response.data["results"]]
+            url, params = response.data["next"], {}
+        return ids
+
+    def test_cursor_walk_matches_full_ordering(self):
+        expected = list(
+            Article.objects.order_by("-views", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(self._walk(ordering="-views"), expected)
+
+        expected = list(Article.objects.order_by("-id").values_list("id", flat=True))
+        self.assertEqual(self._walk(), expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("api_v1:article-list"), {"cursor": "x"})
+        self.assertEqual(response.status_code, 404)
+
+        # well-formed, but a value of the wrong type for the ordering
+        for ordering, value in (("-views", "abc"), ("-publication_date", 5)):
+            token = base64.urlsafe_b64encode(json.dumps([ordering, value, 1]).encode())
+            response = self.client.get(
+                reverse("api_v1:article-list"),
+                {"cursor": token.decode(), "ordering": ordering},
+            )
+            self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_unchanged(self):
+        response = self.client.get(reverse("api_v1:article-list"), {"page": 2})
+        self.assertEqual(response.data["count"], 20)
+        self.assertFalse(response.data["count_approximate"])
+
+    def test_count_cached_per_filter_until_version_bump(self):
+        queryset = Article.objects.filter(views=1)
+        self.assertEqual(counts.get_count(queryset), (7, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(counts.get_count(queryset.order_by("-id")), (7, False))
+
+        cache_versions.bump_version("article")
+        with self.assertNumQueries(1):
+            counts.get_count(queryset)
+
+    def test_large_estimate_is_flagged(self):
+        with patch("content.utils.counts.estimate", return_value=250000):
+            response = self.client.get(reverse("api_v1:article-list"))
+        self.assertEqual(response.data["count"], 250000)
+        self.assertTrue(response.data["count_approximate"])
+
+
+class RatingAggregateTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = Article.objects.create(
+            title="Umumy",
+            content="Mazmuny",
+            author="Awtor",
+            language="tm",
+            type="local",
+            publication_date=date(2025, 1, 1),
+        )
+        self.first = User.objects.create_user(username="first", password="pass12345")
+        self.second = User.objects.create_user(username="second", password="pass12345")
+
+    def _rate(self, user, value):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            reverse("api_v1:rate-content"),
+            {"content_type": "article", "content_id": self.article.pk, "rating": value},
+        )
+
+    def test_votes_and_revotes_update_aggregates(self):
+        self._rate(self.first, 5)
+        response = self._rate(self.second, 2)
+        self.assertEqual(response.data["average_rating"], 3.5)
+        self.assertEqual(response.data["rating_count"], 2)
+
+        response = self._rate(self.second, 4)
+        self.assertEqual(response.data["average_rating"], 4.5)
+        self.assertEqual(response.data["rating_count"], 2)
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.rating_sum, 9)
+        self.assertEqual(ratings.histogram(self.article)["2"], 0)
+        self.assertEqual(ratings.histogram(self.article)["4"], 1)
+
+        url = reverse("api_v1:article-ratings", kwargs={"pk": self.article.pk})
+        self.assertEqual(
+            self.client.get(url).data["histogram"],
+            {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1},
+        )
+
+    def test_missing_item_writes_nothing(self):
+        self.client.force_authenticate(self.first)
+        response = self.client.post(
+            reverse("api_v1:rate-content"),
+            {"content_type": "book", "content_id": 999, "rating": 3},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ContentRating.objects.exists())
+
+    def test_recompute_repairs_drift(self):
+        self._rate(self.first, 5)
+        self._rate(self.second, 3)
+        ContentRating.objects.filter(user=self.second).delete()
+        Article.objects.filter(pk=self.article.pk).update(rating_1=4)
+
+        drift = ratings.recompute(dry_run=True)
+        self.assertEqual(list(drift["article"]), [self.article.pk])
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.rating_count, 2)
+
+        ratings.recompute()
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.rating_count, 1)
+        self.assertEqual(self.article.average_rating, 5.0)
+        self.assertEqual(
+            ratings.histogram(self.article), {"1": 0, "2": 0, "3": 0, "4": 0, "5": 1}
+        )
+        self.assertEqual(ratings.recompute(dry_run=True)["article"], {})
+
+
+class DailyViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.science = BookCategory.objects.create(name="Ylym")
+        self.physics = BookCategory.objects.create(name="Fizika", parent=self.science)
+        self.books = Book.objects.bulk_create(
+            Book(title=f"Kitap {i}", author="Awtor", language="tm", content="Mazmuny")
+            for i in range(2)
+        )
+        self.books[0].categories.add(self.physics)
+        self.books[1].categories.add(self.science)
+
+    def test_rollup_and_series(self):
+        day = date(2025, 3, 10)
+        daily_views.record("book", {self.books[0].pk: 3, self.books[1].pk: 1}, day)
+        daily_views.record("book", {self.books[0].pk: 2}, day)
+        daily_views.record("book", {self.books[0].pk: 4}, day + timedelta(days=2))
+
+        url = reverse("api_v1:book-daily-views", kwargs={"pk": self.books[0].pk})
+        data = self.client.get(url, {"from": "2025-03-10", "to": "2025-03-12"}).data
+        self.assertEqual([p["views"] for p in data["series"]], [5, 0, 4])
+        self.assertEqual(data["total"], 9)
+
+        url = reverse(
+            "api_v1:book-category-daily-views", kwargs={"pk": self.science.pk}
+        )
+        data = self.client.get(url, {"from": "2025-03-10", "to": "2025-03-10"}).data
+        self.assertEqual(data["series"], [{"day": "2025-03-10", "views": 6}])
+
+        url = reverse(
+            "api_v1:book-category-daily-views", kwargs={"pk": self.physics.pk}
+        )
+        data = self.client.get(url, {"from": "2025-03-10", "to": "2025-03-10"}).data
+        self.assertEqual(data["total"], 5)
+
+    def test_invalid_range(self):
+        url = reverse("api_v1:book-daily-views", kwargs={"pk": self.books[0].pk})
+        self.assertEqual(self.client.get(url, {"from": "x"}).status_code, 400)
+        response = self.client.get(url, {"from": "2025-03-12", "to": "2025-03-10"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TrendingTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = ArticleCategory.objects.create(name="Ylym")
+        self.old, self.fresh, self.other = Article.objects.bulk_create(
+            Article(
+                title=f"Makala {i}",
+                content="Mazmuny",
+                author="Awtor",
+                language=language,
+                type="local",
+                views=views,
+                publication_date=date(2025, 1, 1),
+            )
+            for i, (language, views) in enumerate([("tm", 10000), ("tm", 0), ("ru", 0)])
+        )
+        self.fresh.categories.add(self.category)
+        today = timezone.now().date()
+        daily_views.record("article", {self.old.pk: 100}, today - timedelta(days=12))
+        daily_views.record("article", {self.fresh.pk: 40}, today)
+        daily_views.record("article", {self.other.pk: 20}, today)
+
+    def test_decay_and_ranking(self):
+        self.assertEqual(trending.compute_scores(), 3)
+        scores = dict(TrendingScore.objects.values_list("content_id", "score"))
+        self.assertAlmostEqual(scores[self.fresh.pk], 40.0)
+        self.assertAlmostEqual(scores[self.old.pk], 100 * 2 ** (-12 / 3))
+
+        response = self.client.get(reverse("api_v1:trending"))
+        ids = [item["id"] for item in response.data["results"]]
+        self.assertEqual(ids, [self.fresh.pk, self.other.pk, self.old.pk])
+        self.assertEqual(response.data["results"][0]["type"], "article")
+
+    def test_filters(self):
+        trending.compute_scores()
+        url = reverse("api_v1:trending")
+
+        response = self.client.get(url, {"language": "ru"})
+        self.assertEqual([i["id"] for i in response.data["results"]], [self.other.pk])
+
+        params = {"content_type": "article", "category": self.category.pk}
+        response = self.client.get(url, params)
+        self.assertEqual([i["id"] for i in response.data["results"]], [self.fresh.pk])
+
+        response = self.client.get(url, {"category": self.category.pk})
+        self.assertEqual(response.status_code, 400)
+
+
+class StatisticsSnapshotTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        Article.objects.bulk_create(
+            Article(
+                title=f"Makala {i}",
+                content="Mazmuny",
+                author="Awtor",
+                language=language,
+                type="local",
+                views=views,
+                average_rating=rating,
+                rating_4=1,
+                publication_date=timezone.now().date(),
+            )
+            for i, (language, views, rating) in enumerate(
+                [("tm", 10, 4.0), ("ru", 30, 2.0)]
+            )
+        )
+        Book.objects.bulk_create(
+            [Book(title="Kitap", author="Awtor", language="en", content="M", views=5)]
+        )
+        self.staff = User.objects.create_user(
+            username="admin", password="pass12345", is_staff=True
+        )
+        self.staff.profile.bookmarked_books.add(Book.objects.get())
+
+    def test_snapshot_contents(self):
+        data = statistics_snapshot.take().data
+        self.assertEqual(data["types"]["article"]["count"], 2)
+        self.assertEqual(data["types"]["article"]["total_views"], 40)
+        self.assertEqual(data["types"]["article"]["avg_rating"], 3.0)
+        self.assertEqual(data["types"]["article"]["new_last_month"], 2)
+        self.assertIsNone(data["types"]["book"]["new_last_month"])
+        self.assertEqual(data["languages"], {"tm": 1, "ru": 1, "en": 1})
+        self.assertEqual(data["ratings_histogram"]["4"], 2)
+        self.assertEqual(data["bookmarks"]["book"], 1)
+        self.assertEqual(data["new_items"]["counts"][-1], 2)
+        self.assertEqual(data["types"]["article"]["top"][0]["views"], 30)
+
+    def test_dashboard_reads_latest_snapshot(self):
+        statistics_snapshot.take()
+        request = RequestFactory().get("/admin/statistics/data/")
+        request.user = self.staff
+        with self.assertNumQueries(1):  # snapshot history
+            response = admin_statistics_data(request)
+        data = json.loads(response.content)
+        self.assertEqual(data["totals"]["total_materials"], 3)
+        self.assertEqual(data["top_items"][0]["views"], 30)
+        self.assertEqual(len(data["history"]), 1)
+
+        with patch("content.views.render") as render:
+            admin_statistics(request)
+        context = render.call_args.args[2]
+        self.assertEqual(context["total_views"], 45)
+        self.assertEqual(context["bookmarks_total"], 1)
+
+
+class AdminChartTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        Article.objects.create(
+            title="<Makala> & co",
+            content="Mazmuny",
+            author="Awtor",
+            language="tm",
+            type="local",
+            views=12,
+            publication_date=timezone.now().date(),
+        )
+        self.staff = User.objects.create_user(
+            username="admin", password="pass12345", is_staff=True
+        )
+
+    def _get(self, chart_name, **headers):
+        request = RequestFactory().get(f"/admin/chart/{chart_name}.svg", **headers)
+        request.user = self.staff
+        return admin_chart(request, chart_name)
+
+    def test_builders_produce_svg(self):
+        for svg in (
+            svg_charts.bar_chart(["1", "2"], [0, 3], title="<t>"),
+            svg_charts.hbar_chart(["a & b"], [5]),
+            svg_charts.line_chart(["01", "02", "03"], [1, 0, 2]),
+            svg_charts.pie_chart(["TM", "RU"], [1, 0]),
+            svg_charts.pie_chart(["TM"], [0]),
+            svg_charts.sparkline([], kind="bar"),
+        ):
+            self.assertTrue(svg.startswith("<svg"))
+            self.assertTrue(svg.endswith("</svg>"))
+            self.assertNotIn("<t>", svg)
+
+    def test_serves_prerendered_chart_with_etag(self):
+        statistics_snapshot.take()
+        self.assertEqual(
+            charts.prerender(statistics_snapshot.latest()), len(charts.CHARTS)
+        )
+
+        with patch("content.charts.render") as render:
+            response = self._get("top")
+        render.assert_not_called()
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        self.assertIn(b"&lt;Makala&gt; &amp; co", response.content)
+
+        response = self._get("top", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self._get("pie").status_code, 400)
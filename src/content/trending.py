@@ -0,0 +1,140 @@
+"""
+Time-decayed trending scores.
+
+An item's score is its recent activity with every event weighted by
+``2 ** (-age / TRENDING_HALF_LIFE_DAYS)``:
+
+    score = sum(views per day * decay(age of the day))
+          + TRENDING_RATING_WEIGHT * sum(stars / 5 * decay(age of the vote))
+
+over the last ``TRENDING_WINDOW_DAYS``. ``compute_scores`` (Celery beat)
+scores all items of a type at once: the activity rows are loaded into
+NumPy arrays and summed into an array aligned with the sorted item ids,
+then the ranking table ``TrendingScore`` is replaced in one transaction.
+The ``/trending/`` endpoint pages through that table by score.
+"""
+
+import logging
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .content_types import MODELS
+from .models import ContentRating, DailyView, TrendingScore
+from .utils import cache_versions
+
+logger = logging.getLogger(__name__)
+
+# Version scope bumped after every rebuild (cached counts of the ranking)
+SCOPE = "trendingscore"
+
+
+def _setting(name, default):
+    return float(getattr(settings, name, default))
+
+
+def decay(age_days):
+    """Weight of events ``age_days`` old (array); 1 now, 0.5 after a half-life."""
+    return np.exp2(
+        -np.asarray(age_days, dtype=np.float64) / _setting("TRENDING_HALF_LIFE_DAYS", 3)
+    )
+
+
+def _accumulate(scores, ids, content_ids, weights):
+    """Add ``weights`` to ``scores`` at the positions of ``content_ids`` in ``ids``."""
+    if not len(content_ids):
+        return
+    positions = np.searchsorted(ids, content_ids)
+    clipped = np.minimum(positions, len(ids) - 1)
+    # activity of deleted items has no position
+    known = ids[clipped] == content_ids
+    scores += np.bincount(positions[known], weights=weights[known], minlength=len(ids))
+
+
+def score_type(content_type, now=None):
+    """
+    Scores of all items of one type.
+
+    Returns:
+        tuple: (ids, languages, scores) arrays aligned by position
+    """
+    now = now or timezone.now()
+    today = now.date()
+    window = int(_setting("TRENDING_WINDOW_DAYS", 14))
+    model = MODELS[content_type]
+
+    items = list(model.objects.order_by("id").values_list("id", "language"))
+    ids = np.fromiter((row[0] for row in items), dtype=np.int64, count=len(items))
+    languages = np.array([row[1] for row in items], dtype=object)
+    scores = np.zeros(len(ids))
+    if not len(ids):
+        return ids, languages, scores
+
+    views = list(
+        DailyView.objects.filter(
+            content_type=content_type, day__gt=today - timedelta(days=window)
+        ).values_list("content_id", "day", "views")
+    )
+    if views:
+        content_ids, days, counts = zip(*views)
+        ages = today.toordinal() - np.fromiter(
+            (day.toordinal() for day in days), dtype=np.int64, count=len(days)
+        )
+        weights = np.asarray(counts, dtype=np.float64) * decay(ages)
+        _accumulate(scores, ids, np.asarray(content_ids, dtype=np.int64), weights)
+
+    votes = list(
+        ContentRating.objects.filter(
+            content_type=content_type, created_at__gt=now - timedelta(days=window)
+        ).values_list("content_id", "created_at", "rating")
+    )
+    if votes:
+        content_ids, created, stars = zip(*votes)
+        ages = np.fromiter(
+            ((now - at).total_seconds() / 86400 for at in created),
+            dtype=np.float64,
+            count=len(created),
+        )
+        weights = (
+            _setting("TRENDING_RATING_WEIGHT", 5)
+            * np.asarray(stars, dtype=np.float64)
+            / 5
+            * decay(ages)
+        )
+        _accumulate(scores, ids, np.asarray(content_ids, dtype=np.int64), weights)
+
+    return ids, languages, scores
+
+
+def compute_scores(now=None):
+    """
+    Rebuild the ``TrendingScore`` ranking of all content.
+
+    Returns:
+        int: Number of ranked items
+    """
+    now = now or timezone.now()
+    rows = []
+    for content_type in MODELS:
+        ids, languages, scores = score_type(content_type, now)
+        for position in np.flatnonzero(scores > 0):
+            rows.append(
+                TrendingScore(
+                    content_type=content_type,
+                    content_id=int(ids[position]),
+                    language=languages[position],
+                    score=float(scores[position]),
+                )
+            )
+
+    # Readers keep seeing the previous ranking until the swap commits
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(rows, batch_size=1000)
+    try:
+        cache_versions.bump_version(SCOPE)
+    except Exception:
+        logger.exception("Failed to invalidate trending counts")
+    return len(rows)
@@ -0,0 +1,213 @@
+"""
+Set-based SQL helpers for counters and buffers.
+
+The ORM has no ``UPDATE ... FROM (VALUES ...)``, ``DELETE ... RETURNING``
+or increment-on-conflict upserts, so these build the SQL directly. The
+PostgreSQL statements are the fast path; other backends fall back to
+equivalent per-row ORM operations inside the caller's transaction.
+"""
+
+from django.db import connection
+from django.db.models import F
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def update_from_values(model, key_field, values, assignments, chunk_size=1000):
+    """
+    Update many rows in one statement per chunk from a list of value tuples.
+
+    Args:
+        model: Django model to update
+        key_field: Column that identifies the row (e.g. "id")
+        values: Dict of key -> tuple of values, in the order of ``assignments``
+        assignments: List of (column, sql) pairs; ``sql`` may reference the
+            current row as ``t.<column>`` and the new values as ``v.<column>``
+        chunk_size: Rows per statement
+
+    Returns:
+        list: Keys of the rows that were updated
+    """
+    if not values:
+        return []
+
+    table = _qn(model._meta.db_table)
+    columns = [column for column, _ in assignments]
+    value_columns = ", ".join(_qn(c) for c in [key_field] + columns)
+    set_clause = ", ".join(f"{_qn(column)} = {sql}" for column, sql in assignments)
+    placeholder = "(" + ", ".join(["%s"] * (len(columns) + 1)) + ")"
+
+    updated = []
+    items = list(values.items())
+    with connection.cursor() as cursor:
+        for chunk in _chunks(items, chunk_size):
+            params = []
+            for key, row in chunk:
+                params.append(key)
+                params.extend(row)
+            sql = (
+                f"UPDATE {table} AS t SET {set_clause} "
+                f"FROM (VALUES {', '.join([placeholder] * len(chunk))}) "
+                f"AS v({value_columns}) "
+                f"WHERE t.{_qn(key_field)} = v.{_qn(key_field)} "
+                f"RETURNING t.{_qn(key_field)}"
+            )
+            cursor.execute(sql, params)
+            updated.extend(r[0] for r in cursor.fetchall())
+    return updated
+
+
+def increment_from_values(model, field, increments, key_field="id"):
+    """
+    Add per-row increments to a numeric column.
+
+    Args:
+        model: Django model to update
+        field: Numeric column to increment (e.g. "views")
+        increments: Dict of row key -> amount to add
+
+    Returns:
+        list: Keys of the rows that exist and were incremented
+    """
+    increments = {k: n for k, n in increments.items() if n}
+    if not increments:
+        return []
+
+    if connection.vendor == "postgresql":
+        return update_from_values(
+            model,
+            key_field,
+            {k: (n,) for k, n in increments.items()},
+            [(field, f"t.{_qn(field)} + v.{_qn(field)}")],
+        )
+
+    updated = []
+    for key, amount in increments.items():
+        if model.objects.filter(**{key_field: key}).update(
+            **{field: F(field) + amount}
+        ):
+            updated.append(key)
+    return updated
+
+
+def assign_from_values(model, fields, values, key_field="id"):
+    """
+    Overwrite columns of many rows with per-row values.
+
+    Args:
+        model: Django model to update
+        fields: Columns to set
+        values: Dict of row key -> tuple of values, in the order of ``fields``
+
+    Returns:
+        list: Keys of the rows that exist and were updated
+    """
+    if not values:
+        return []
+
+    if connection.vendor == "postgresql":
+        return update_from_values(
+            model,
+            key_field,
+            values,
+            [(field, f"v.{_qn(field)}") for field in fields],
+        )
+
+    updated = []
+    for key, row in values.items():
+        if model.objects.filter(**{key_field: key}).update(**dict(zip(fields, row))):
+            updated.append(key)
+    return updated
+
+
+def delete_returning(model, filters, columns):
+    """
+    Delete rows matching ``filters`` and return the requested columns.
+
+    The delete and the read happen in one statement, so rows created or
+    incremented concurrently after the snapshot are left for the next run.
+
+    Args:
+        model: Django model whose rows are deleted
+        filters: Dict of column -> value (equality only)
+        columns: Column names to return
+
+    Returns:
+        list: Tuples of the returned columns
+    """
+    table = _qn(model._meta.db_table)
+    where = " AND ".join(f"{_qn(c)} = %s" for c in filters) or "1 = 1"
+    returning = ", ".join(_qn(c) for c in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {where} RETURNING {returning}",
+            list(filters.values()),
+        )
+        return cursor.fetchall()
+
+
+def upsert_increment(model, unique_fields, values, field, amount=1, extra=None):
+    """
+    Insert a counter row or atomically add ``amount`` to the existing one.
+
+    Unlike ``get_or_create`` + ``update`` this cannot lose an increment when
+    the row is deleted concurrently (e.g. by ``flush_views``).
+
+    Args:
+        model: Django model with a unique constraint over ``unique_fields``
+        unique_fields: Columns of the unique constraint
+        values: Dict of column -> value for the unique columns
+        field: Counter column
+        amount: Value to insert or add
+        extra: Dict of additional column -> value, overwritten on conflict
+    """
+    extra = extra or {}
+    table = _qn(model._meta.db_table)
+    columns = list(unique_fields) + [field] + list(extra)
+    params = [values[c] for c in unique_fields] + [amount] + list(extra.values())
+    updates = [f"{_qn(field)} = {table}.{_qn(field)} + EXCLUDED.{_qn(field)}"]
+    updates += [f"{_qn(c)} = EXCLUDED.{_qn(c)}" for c in extra]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(_qn(c) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(_qn(c) for c in unique_fields)}) "
+        f"DO UPDATE SET {', '.join(updates)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def upsert_increment_many(model, unique_fields, field, rows, chunk_size=1000):
+    """
+    ``upsert_increment`` for many rows, one statement per chunk.
+
+    Args:
+        model: Django model with a unique constraint over ``unique_fields``
+        unique_fields: Columns of the unique constraint
+        field: Counter column
+        rows: Iterable of tuples: the ``unique_fields`` values, then the amount
+        chunk_size: Rows per statement
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    table = _qn(model._meta.db_table)
+    columns = list(unique_fields) + [field]
+    placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    with connection.cursor() as cursor:
+        for chunk in _chunks(rows, chunk_size):
+            sql = (
+                f"INSERT INTO {table} ({', '.join(_qn(c) for c in columns)}) "
+                f"VALUES {', '.join([placeholder] * len(chunk))} "
+                f"ON CONFLICT ({', '.join(_qn(c) for c in unique_fields)}) "
+                f"DO UPDATE SET {_qn(field)} = "
+                f"{table}.{_qn(field)} + EXCLUDED.{_qn(field)}"
+            )
+            cursor.execute(sql, [value for row in chunk for value in row])
@@ -0,0 +1,120 @@
+"""
+Scoped cache version counters.
+
+Cached payloads record the versions of the scopes they depend on and are
+treated as outdated once any of those versions moves on. Bumping a scope
+therefore invalidates only the entries that depend on it, instead of
+everything behind one global counter.
+
+Scopes used by the content app:
+    "article"              lists of a content type
+    "article:42"           one object's detail payload
+    "article:categories"   category names embedded in detail payloads
+    "search:article"       the search index (see ``search_cache``)
+
+Versions are read through the in-process L1 (``local_cache``); bumps
+evict the counter from the L1 of every process.
+"""
+
+from django.core.cache import cache
+
+from . import local_cache
+
+VERSION_KEY_PREFIX = "cachever"
+
+
+def _key(scope):
+    return f"{VERSION_KEY_PREFIX}:{scope}"
+
+
+def get_versions(scopes):
+    """
+    Read the current version of several scopes in one round-trip.
+
+    Args:
+        scopes: Iterable of scope names
+
+    Returns:
+        dict: scope -> int version (0 when never bumped)
+    """
+    scopes = list(scopes)
+    try:
+        found = local_cache.get_many([_key(s) for s in scopes])
+    except Exception:
+        found = {}
+    return {s: int(found.get(_key(s)) or 0) for s in scopes}
+
+
+async def aget_versions(scopes):
+    """Async variant of ``get_versions``."""
+    scopes = list(scopes)
+    keys = [_key(s) for s in scopes]
+    try:
+        found, generation = local_cache.get_local_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = await cache.aget_many(missing)
+            local_cache.fill(fetched, generation)
+            found.update(fetched)
+    except Exception:
+        found = {}
+    return {s: int(found.get(_key(s)) or 0) for s in scopes}
+
+
+def get_version(scope):
+    return get_versions([scope])[scope]
+
+
+def bump_version(scope):
+    """
+    Atomically increment the version of ``scope``.
+
+    Uses ``incr`` (a single ``INCR`` on Redis) so concurrent bumps are never
+    lost. Version keys do not expire.
+
+    Returns:
+        int: The new version, or None if the cache is unavailable
+    """
+    key = _key(scope)
+    try:
+        cache.add(key, 0, timeout=None)
+        version = cache.incr(key)
+    except ValueError:
+        # evicted between add and incr
+        cache.set(key, 1, timeout=None)
+        version = 1
+    except Exception:
+        return None
+    local_cache.invalidate([key])
+    return version
+
+
+def bump_versions(scopes):
+    """Bump several scopes; each increment is atomic on its own."""
+    for scope in scopes:
+        bump_version(scope)
+
+
+def object_scopes(content_type, pk):
+    """Scopes a detail payload of ``content_type`` #``pk`` depends on."""
+    return (f"{content_type}:{pk}", f"{content_type}:categories")
+
+
+def object_version_token(content_type, pk):
+    """
+    Version string for detail cache keys, e.g. "3.1".
+
+    Changes whenever the object or the categories of its type change.
+    """
+    versions = get_versions(object_scopes(content_type, pk))
+    return ".".join(str(v) for v in versions.values())
+
+
+def invalidate_object(content_type, pk):
+    """The object changed: drop its detail entries and its type's lists."""
+    bump_versions((f"{content_type}:{pk}", content_type))
+
+
+def invalidate_categories(content_type):
+    """Categories changed: drop detail entries and lists of ``content_type``."""
+    bump_versions((f"{content_type}:categories", content_type))
@@ -0,0 +1,104 @@
+"""
+Result counts for paginated lists.
+
+Exact counts are cached per filtered query under the version of the
+content type (see ``cache_versions``), so each filter combination pays
+``COUNT(*)`` once per change instead of once per cache miss of a page.
+On PostgreSQL, result sets the planner expects to be larger than
+``COUNT_ESTIMATE_THRESHOLD`` rows are not counted at all: unfiltered
+queries use ``pg_class.reltuples`` and filtered ones the row estimate of
+``EXPLAIN``. Such counts are flagged as approximate.
+"""
+
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from . import cache_versions
+
+logger = logging.getLogger(__name__)
+
+
+def _threshold():
+    return int(getattr(settings, "COUNT_ESTIMATE_THRESHOLD", 10000))
+
+
+def _timeout():
+    return int(getattr(settings, "COUNT_CACHE_TTL", 600))
+
+
+def cache_key(queryset):
+    """Key of a filtered query's count, under its content type's version."""
+    scope = queryset.model.__name__.lower()
+    version = cache_versions.get_version(scope)
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}|{params!r}".encode("utf-8")).hexdigest()
+    return f"{scope}:count:v{version}:{digest}"
+
+
+def estimate(queryset):
+    """
+    Planner row estimate for ``queryset`` (PostgreSQL only).
+
+    Returns:
+        int or None when no estimate is available
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    try:
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+                # -1 until the table has been analyzed
+                return int(row[0]) if row and row[0] >= 0 else None
+
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        logger.warning("Count estimate failed", exc_info=True)
+        return None
+
+
+def get_count(queryset):
+    """
+    Count ``queryset`` from the cache, a planner estimate or ``COUNT(*)``.
+
+    Returns:
+        tuple: (count, approximate)
+    """
+    try:
+        key = cache_key(queryset)
+    except EmptyResultSet:
+        return 0, False  # e.g. queryset.none()
+    try:
+        cached = cache.get(key)
+    except Exception:
+        cached = None
+    if cached is not None:
+        return cached["count"], cached["approximate"]
+
+    approximate = False
+    count = estimate(queryset)
+    if count is not None and count >= _threshold():
+        approximate = True
+    else:
+        count = queryset.count()
+
+    try:
+        cache.set(key, {"count": count, "approximate": approximate}, _timeout())
+    except Exception:
+        pass  # Cache failure shouldn't break the request
+    return count, approximate
@@ -0,0 +1,89 @@
+"""
+ETag helpers for cached API responses.
+
+The ETag of a shared payload is computed once, when the payload is cached,
+and stored next to it. A request whose If-None-Match still matches gets a
+304 straight from the cache entry, without serialization or DB access.
+Per-user fields applied on top of the payload (``is_bookmarked``) are
+folded into the tag, so two users never share an ETag for different bodies.
+"""
+
+import hashlib
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags, patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def payload_etag(data):
+    """Strong ETag value (unquoted) of a JSON-serializable payload."""
+    raw = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def bookmark_etag(etag, items):
+    """Fold the per-item ``is_bookmarked`` flags into ``etag``."""
+    flags = "".join("1" if item.get("is_bookmarked") else "0" for item in items)
+    if "1" not in flags:
+        # Same tag as for anonymous users
+        return etag
+    return f"{etag}-{hashlib.md5(flags.encode()).hexdigest()[:8]}"
+
+
+def _matches(request, etag):
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    # GZipMiddleware weakens ETags (W/"..."); If-None-Match compares weakly
+    candidates = [tag.removeprefix("W/") for tag in parse_etags(header)]
+    return "*" in candidates or f'"{etag}"' in candidates
+
+
+def conditional_response(request, data, etag, per_user=False):
+    """
+    Return ``data`` with an ETag, or an empty 304 if the client has it.
+
+    Args:
+        request: Incoming request (If-None-Match is read from it)
+        data: Response payload
+        etag: Unquoted ETag value of ``data``
+        per_user: Body depends on the authenticated user
+
+    Returns:
+        Response
+    """
+    if _matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response["ETag"] = f'"{etag}"'
+    # Clients must revalidate, which is cheap thanks to the 304 path
+    patch_cache_control(response, no_cache=True)
+    if per_user:
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def conditional_http_response(request, content, etag, content_type):
+    """
+    Plain Django counterpart of ``conditional_response`` for non-JSON bodies.
+
+    Args:
+        request: Incoming request (If-None-Match is read from it)
+        content: Response body (bytes)
+        etag: Unquoted ETag value of ``content``
+        content_type: MIME type of ``content``
+
+    Returns:
+        HttpResponse
+    """
+    if _matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response["ETag"] = f'"{etag}"'
+    patch_cache_control(response, no_cache=True)
+    return response
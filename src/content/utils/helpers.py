@@ -3,7 +3,6 @@ Helper utilities for content app.
 """
 
 from django.db.models import Count
-from django.core.cache import cache
 from datetime import timedelta
 from django.db.models.functions import TruncDate
 
@@ -104,17 +103,3 @@ def daily_counts_list_from_map(counts_map, since_date, days=30, date_fmt="%Y-%m-
         dates.append(d.strftime(date_fmt))
         counts.append(counts_map.get(d, 0))
     return dates, counts
-
-
-def increment_cache_version(key="content_cache_version"):
-    """
-    Increment global cache version for invalidation.
-
-    Args:
-        key: Cache key name
-    """
-    try:
-        v = cache.get(key) or 0
-        cache.set(key, int(v) + 1)
-    except Exception:
-        pass
@@ -0,0 +1,268 @@
+"""
+In-process LRU (L1) in front of the Django cache for small hot keys.
+
+Version counters, category lists, the Elasticsearch health flag and the
+admin statistics are read on almost every request; serving them from a
+per-process dict avoids a Redis round-trip each time. Entries are bounded
+in number (``L1_CACHE_MAX_ENTRIES``) and age (``L1_CACHE_TTL``).
+
+Coherence across workers and nodes comes from a Redis pub/sub channel:
+``set``/``delete``/``invalidate`` publish the affected keys and every
+process evicts them from its L1. A background thread per process listens
+on the channel; until it is subscribed, and whenever the connection drops,
+the L1 is bypassed and cleared, since invalidations may have been missed.
+Without a Redis-backed cache there is nothing to keep coherent against,
+so the L1 stays off and calls go straight to the Django cache.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+
+from .redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LocalCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.enabled = False
+        # Bumped on every eviction so fills started before it are dropped
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, generation=None):
+        """Store ``value`` unless an eviction happened since ``generation``."""
+        if ttl is None or ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def evict(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local = LocalCache(int(_setting("L1_CACHE_MAX_ENTRIES", 1024)))
+
+
+class _Subscriber:
+    """Listens for invalidations; one thread per process (fork-aware)."""
+
+    def __init__(self):
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A forked child inherits the parent's entries but not its thread
+            local.enabled = False
+            local.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="l1-cache-invalidation", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        channel = _setting("L1_CACHE_CHANNEL", "cache:l1:invalidate")
+        while True:
+            client = get_redis_connection()
+            if client is None:
+                return  # not Redis-backed: the L1 stays off
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(channel)
+                pubsub.get_message(timeout=1.0)  # subscribe confirmation
+                local.clear()
+                local.enabled = True
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        _apply(message["data"])
+            except Exception:
+                logger.warning("L1 cache invalidation channel lost", exc_info=True)
+            finally:
+                local.enabled = False
+                local.clear()
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(1)
+
+
+_subscriber = _Subscriber()
+
+
+def _apply(data):
+    if isinstance(data, bytes):
+        data = data.decode()
+    keys = json.loads(data)
+    if keys == "*":
+        local.clear()
+    else:
+        local.evict(keys)
+
+
+def _active():
+    if not _setting("L1_CACHE_ENABLED", True):
+        return False
+    _subscriber.ensure_running()
+    return local.enabled
+
+
+def _ttl(timeout=None):
+    ttl = _setting("L1_CACHE_TTL", 30)
+    if timeout is not None:
+        ttl = min(ttl, timeout)
+    return ttl
+
+
+def _publish(keys):
+    client = get_redis_connection()
+    if client is None:
+        return
+    try:
+        client.publish(
+            _setting("L1_CACHE_CHANNEL", "cache:l1:invalidate"), json.dumps(keys)
+        )
+    except Exception:
+        logger.warning("Failed to publish L1 cache invalidation", exc_info=True)
+
+
+def get(key, default=None, timeout=None):
+    """
+    Read ``key`` from the L1, falling back to the Django cache.
+
+    Args:
+        key: Cache key
+        default: Returned when the key is in neither tier
+        timeout: Upper bound in seconds for keeping the value in the L1
+
+    Returns:
+        The cached value or ``default``
+    """
+    if not _active():
+        return cache.get(key, default)
+    value = local.get(key)
+    if value is not MISSING:
+        return value
+    generation = local.generation
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        return default
+    local.set(key, value, _ttl(timeout), generation)
+    return value
+
+
+def get_local_many(keys):
+    """
+    L1 lookup only, for callers that fetch misses themselves (async code).
+
+    Returns:
+        tuple: (dict of hits, generation to pass to ``fill``)
+    """
+    if not _active():
+        return {}, None
+    found = {}
+    for key in keys:
+        value = local.get(key)
+        if value is not MISSING:
+            found[key] = value
+    return found, local.generation
+
+
+def fill(values, generation, timeout=None):
+    """Store values fetched from the Django cache after ``get_local_many``."""
+    if generation is None:
+        return
+    for key, value in values.items():
+        local.set(key, value, _ttl(timeout), generation)
+
+
+def get_many(keys, timeout=None):
+    """Like ``cache.get_many``, served from the L1 where possible."""
+    keys = list(keys)
+    found, generation = get_local_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        fetched = cache.get_many(missing)
+        fill(fetched, generation, timeout)
+        found.update(fetched)
+    return found
+
+
+def set(key, value, timeout, publish=True):
+    """
+    Write ``key`` to the Django cache and the local L1.
+
+    Args:
+        publish: Tell other processes to drop their copy. Keys that are
+            never overwritten with a different value (versioned keys)
+            can skip it.
+    """
+    cache.set(key, value, timeout)
+    if publish:
+        invalidate([key])
+    if _active():
+        local.set(key, value, _ttl(timeout))
+
+
+def delete(key):
+    cache.delete(key)
+    invalidate([key])
+
+
+def invalidate(keys):
+    """Drop ``keys`` from the L1 of this and every other process."""
+    keys = list(keys)
+    local.evict(keys)
+    _publish(keys)
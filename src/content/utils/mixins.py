@@ -3,8 +3,15 @@ Mixins for content viewsets.
 Implements reusable patterns using Mixin design pattern.
 """
 
+import hashlib
+from urllib.parse import urlencode
 from django.core.cache import cache
+from content import bookmarks
+from content.utils import cache_versions, local_cache, single_flight
+from content.utils.etags import bookmark_etag, conditional_response, payload_etag
 from django.db.models import Exists, OuterRef, Value, BooleanField
+from django.shortcuts import get_object_or_404
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
 
@@ -47,7 +54,12 @@ class BookmarkAnnotateMixin:
 
 class CachedRetrieveMixin:
     """
-    Mixin to add caching to retrieve actions.
+    Mixin to add caching and conditional GET to retrieve actions.
+
+    The cached payload is shared by all users (one entry per object and
+    version); the per-user ``is_bookmarked`` flag is applied on top of it
+    for each request. Responses carry an ETag stored with the entry, so a
+    matching If-None-Match is answered with 304 from the cache alone.
 
     Pattern: Decorator/Wrapper pattern for caching
     Usage: Implement get_cache_key() and cache_timeout in your ViewSet
@@ -67,46 +79,288 @@ class CachedRetrieveMixin:
             str: Cache key
         """
         model_name = self.queryset.model.__name__.lower()
-        user_id = (
-            self.request.user.id
-            if getattr(self.request, "user", None)
-            and self.request.user.is_authenticated
-            else "anon"
-        )
-        version = self._get_cache_version()
-        return f"{model_name}:detail:v{version}:{pk}:user:{user_id}"
+        version = self._get_cache_version(model_name, pk)
+        return f"{model_name}:detail:v{version}:{pk}"
 
-    def _get_cache_version(self):
-        """Get global cache version for invalidation"""
+    def _get_cache_version(self, model_name, pk):
+        """Get the object's cache version (bumped when it or its categories change)"""
         try:
-            v = cache.get("content_cache_version")
-            return int(v or 0)
+            return cache_versions.object_version_token(model_name, pk)
         except Exception:
             return 0
 
+    def is_bookmarked(self, pk):
+        """
+        Check whether the requesting user bookmarked the object.
+
+        Uses the user's bookmark id set (see ``content.bookmarks``).
+
+        Args:
+            pk: Primary key of the object
+
+        Returns:
+            bool: Bookmark status (False for anonymous users)
+        """
+        user = getattr(self.request, "user", None)
+        if not (user and user.is_authenticated and self.bookmark_field_name):
+            return False
+        model_name = self.queryset.model.__name__.lower()
+        ids = bookmarks.get_bookmark_ids(user.id).get(model_name, ())
+        return int(pk) in ids
+
+    def apply_user_overlay(self, data, pk):
+        """Return a copy of the shared payload with per-user fields applied."""
+        data = dict(data)
+        data["is_bookmarked"] = self.is_bookmarked(pk)
+        return data
+
     def retrieve(self, request, *args, **kwargs):
         """
         Cached retrieve method.
-        Checks cache first, then falls back to database.
+        Checks cache first, then falls back to database (single-flight).
         """
         pk = kwargs.get("pk")
         cache_key = self.get_cache_key(pk)
 
-        # Try to get from cache
-        cached = cache.get(cache_key)
-        if cached is not None:
-            return Response(cached)
+        def build_entry():
+            # Not in cache, get from DB (queryset is not annotated per user)
+            response = super(CachedRetrieveMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+            shared = {k: v for k, v in response.data.items() if k != "is_bookmarked"}
+            return {"data": shared, "etag": payload_etag(shared)}
+
+        # One request per key rebuilds a missing entry; the others wait for it
+        entry = single_flight.get_or_compute(
+            cache_key,
+            build_entry,
+            self.cache_timeout,
+        )
+
+        data = self.apply_user_overlay(entry["data"], pk)
+        etag = bookmark_etag(entry["etag"], [data])
+        return conditional_response(request, data, etag, per_user=True)
+
+
+class CachedListMixin:
+    """
+    Mixin to cache list responses shared by all users.
+
+    Pages are cached under the current version of ``list_cache_scope`` (see
+    ``cache_versions``) and the normalized query parameters, so edits show
+    up on the next request instead of after the TTL. Small, hot lists
+    (categories) can set ``list_cache_local`` to be served from the
+    in-process L1 (``local_cache``) as well. With ``bookmark_overlay`` set,
+    ``is_bookmarked`` is applied to a copy of the page for each request
+    from the user's bookmark id set. Responses carry an ETag and matching
+    conditional requests get 304.
+
+    Usage: Set list_cache_scope / list_cache_timeout in your ViewSet
+    """
+
+    list_cache_timeout = 60 * 10
+    list_cache_scope = None  # Defaults to the model name
+    list_cache_local = False
+    bookmark_overlay = True
+
+    def get_list_cache_scope(self):
+        return self.list_cache_scope or self.queryset.model.__name__.lower()
+
+    def get_list_cache_key(self, request):
+        """Cache key for a list page (scope version + normalized parameters)"""
+        scope = self.get_list_cache_scope()
+        version = cache_versions.get_version(scope)
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+            if value != ""
+        )
+        # Scheme and host are part of the key: payloads hold absolute links
+        raw = f"{request.scheme}://{request.get_host()}?{urlencode(params)}"
+        digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+        return f"{scope}:list:v{version}:{digest}"
+
+    def list(self, request, *args, **kwargs):
+        cache_key = self.get_list_cache_key(request)
+        store = local_cache if self.list_cache_local else cache
+
+        entry = store.get(cache_key)
+        if entry is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = {"data": response.data, "etag": payload_etag(response.data)}
+            try:
+                if self.list_cache_local:
+                    # Versioned key: its value never changes, nothing to publish
+                    local_cache.set(
+                        cache_key, entry, self.list_cache_timeout, publish=False
+                    )
+                else:
+                    cache.set(cache_key, entry, self.list_cache_timeout)
+            except Exception:
+                pass  # Cache failure shouldn't break the request
+
+        data, etag = entry["data"], entry["etag"]
+        if self.bookmark_overlay:
+            model_name = self.queryset.model.__name__.lower()
+            data = bookmarks.overlay(data, request.user, model_name)
+            items = data["results"] if isinstance(data, dict) else data
+            etag = bookmark_etag(etag, items)
+        return conditional_response(request, data, etag, per_user=self.bookmark_overlay)
+
+
+class CategoryTreeMixin:
+    """
+    Mixin adding a nested ``tree`` action to hierarchical category viewsets.
+
+    The tree is built from one query ordered by the materialized path and
+    cached (L1 + cache) under the categories version of the content type.
+
+    Usage: Combine with CachedListMixin (for the version scope)
+    """
+
+    @action(detail=False, methods=["get"])
+    def tree(self, request):
+        scope = self.get_list_cache_scope()
+        version = cache_versions.get_version(scope)
+        cache_key = f"{scope}:tree:v{version}"
+
+        entry = local_cache.get(cache_key)
+        if entry is None:
+            tree = self.build_tree()
+            entry = {"data": tree, "etag": payload_etag(tree)}
+            try:
+                local_cache.set(
+                    cache_key, entry, self.list_cache_timeout, publish=False
+                )
+            except Exception:
+                pass  # Cache failure shouldn't break the request
+        return conditional_response(request, entry["data"], entry["etag"])
+
+    def build_tree(self):
+        """Nested [{id, name, children}] from a single query."""
+        model = self.queryset.model
+        nodes, roots = {}, []
+        # Parents sort before their children: their path is a prefix
+        for row in model.objects.order_by("path").values("id", "name", "parent_id"):
+            node = nodes[row["id"]] = {
+                "id": row["id"],
+                "name": row["name"],
+                "children": [],
+            }
+            parent = nodes.get(row["parent_id"])
+            (parent["children"] if parent else roots).append(node)
+
+        for node in nodes.values():
+            node["children"].sort(key=lambda child: child["name"])
+        roots.sort(key=lambda node: node["name"])
+        return roots
+
+
+class CategoryTreeFilterMixin:
+    """
+    Mixin adding a ``category_tree=<id>`` filter to content viewsets.
+
+    Matches items in the category or any of its descendants, resolved with
+    an indexed prefix lookup on the category's materialized path.
+    """
 
-        # Not in cache, get from DB
-        response = super().retrieve(request, *args, **kwargs)
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        value = self.request.query_params.get("category_tree")
+        if not value:
+            return queryset
 
-        # Store in cache
+        model = self.queryset.model
+        category_model = model.categories.field.related_model
         try:
-            cache.set(cache_key, response.data, self.cache_timeout)
-        except Exception:
-            pass  # Cache failure shouldn't break the request
+            path = (
+                category_model.objects.filter(pk=int(value))
+                .values_list("path", flat=True)
+                .first()
+            )
+        except ValueError:
+            path = None
+        if not path:
+            return queryset.none()
+
+        matching = model.objects.filter(categories__path__startswith=path)
+        return queryset.filter(pk__in=matching.values("pk"))
+
+
+class RatingHistogramMixin:
+    """
+    Mixin adding a ``ratings`` detail action with the item's star histogram.
+
+    Reads the aggregates maintained by ``content.ratings`` from the item's
+    row instead of aggregating ``ContentRating``.
+    """
+
+    @action(detail=True, methods=["get"])
+    def ratings(self, request, pk=None):
+        from content import ratings
+
+        fields = ("average_rating", "rating_count") + ratings.HISTOGRAM_FIELDS
+        obj = get_object_or_404(self.queryset.model.objects.only(*fields), pk=pk)
+        return Response(
+            {
+                "average_rating": obj.average_rating,
+                "rating_count": obj.rating_count,
+                "histogram": ratings.histogram(obj),
+            }
+        )
+
+
+class DailyViewsMixin:
+    """
+    Mixin adding a ``daily-views`` detail action to content viewsets.
+
+    Returns the item's per-day views from the ``DailyView`` rollup for the
+    inclusive ``from``/``to`` dates (default: the last 30 days).
+    """
+
+    @action(detail=True, methods=["get"], url_path="daily-views")
+    def daily_views(self, request, pk=None):
+        from content import daily_views
 
-        return response
+        model = self.queryset.model
+        obj = get_object_or_404(model.objects.only("pk"), pk=pk)
+        start, end = daily_views.parse_range(request.query_params)
+        return Response(
+            daily_views.item_series(model.__name__.lower(), obj.pk, start, end)
+        )
+
+
+class CategoryDailyViewsMixin:
+    """
+    Mixin adding a ``daily-views`` detail action to category viewsets.
+
+    Sums the per-day views of the category's items; hierarchical categories
+    include their subtree.
+
+    Usage: Set ``content_model`` to the content model of the categories
+    """
+
+    content_model = None
+
+    @action(detail=True, methods=["get"], url_path="daily-views")
+    def daily_views(self, request, pk=None):
+        from content import daily_views
+
+        category = get_object_or_404(self.queryset.model, pk=pk)
+        items = self.content_model.objects.all()
+        if hasattr(category, "path"):
+            items = items.filter(categories__path__startswith=category.path)
+        else:
+            items = items.filter(categories=category)
+        start, end = daily_views.parse_range(request.query_params)
+        return Response(
+            daily_views.items_series(
+                self.content_model.__name__.lower(), items.values("pk"), start, end
+            )
+        )
 
 
 class ContentListOptimizationMixin:
@@ -128,10 +382,13 @@ class ContentListOptimizationMixin:
         if getattr(self, "action", None) == "list" and self.list_only_fields:
             queryset = queryset.only(*self.list_only_fields)
 
-        # Annotate bookmarks only for detail view (not list for caching)
-        if getattr(self, "action", None) != "list" and hasattr(
-            self, "annotate_bookmarks"
-        ):
+        # Annotate bookmarks only for per-user responses: lists are cached
+        # for everyone and cached retrieves apply `is_bookmarked` themselves
+        shared_payload = getattr(self, "action", None) == "list" or (
+            getattr(self, "action", None) == "retrieve"
+            and isinstance(self, CachedRetrieveMixin)
+        )
+        if not shared_payload and hasattr(self, "annotate_bookmarks"):
             queryset = self.annotate_bookmarks(queryset)
 
         return queryset
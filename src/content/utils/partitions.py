@@ -0,0 +1,98 @@
+"""
+Daily range partitions on PostgreSQL.
+
+A table partitioned ``BY RANGE (<date column>)`` gets one child table per
+day, named ``<table>_pYYYYMMDD``. Creating upcoming days ahead of time
+keeps inserts from failing; expiring a day is a ``DROP TABLE`` of its
+partition, which costs the same no matter how many rows it holds.
+"""
+
+import re
+from datetime import date, timedelta
+from django.db import connection
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def partition_name(table, day):
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def is_partitioned(table):
+    """True if ``table`` is a partitioned table (PostgreSQL only)."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(table):
+    """
+    Existing daily partitions of ``table``.
+
+    Returns:
+        dict: day -> partition table name
+    """
+    pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})(\d{{2}})(\d{{2}})$")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    found = {}
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            found[date(*(int(part) for part in match.groups()))] = name
+    return found
+
+
+def create_partitions(table, first_day, last_day):
+    """
+    Create the partitions of ``first_day`` .. ``last_day`` that are missing.
+
+    Returns:
+        list: Names of the partitions created
+    """
+    existing = partitions(table)
+    created = []
+    with connection.cursor() as cursor:
+        day = first_day
+        while day <= last_day:
+            if day not in existing:
+                name = partition_name(table, day)
+                upper = day + timedelta(days=1)
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {_qn(name)} "
+                    f"PARTITION OF {_qn(table)} "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{upper.isoformat()}')"
+                )
+                created.append(name)
+            day += timedelta(days=1)
+    return created
+
+
+def drop_partitions_before(table, day):
+    """
+    Drop the partitions of days earlier than ``day``.
+
+    Returns:
+        list: Names of the partitions dropped
+    """
+    dropped = []
+    with connection.cursor() as cursor:
+        for partition_day, name in sorted(partitions(table).items()):
+            if partition_day >= day:
+                break
+            cursor.execute(f"DROP TABLE IF EXISTS {_qn(name)}")
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,51 @@
+"""
+Access to the raw Redis connection behind the Django cache.
+
+Some features (view counters, dedupe sets, pub/sub) need Redis primitives
+that the Django cache API does not expose. When the default cache is not
+Redis-backed (e.g. LocMemCache in development) callers get ``None`` and
+must fall back to a database or cache-only implementation.
+"""
+
+import logging
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis_connection(alias="default"):
+    """
+    Return a ``redis.Redis`` client for the given cache alias.
+
+    Supports Django's built-in ``RedisCache`` and ``django_redis``.
+
+    Args:
+        alias: Cache alias from ``settings.CACHES``
+
+    Returns:
+        redis.Redis instance, or None if the cache is not Redis-backed
+    """
+    try:
+        backend = caches[alias]
+    except Exception:
+        return None
+
+    # django.core.cache.backends.redis.RedisCache
+    client = getattr(backend, "_cache", None)
+    if client is not None and hasattr(client, "get_client"):
+        try:
+            return client.get_client(write=True)
+        except Exception:
+            logger.exception("Failed to get Redis client from cache %s", alias)
+            return None
+
+    # django_redis.cache.RedisCache
+    client = getattr(backend, "client", None)
+    if client is not None and hasattr(client, "get_client"):
+        try:
+            return client.get_client(write=True)
+        except Exception:
+            logger.exception("Failed to get Redis client from cache %s", alias)
+            return None
+
+    return None
@@ -0,0 +1,156 @@
+"""
+Single-flight cache fills.
+
+When a hot key is missing or outdated, only the request that wins a short
+lock (``cache.add`` of ``<key>:lock``) rebuilds it. Concurrent requests
+get the previous value if there is one, or poll the cache briefly for the
+new value instead of all hitting the database or Elasticsearch at once.
+If the lock holder takes longer than ``SINGLE_FLIGHT_WAIT`` seconds, the
+waiters compute the value themselves rather than fail.
+"""
+
+import asyncio
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05
+
+
+def _lock_timeout(lock_timeout):
+    if lock_timeout is None:
+        lock_timeout = getattr(settings, "SINGLE_FLIGHT_LOCK_TIMEOUT", 10)
+    return lock_timeout
+
+
+def _wait():
+    return float(getattr(settings, "SINGLE_FLIGHT_WAIT", 2.0))
+
+
+def _always_fresh(entry):
+    return True
+
+
+def _safe_get(key):
+    try:
+        return cache.get(key)
+    except Exception:
+        return None
+
+
+def _safe_delete(key):
+    try:
+        cache.delete(key)
+    except Exception:
+        pass
+
+
+def _safe_set(key, value, timeout):
+    try:
+        cache.set(key, value, timeout)
+    except Exception:
+        pass  # Cache failure shouldn't break the request
+
+
+def get_or_compute(key, compute, timeout, is_fresh=None, lock_timeout=None):
+    """
+    Return the cached value of ``key``, rebuilding it once on a miss.
+
+    Args:
+        key: Cache key
+        compute: Callable returning the value to cache; may raise
+        timeout: Cache timeout of the value
+        is_fresh: Callable deciding whether a cached value can be served
+            as-is; an outdated value is served to requests that lose the
+            lock and when ``compute`` fails
+        lock_timeout: Seconds before an abandoned lock expires
+
+    Returns:
+        The cached or computed value
+    """
+    is_fresh = is_fresh or _always_fresh
+    value = _safe_get(key)
+    if value is not None and is_fresh(value):
+        return value
+
+    lock_key = f"{key}:lock"
+    try:
+        locked = cache.add(lock_key, 1, _lock_timeout(lock_timeout))
+    except Exception:
+        locked = True  # no cache to coordinate through
+
+    if not locked:
+        if value is not None:
+            # Another request is refreshing this entry
+            return value
+        deadline = time.monotonic() + _wait()
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            value = _safe_get(key)
+            if value is not None:
+                return value
+
+    try:
+        fresh = compute()
+    except Exception:
+        if value is None:
+            raise
+        logger.warning("Refresh of %s failed; serving stale", key, exc_info=True)
+        return value
+    finally:
+        if locked:
+            _safe_delete(lock_key)
+    _safe_set(key, fresh, timeout)
+    return fresh
+
+
+async def aget_or_compute(key, compute, timeout, is_fresh=None, lock_timeout=None):
+    """Async variant of ``get_or_compute``; ``compute`` is a coroutine function."""
+    is_fresh = is_fresh or _always_fresh
+    try:
+        value = await cache.aget(key)
+    except Exception:
+        value = None
+    if value is not None and is_fresh(value):
+        return value
+
+    lock_key = f"{key}:lock"
+    try:
+        locked = await cache.aadd(lock_key, 1, _lock_timeout(lock_timeout))
+    except Exception:
+        locked = True
+
+    if not locked:
+        if value is not None:
+            return value
+        deadline = time.monotonic() + _wait()
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                value = await cache.aget(key)
+            except Exception:
+                value = None
+            if value is not None:
+                return value
+
+    try:
+        fresh = await compute()
+    except Exception:
+        if value is None:
+            raise
+        logger.warning("Refresh of %s failed; serving stale", key, exc_info=True)
+        return value
+    finally:
+        if locked:
+            try:
+                await cache.adelete(lock_key)
+            except Exception:
+                pass
+    try:
+        await cache.aset(key, fresh, timeout)
+    except Exception:
+        pass
+    return fresh
@@ -0,0 +1,239 @@
+"""
+Minimal SVG chart builder.
+
+Bar, horizontal bar, line, pie and sparkline charts as standalone SVG
+strings, built with string formatting only. This replaces matplotlib
+for the admin dashboard, which needs no more than these few static chart
+types and shouldn't load a plotting library into web workers.
+"""
+
+import math
+from xml.sax.saxutils import escape
+
+FONT = 'font-family="sans-serif"'
+AXIS_COLOR = "#9ca3af"
+TEXT_COLOR = "#374151"
+DEFAULT_COLOR = "#3b82f6"
+
+
+def _n(value):
+    """Compact coordinate: at most one decimal."""
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _text(x, y, text, size=11, anchor="middle", **attrs):
+    extra = "".join(
+        f' {key.replace("_", "-")}="{value}"' for key, value in attrs.items()
+    )
+    return (
+        f'<text x="{_n(x)}" y="{_n(y)}" font-size="{size}" {FONT} '
+        f'fill="{TEXT_COLOR}" text-anchor="{anchor}"{extra}>{escape(str(text))}</text>'
+    )
+
+
+def _svg(width, height, body, title=None):
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">'
+    ]
+    if title:
+        parts.append(_text(width / 2, 20, title, size=14))
+    parts.extend(body)
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def _color(colors, index):
+    if not colors:
+        return DEFAULT_COLOR
+    return colors[index % len(colors)]
+
+
+def _scale(values):
+    """Largest value, at least 1, so empty charts still have an axis."""
+    return max([v for v in values if v is not None] + [1])
+
+
+def bar_chart(
+    labels, values, colors=None, title=None, ylabel=None, width=600, height=400
+):
+    """Vertical bars with the value above each bar."""
+    left, right, top, bottom = 50, 20, 40, 40
+    plot_w, plot_h = width - left - right, height - top - bottom
+    peak = _scale(values)
+    slot = plot_w / max(len(values), 1)
+    body = [
+        f'<line x1="{left}" y1="{top + plot_h}" x2="{left + plot_w}" '
+        f'y2="{top + plot_h}" stroke="{AXIS_COLOR}"/>'
+    ]
+    for i, (label, value) in enumerate(zip(labels, values)):
+        bar_h = plot_h * value / peak
+        x = left + slot * i + slot * 0.15
+        y = top + plot_h - bar_h
+        body.append(
+            f'<rect x="{_n(x)}" y="{_n(y)}" width="{_n(slot * 0.7)}" '
+            f'height="{_n(bar_h)}" fill="{_color(colors, i)}"/>'
+        )
+        body.append(_text(x + slot * 0.35, y - 4, value, size=10))
+        body.append(_text(x + slot * 0.35, top + plot_h + 16, label))
+    if ylabel:
+        body.append(
+            _text(
+                14,
+                top + plot_h / 2,
+                ylabel,
+                transform=f"rotate(-90 14 {_n(top + plot_h / 2)})",
+            )
+        )
+    return _svg(width, height, body, title)
+
+
+def hbar_chart(labels, values, color=DEFAULT_COLOR, title=None, width=600, height=400):
+    """Horizontal bars, first item on top; room on the left for long labels."""
+    left, right, top, bottom = 230, 50, 40, 10
+    plot_w, plot_h = width - left - right, height - top - bottom
+    peak = _scale(values)
+    slot = plot_h / max(len(values), 1)
+    body = [
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_h}" '
+        f'stroke="{AXIS_COLOR}"/>'
+    ]
+    for i, (label, value) in enumerate(zip(labels, values)):
+        bar_w = plot_w * value / peak
+        y = top + slot * i + slot * 0.15
+        body.append(
+            f'<rect x="{left}" y="{_n(y)}" width="{_n(bar_w)}" '
+            f'height="{_n(slot * 0.7)}" fill="{color}"/>'
+        )
+        middle = y + slot * 0.35 + 4
+        body.append(_text(left - 6, middle, label, anchor="end"))
+        body.append(_text(left + bar_w + 4, middle, value, size=10, anchor="start"))
+    return _svg(width, height, body, title)
+
+
+def line_chart(
+    labels,
+    values,
+    color=DEFAULT_COLOR,
+    title=None,
+    ylabel=None,
+    tick_every=5,
+    width=600,
+    height=400,
+):
+    """Polyline over evenly spaced points; every ``tick_every``-th label shown."""
+    left, right, top, bottom = 50, 20, 40, 50
+    plot_w, plot_h = width - left - right, height - top - bottom
+    peak = _scale(values)
+    step = plot_w / max(len(values) - 1, 1)
+    points = [
+        (left + step * i, top + plot_h - plot_h * value / peak)
+        for i, value in enumerate(values)
+    ]
+    body = [
+        f'<line x1="{left}" y1="{top + plot_h}" x2="{left + plot_w}" '
+        f'y2="{top + plot_h}" stroke="{AXIS_COLOR}"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_h}" '
+        f'stroke="{AXIS_COLOR}"/>',
+        _text(left - 6, top + 4, peak, size=10, anchor="end"),
+        _text(left - 6, top + plot_h, 0, size=10, anchor="end"),
+    ]
+    if points:
+        body.append(
+            f'<polyline fill="none" stroke="{color}" stroke-width="2" points="'
+            + " ".join(f"{_n(x)},{_n(y)}" for x, y in points)
+            + '"/>'
+        )
+    for i in range(0, len(labels), max(tick_every, 1)):
+        x, y = left + step * i, top + plot_h + 14
+        body.append(
+            _text(
+                x,
+                y,
+                labels[i],
+                size=10,
+                anchor="end",
+                transform=f"rotate(-45 {_n(x)} {_n(y)})",
+            )
+        )
+    if ylabel:
+        body.append(
+            _text(
+                14,
+                top + plot_h / 2,
+                ylabel,
+                transform=f"rotate(-90 14 {_n(top + plot_h / 2)})",
+            )
+        )
+    return _svg(width, height, body, title)
+
+
+def pie_chart(labels, values, colors=None, title=None, width=600, height=400):
+    """Pie starting at twelve o'clock, each slice labelled with its count."""
+    cx, cy = width / 2, (height + 30) / 2
+    radius = min(width, height - 30) / 2 - 40
+    total = sum(values)
+    body = []
+    if not total:
+        body.append(
+            f'<circle cx="{_n(cx)}" cy="{_n(cy)}" r="{_n(radius)}" fill="none" '
+            f'stroke="{AXIS_COLOR}"/>'
+        )
+        body.append(_text(cx, cy, "No data"))
+        return _svg(width, height, body, title)
+
+    angle = -math.pi / 2
+    for i, (label, value) in enumerate(zip(labels, values)):
+        if not value:
+            continue
+        sweep = 2 * math.pi * value / total
+        color = _color(colors, i)
+        if value == total:
+            body.append(
+                f'<circle cx="{_n(cx)}" cy="{_n(cy)}" r="{_n(radius)}" fill="{color}"/>'
+            )
+        else:
+            x0, y0 = cx + radius * math.cos(angle), cy + radius * math.sin(angle)
+            end = angle + sweep
+            x1, y1 = cx + radius * math.cos(end), cy + radius * math.sin(end)
+            large = 1 if sweep > math.pi else 0
+            body.append(
+                f'<path d="M{_n(cx)},{_n(cy)} L{_n(x0)},{_n(y0)} '
+                f'A{_n(radius)},{_n(radius)} 0 {large} 1 {_n(x1)},{_n(y1)} Z" '
+                f'fill="{color}"/>'
+            )
+        middle = angle + sweep / 2
+        lx = cx + radius * 1.15 * math.cos(middle)
+        ly = cy + radius * 1.15 * math.sin(middle)
+        anchor = "start" if math.cos(middle) >= 0 else "end"
+        body.append(_text(lx, ly + 4, f"{label} ({value})", anchor=anchor))
+        angle += sweep
+    return _svg(width, height, body, title)
+
+
+def sparkline(values, color=DEFAULT_COLOR, kind="line", width=300, height=60):
+    """Axis-free line or bar strip for inline use."""
+    pad = 2
+    plot_w, plot_h = width - 2 * pad, height - 2 * pad
+    peak = _scale(values)
+    body = []
+    if kind == "bar":
+        slot = plot_w / max(len(values), 1)
+        for i, value in enumerate(values):
+            bar_h = plot_h * value / peak
+            body.append(
+                f'<rect x="{_n(pad + slot * i + slot * 0.1)}" '
+                f'y="{_n(pad + plot_h - bar_h)}" width="{_n(slot * 0.8)}" '
+                f'height="{_n(bar_h)}" fill="{color}"/>'
+            )
+    elif values:
+        step = plot_w / max(len(values) - 1, 1)
+        points = " ".join(
+            f"{_n(pad + step * i)},{_n(pad + plot_h - plot_h * value / peak)}"
+            for i, value in enumerate(values)
+        )
+        body.append(
+            f'<polyline fill="none" stroke="{color}" stroke-width="1" '
+            f'points="{points}"/>'
+        )
+    return _svg(width, height, body)
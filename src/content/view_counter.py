@@ -0,0 +1,244 @@
+"""
+Pluggable view-hit counters.
+
+``RegisterViewHit`` used to hit the database 3-4 times per page view
+(dedupe lookup, ``ViewRecord`` upsert, ``PendingView`` upsert). The Redis
+backend replaces that with one ``SET NX EX`` for dedupe and one ``HINCRBY``
+per accepted hit; the ``flush_views`` command drains the accumulated counts
+in bulk. The database backend is used when no Redis cache is configured;
+it dedupes with one ``INSERT ... ON CONFLICT`` into ``ViewRecord``, whose
+expired days are dropped by ``maintain_view_records``.
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .models import PendingView, ViewRecord
+from .utils import partitions
+from .utils.bulk import delete_returning, upsert_increment
+from .utils.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = ("article", "book", "dissertation")
+
+
+class BaseViewCounter(ABC):
+    """Interface for view-hit counters."""
+
+    def __init__(self, dedupe_ttl=None):
+        self.dedupe_ttl = int(
+            dedupe_ttl or getattr(settings, "VIEW_DEDUPE_TTL", 24 * 60 * 60)
+        )
+
+    @abstractmethod
+    def register_hit(self, content_type, content_id, user_id=None, session_key=None):
+        """
+        Record a view unless this visitor was already counted within the TTL.
+
+        Returns:
+            bool: True if the hit was counted, False if deduplicated
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def drain(self):
+        """
+        Atomically take all buffered counts out of the counter.
+
+        Returns:
+            dict: content_type -> {content_id: count}
+        """
+        raise NotImplementedError
+
+    def requeue(self, drained):
+        """Put counts taken by ``drain`` back, e.g. when applying them failed."""
+
+
+class DatabaseViewCounter(BaseViewCounter):
+    """Counts views with ``ViewRecord`` dedupe rows and the ``PendingView`` buffer."""
+
+    def register_hit(self, content_type, content_id, user_id=None, session_key=None):
+        now = timezone.now()
+        visitor = f"u{user_id}" if user_id else f"s{session_key}"
+        try:
+            counted = self._claim(
+                visitor, content_type, content_id, user_id, session_key, now
+            )
+        except DatabaseError:
+            # In autocommit mode a failed statement can simply be retried
+            table = ViewRecord._meta.db_table
+            if connection.in_atomic_block or not partitions.is_partitioned(table):
+                raise
+            # Today's partition is missing (maintenance did not run): create it
+            maintain_view_records()
+            counted = self._claim(
+                visitor, content_type, content_id, user_id, session_key, now
+            )
+        if not counted:
+            return False
+
+        upsert_increment(
+            PendingView,
+            ("content_type", "content_id"),
+            {"content_type": content_type, "content_id": content_id},
+            "count",
+            extra={"updated_at": now},
+        )
+        return True
+
+    def _claim(self, visitor, content_type, content_id, user_id, session_key, now):
+        """
+        Record the visit unless it was already seen within the TTL.
+
+        One statement: the NOT EXISTS looks for a fresh row in the days the
+        TTL spans; the upsert writes today's row, refreshing it only if it
+        has expired. Of two concurrent first hits, one inserts and the
+        other hits the conflict without updating, so exactly one counts.
+
+        Returns:
+            bool: True if the visit is counted
+        """
+        cutoff = now - timedelta(seconds=self.dedupe_ttl)
+        qn = connection.ops.quote_name
+        table = qn(ViewRecord._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} (user_id, session_key, visitor, content_type, "
+            f"content_id, day, last_seen) "
+            f"SELECT CAST(%s AS INTEGER), %s, %s, %s, %s, %s, %s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE day >= %s "
+            f"AND visitor = %s AND content_type = %s AND content_id = %s "
+            f"AND last_seen >= %s) "
+            f"ON CONFLICT (day, visitor, content_type, content_id) "
+            f"DO UPDATE SET last_seen = EXCLUDED.last_seen "
+            f"WHERE {table}.last_seen < %s "
+            f"RETURNING id"
+        )
+        params = [user_id, session_key, visitor, content_type, content_id]
+        params += [now.date(), now, cutoff.date(), visitor, content_type]
+        params += [content_id, cutoff, cutoff]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone() is not None
+
+    def drain(self):
+        # DELETE ... RETURNING: increments that land after the snapshot
+        # re-create their row and are picked up by the next flush.
+        drained = {}
+        for content_type in CONTENT_TYPES:
+            rows = delete_returning(
+                PendingView, {"content_type": content_type}, ("content_id", "count")
+            )
+            counts = {}
+            for content_id, count in rows:
+                counts[content_id] = counts.get(content_id, 0) + count
+            if counts:
+                drained[content_type] = counts
+        return drained
+
+
+class RedisViewCounter(BaseViewCounter):
+    """Counts views in Redis: dedupe keys with ``SET NX EX``, counts with ``HINCRBY``."""
+
+    seen_key_prefix = "views:seen"
+    pending_key_prefix = "views:pending"
+
+    def __init__(self, client, dedupe_ttl=None):
+        super().__init__(dedupe_ttl)
+        self.client = client
+
+    def _seen_key(self, content_type, content_id, user_id, session_key):
+        who = f"u{user_id}" if user_id else f"s{session_key}"
+        return f"{self.seen_key_prefix}:{content_type}:{content_id}:{who}"
+
+    def _pending_key(self, content_type):
+        return f"{self.pending_key_prefix}:{content_type}"
+
+    def register_hit(self, content_type, content_id, user_id=None, session_key=None):
+        seen_key = self._seen_key(content_type, content_id, user_id, session_key)
+        if not self.client.set(seen_key, 1, nx=True, ex=self.dedupe_ttl):
+            return False
+        self.client.hincrby(self._pending_key(content_type), content_id, 1)
+        return True
+
+    def drain(self):
+        pipe = self.client.pipeline(transaction=True)
+        for content_type in CONTENT_TYPES:
+            key = self._pending_key(content_type)
+            pipe.hgetall(key)
+            pipe.delete(key)
+        replies = pipe.execute()
+
+        drained = {}
+        # replies alternate: hgetall result, delete result
+        for content_type, raw in zip(CONTENT_TYPES, replies[::2]):
+            counts = {}
+            for cid, count in (raw or {}).items():
+                try:
+                    counts[int(cid)] = int(count)
+                except (TypeError, ValueError):
+                    logger.warning(
+                        "Skipping malformed pending view %s#%r", content_type, cid
+                    )
+            if counts:
+                drained[content_type] = counts
+        return drained
+
+    def requeue(self, drained):
+        pipe = self.client.pipeline(transaction=False)
+        for content_type, counts in drained.items():
+            for content_id, count in counts.items():
+                pipe.hincrby(self._pending_key(content_type), content_id, count)
+        pipe.execute()
+
+
+def maintain_view_records(today=None):
+    """
+    Keep ``ViewRecord`` bounded to the days the dedupe TTL can reach.
+
+    On PostgreSQL this creates the partitions of the next
+    ``VIEW_RECORD_PARTITIONS_AHEAD`` days and drops those that expired;
+    elsewhere expired rows are deleted.
+
+    Returns:
+        dict: {"created": [...], "dropped": [...], "deleted": n}
+    """
+    now = timezone.now()
+    today = today or now.date()
+    ttl = int(getattr(settings, "VIEW_DEDUPE_TTL", 24 * 60 * 60))
+    first_kept = (now - timedelta(seconds=ttl)).date()
+    result = {"created": [], "dropped": [], "deleted": 0}
+
+    table = ViewRecord._meta.db_table
+    if partitions.is_partitioned(table):
+        ahead = int(getattr(settings, "VIEW_RECORD_PARTITIONS_AHEAD", 7))
+        result["created"] = partitions.create_partitions(
+            table, today, today + timedelta(days=ahead)
+        )
+        result["dropped"] = partitions.drop_partitions_before(table, first_kept)
+    else:
+        result["deleted"], _ = ViewRecord.objects.filter(day__lt=first_kept).delete()
+    return result
+
+
+def get_view_counter():
+    """
+    Return the configured view counter.
+
+    ``settings.VIEW_COUNTER_BACKEND``: "redis", "db" or "auto" (default).
+    "auto" uses Redis when the default cache is Redis-backed.
+    """
+    backend = getattr(settings, "VIEW_COUNTER_BACKEND", "auto")
+    if backend in ("redis", "auto"):
+        client = get_redis_connection()
+        if client is not None:
+            return RedisViewCounter(client)
+        if backend == "redis":
+            logger.warning(
+                "VIEW_COUNTER_BACKEND=redis but no Redis cache; using database"
+            )
+    return DatabaseViewCounter()
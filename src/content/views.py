@@ -5,7 +5,6 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from elasticsearch import Elasticsearch
 from django.db.models import (
     Case,
     When,
@@ -14,23 +13,18 @@ from django.db.models import (
     Exists,
     OuterRef,
     BooleanField,
-    Count,
-    Avg,
-    Sum,
-    F,
     Prefetch,
 )
-from django.db.models.functions import TruncDate
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.shortcuts import render
 import logging
 from django.http import JsonResponse, HttpResponse
-from io import BytesIO
 from django.core.cache import cache
 from .models import (
     Article,
@@ -39,10 +33,11 @@ from .models import (
     ArticleCategory,
     BookCategory,
     DissertationCategory,
-    ContentRating,
-    Profile,
 )
-from .models import PendingView, ViewRecord
+from .view_counter import get_view_counter
+from . import charts, ratings, search_cache, search_utils, statistics_snapshot
+from .utils import cache_versions, local_cache
+from .utils.etags import conditional_http_response
 from .serializers import (
     ArticleSerializer,
     BookSerializer,
@@ -94,85 +89,19 @@ class BookmarkAnnotateMixin:
         )
 
 
-# Helper to compute language counts across multiple models with few queries
-def _aggregate_language_counts(models, languages=("tm", "ru", "en")):
-    totals = {lang: 0 for lang in languages}
-    for model in models:
-        qs = model.objects.values("language").annotate(c=Count("id"))
-        for r in qs:
-            lang = r.get("language")
-            if lang in totals:
-                totals[lang] += r.get("c", 0)
-    return totals
-
-
-# Helper: merge top items from multiple models into a single sorted list
-def _merge_top_items(
-    models_with_labels, per_model=7, total_limit=8, fields=("id", "title", "views")
-):
-    items = []
-    for model, label in models_with_labels:
-        qs = model.objects.order_by("-views").only(*fields)[:per_model]
-        for obj in qs:
-            items.append(
-                {
-                    "id": getattr(obj, "id", None),
-                    "title": getattr(obj, "title", None),
-                    "views": getattr(obj, "views", 0),
-                    "type": label,
-                }
-            )
-    return sorted(items, key=lambda x: x["views"], reverse=True)[:total_limit]
-
-
-# Helper: build a date -> count map for one or more models using a date field
-def _publication_counts_map(models, date_field, since_date):
-    counts_map = {}
-    for model in models:
-        qs = (
-            model.objects.filter(**{f"{date_field}__gte": since_date})
-            .annotate(d=TruncDate(date_field))
-            .values("d")
-            .annotate(c=Count("id"))
-        )
-        for r in qs:
-            counts_map[r["d"]] = counts_map.get(r["d"], 0) + r["c"]
-    return counts_map
-
-
-def _daily_counts_list_from_map(counts_map, since_date, days=30, date_fmt="%Y-%m-%d"):
-    dates = []
-    counts = []
-    for i in range(days):
-        d = since_date + timedelta(days=i)
-        dates.append(d.strftime(date_fmt))
-        counts.append(counts_map.get(d, 0))
-    return dates, counts
-
-
-# Module-level Elasticsearch client and health helper
-_ES_CLIENT = None
-
-
+# Shared Elasticsearch client and health helper
 def get_es_client():
-    global _ES_CLIENT
-    if _ES_CLIENT is None:
-        try:
-            es_url = settings.ELASTICSEARCH_DSL["default"]["hosts"]
-            _ES_CLIENT = Elasticsearch(es_url, timeout=30)
-        except Exception:
-            _ES_CLIENT = None
-    return _ES_CLIENT
+    return search_utils.get_es_client()
 
 
 def es_ping_ok(client):
-    ok = cache.get("es_ping_ok")
+    ok = local_cache.get("es_ping_ok")
     if ok is None:
         try:
             ok = bool(client and client.ping())
         except Exception:
             ok = False
-        cache.set("es_ping_ok", ok, 5)
+        local_cache.set("es_ping_ok", ok, 5, publish=False)
     return ok
 
 
@@ -215,10 +144,10 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
             return queryset
         return BookmarkAnnotateMixin.annotate_bookmarks(self, queryset)
 
-    def _get_cache_version(self):
+    def _get_cache_version(self, pk):
         try:
-            v = cache.get("content_cache_version")
-            return int(v or 0)
+            model_name = self.queryset.model.__name__.lower()
+            return cache_versions.object_version_token(model_name, pk)
         except Exception:
             return 0
 
@@ -238,7 +167,7 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
             if getattr(request, "user", None) and request.user.is_authenticated
             else "anon"
         )
-        cache_key = f"article:detail:v{self._get_cache_version()}:{pk}:user:{user_id}"
+        cache_key = f"article:detail:v{self._get_cache_version(pk)}:{pk}:user:{user_id}"
         cached = cache.get(cache_key)
         if cached is not None:
             return Response(cached)
@@ -284,10 +213,10 @@ class BookViewSet(viewsets.ReadOnlyModelViewSet):
             return queryset
         return BookmarkAnnotateMixin.annotate_bookmarks(self, queryset)
 
-    def _get_cache_version(self):
+    def _get_cache_version(self, pk):
         try:
-            v = cache.get("content_cache_version")
-            return int(v or 0)
+            model_name = self.queryset.model.__name__.lower()
+            return cache_versions.object_version_token(model_name, pk)
         except Exception:
             return 0
 
@@ -303,7 +232,7 @@ class BookViewSet(viewsets.ReadOnlyModelViewSet):
             if getattr(request, "user", None) and request.user.is_authenticated
             else "anon"
         )
-        cache_key = f"book:detail:v{self._get_cache_version()}:{pk}:user:{user_id}"
+        cache_key = f"book:detail:v{self._get_cache_version(pk)}:{pk}:user:{user_id}"
         cached = cache.get(cache_key)
         if cached is not None:
             return Response(cached)
@@ -349,10 +278,10 @@ class DissertationViewSet(viewsets.ReadOnlyModelViewSet):
             return queryset
         return BookmarkAnnotateMixin.annotate_bookmarks(self, queryset)
 
-    def _get_cache_version(self):
+    def _get_cache_version(self, pk):
         try:
-            v = cache.get("content_cache_version")
-            return int(v or 0)
+            model_name = self.queryset.model.__name__.lower()
+            return cache_versions.object_version_token(model_name, pk)
         except Exception:
             return 0
 
@@ -369,7 +298,7 @@ class DissertationViewSet(viewsets.ReadOnlyModelViewSet):
             else "anon"
         )
         cache_key = (
-            f"dissertation:detail:v{self._get_cache_version()}:{pk}:user:{user_id}"
+            f"dissertation:detail:v{self._get_cache_version(pk)}:{pk}:user:{user_id}"
         )
         cached = cache.get(cache_key)
         if cached is not None:
@@ -537,13 +466,11 @@ class ContentSearchView(APIView):
         page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
         from_ = (page - 1) * page_size
 
-        # Try cache first (cache key includes full path with querystring and global cache version)
-        try:
-            version = int(cache.get("content_cache_version") or 0)
-        except Exception:
-            version = 0
-
-        cache_key = f"search:v{version}:{request.get_full_path()}"
+        # Try cache first (key changes when any searched index is updated)
+        key, scopes = search_cache.build_key(request.query_params)
+        versions = cache_versions.get_versions(scopes)
+        version = ".".join(str(versions[s]) for s in scopes)
+        cache_key = f"{key}:legacy:v{version}"
         cached = cache.get(cache_key)
         if cached is not None:
             return Response(cached)
@@ -616,7 +543,8 @@ class ContentSearchView(APIView):
         # Тип контента: article, book, dissertation
         content_type = request.query_params.get("content_type")
         if content_type in ["article", "book", "dissertation"]:
-            filters.append({"term": {"_index": f"{content_type}s"}})
+            # prefix: indices are versioned ("articles_v7") behind the alias
+            filters.append({"prefix": {"_index": f"{content_type}s"}})
 
         # Язык
         if request.query_params.get("language"):
@@ -707,7 +635,7 @@ class ContentSearchView(APIView):
         for hit in response["hits"]["hits"]:
             source = hit["_source"]
             index_name = hit["_index"]
-            content_type = index_name.rstrip("s")
+            content_type = search_utils.content_type_for_index(index_name)
 
             base = {
                 "id": int(hit["_id"]),
@@ -792,7 +720,8 @@ class ContentSearchView(APIView):
 class RegisterViewHit(APIView):
     """Endpoint to register a view for a content object.
 
-    Uses a cookie/session dedupe (24h) and writes to PendingView buffer.
+    Uses a per-user/session dedupe (24h) and buffers the hit in the
+    configured view counter (Redis or PendingView).
     """
 
     def post(self, request, content_type, pk):
@@ -801,65 +730,27 @@ class RegisterViewHit(APIView):
             return Response({"error": "Invalid content_type"}, status=400)
 
         # Determine identifier: user or session
-        now = timezone.now()
-        ttl_hours = 24
-        cutoff = now - timedelta(hours=ttl_hours)
+        user_id = request.user.id if request.user.is_authenticated else None
+        session_key = None
+        if user_id is None:
+            # ensure session present
+            if not request.session.session_key:
+                request.session.save()
+            session_key = request.session.session_key
 
         try:
-            if request.user.is_authenticated:
-                # Check recent record for this user
-                seen = ViewRecord.objects.filter(
-                    user=request.user,
-                    content_type=content_type,
-                    content_id=pk,
-                    last_seen__gte=cutoff,
-                ).exists()
-                if seen:
-                    return Response(
-                        {"accepted": False, "reason": "already_counted"}, status=200
-                    )
-
-                # create/update record
-                ViewRecord.objects.update_or_create(
-                    user=request.user,
-                    content_type=content_type,
-                    content_id=pk,
-                    defaults={"last_seen": now},
-                )
-            else:
-                # ensure session present
-                if not request.session.session_key:
-                    request.session.save()
-                sk = request.session.session_key
-
-                seen = ViewRecord.objects.filter(
-                    session_key=sk,
-                    content_type=content_type,
-                    content_id=pk,
-                    last_seen__gte=cutoff,
-                ).exists()
-                if seen:
-                    return Response(
-                        {"accepted": False, "reason": "already_counted"}, status=200
-                    )
-
-                ViewRecord.objects.update_or_create(
-                    session_key=sk,
-                    content_type=content_type,
-                    content_id=pk,
-                    defaults={"last_seen": now},
-                )
-
-            # increment pending buffer
-            pv, created = PendingView.objects.get_or_create(
-                content_type=content_type, content_id=pk, defaults={"count": 1}
+            counted = get_view_counter().register_hit(
+                content_type, pk, user_id=user_id, session_key=session_key
             )
-            if not created:
-                PendingView.objects.filter(pk=pv.pk).update(count=F("count") + 1)
-
         except Exception:
+            logger.exception("Failed to register view %s#%s", content_type, pk)
             return Response({"error": "DB error"}, status=500)
 
+        if not counted:
+            return Response(
+                {"accepted": False, "reason": "already_counted"}, status=200
+            )
+
         return Response({"accepted": True})
 
 
@@ -922,42 +813,20 @@ class RateContentView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        model_map = {
-            "article": Article,
-            "book": Book,
-            "dissertation": Dissertation,
-        }
-        model = model_map[content_type]
-
         try:
-            obj = model.objects.get(id=content_id)
-        except model.DoesNotExist:
+            result = ratings.record_rating(
+                request.user, content_type, content_id, rating
+            )
+        except ObjectDoesNotExist:
             return Response(
                 {"error": "Материал не найден"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        rating_obj, created = ContentRating.objects.update_or_create(
-            user=request.user,
-            content_type=content_type,
-            content_id=content_id,
-            defaults={"rating": rating},
-        )
-
-        ratings_qs = ContentRating.objects.filter(
-            content_type=content_type, content_id=content_id
-        )
-        avg = ratings_qs.aggregate(avg=Avg("rating"))["avg"] or 0.0
-        count = ratings_qs.count()
-
-        obj.average_rating = round(float(avg), 2)
-        obj.rating_count = count
-        obj.save(update_fields=["average_rating", "rating_count"])
-
         return Response(
             {
                 "message": "Sag boluň! Bahanyz kabul edildi.",
-                "average_rating": obj.average_rating,
-                "rating_count": obj.rating_count,
+                "average_rating": result["average_rating"],
+                "rating_count": result["rating_count"],
                 "your_rating": rating,
             },
             status=status.HTTP_200_OK,
@@ -966,96 +835,21 @@ class RateContentView(APIView):
 
 @staff_member_required
 def admin_statistics(request):
-    # Try cached context first
-    cached_ctx = cache.get("admin_statistics")
-    if cached_ctx is not None:
-        return render(request, "admin/statistics.html", cached_ctx)
-
-    today = timezone.now()
-    last_month = today - timedelta(days=30)
-    last_week = today - timedelta(days=7)
-
-    # ---- FIX: корректный подсчёт закладок ----
-    bookmark_stats = Profile.objects.annotate(
-        total_articles=Count("bookmarked_articles"),
-        total_books=Count("bookmarked_books"),
-        total_dissertations=Count("bookmarked_dissertations"),
-    ).aggregate(
-        articles=Sum("total_articles"),
-        books=Sum("total_books"),
-        dissertations=Sum("total_dissertations"),
-    )
-
-    # ---- FIX: корректное суммирование total_views ----
-    total_views = (
-        (Article.objects.aggregate(v=Sum("views"))["v"] or 0)
-        + (Book.objects.aggregate(v=Sum("views"))["v"] or 0)
-        + (Dissertation.objects.aggregate(v=Sum("views"))["v"] or 0)
-    )
-
-    # ---- AVG rating ----
-    avg_article = Article.objects.aggregate(a=Avg("average_rating"))["a"] or 0
-    avg_book = Book.objects.aggregate(a=Avg("average_rating"))["a"] or 0
-    avg_dissertation = Dissertation.objects.aggregate(a=Avg("average_rating"))["a"] or 0
+    snapshot = statistics_snapshot.latest()
+    data = snapshot["data"]
+    types = data["types"]
+    article_stats = types["article"]
+    book_stats = types["book"]
+    dissertation_stats = types["dissertation"]
 
     avg_rating = round(
-        (avg_article * 0.4) + (avg_book * 0.3) + (avg_dissertation * 0.3), 2
+        (article_stats["avg_rating"] * 0.4)
+        + (book_stats["avg_rating"] * 0.3)
+        + (dissertation_stats["avg_rating"] * 0.3),
+        2,
     )
 
-    # compute counts once
-    article_count = Article.objects.count()
-    book_count = Book.objects.count()
-    dissertation_count = Dissertation.objects.count()
-
-    lang_totals = _aggregate_language_counts([Article, Book, Dissertation])
-    tm_count = lang_totals.get("tm", 0)
-    ru_count = lang_totals.get("ru", 0)
-    en_count = lang_totals.get("en", 0)
-
-    context = {
-        "today": today.strftime("%Y-%m-%d %H:%M"),
-        "total_materials": article_count + book_count + dissertation_count,
-        "total_articles": article_count,
-        "total_books": book_count,
-        "total_dissertations": dissertation_count,
-        "total_views": total_views,
-        "total_users": User.objects.count(),
-        "active_last_week": Profile.objects.filter(
-            user__last_login__gte=last_week
-        ).count(),
-        "bookmarks_articles": bookmark_stats["articles"] or 0,
-        "bookmarks_books": bookmark_stats["books"] or 0,
-        "bookmarks_dissertations": bookmark_stats["dissertations"] or 0,
-        "avg_rating": avg_rating,
-        "avg_article_rating": round(avg_article, 2),
-        "avg_book_rating": round(avg_book, 2),
-        "avg_dissertation_rating": round(avg_dissertation, 2),
-        "bookmarks_total": (
-            (bookmark_stats["articles"] or 0)
-            + (bookmark_stats["books"] or 0)
-            + (bookmark_stats["dissertations"] or 0)
-        ),
-        "tm_count": tm_count,
-        "ru_count": ru_count,
-        "en_count": en_count,
-        "top_articles": list(
-            Article.objects.order_by("-views").only("id", "title", "views")[:5]
-        ),
-        "top_books": list(
-            Book.objects.order_by("-views").only("id", "title", "views")[:5]
-        ),
-        "top_dissertations": list(
-            Dissertation.objects.order_by("-views").only("id", "title", "views")[:5]
-        ),
-        # Only Article and Dissertation have `publication_date`; Book does not.
-        "new_last_month": (
-            Article.objects.filter(publication_date__gte=last_month).count()
-            + Dissertation.objects.filter(publication_date__gte=last_month).count()
-        ),
-    }
-
-    # language distribution (counts + percentages for static display)
-    lang_counts = {"tm": tm_count, "ru": ru_count, "en": en_count}
+    lang_counts = data["languages"]
     total_lang = sum(lang_counts.values())
     if total_lang:
         lang_percent = {
@@ -1064,323 +858,90 @@ def admin_statistics(request):
     else:
         lang_percent = {k: 0 for k in lang_counts}
 
-    context.update(
-        {"language_distribution": lang_counts, "language_percent": lang_percent}
-    )
-
-    # Per-model stats to display grouped sections in template
-    article_stats = {
-        "count": Article.objects.count(),
-        "avg_rating": round(
-            Article.objects.aggregate(a=Avg("average_rating"))["a"] or 0, 2
-        ),
-        "total_views": Article.objects.aggregate(v=Sum("views"))["v"] or 0,
-        "top": list(
-            Article.objects.order_by("-views").only("id", "title", "views")[:7]
-        ),
-        "new_last_month": Article.objects.filter(
-            publication_date__gte=last_month
-        ).count(),
-    }
-
-    book_stats = {
-        "count": Book.objects.count(),
-        "avg_rating": round(
-            Book.objects.aggregate(a=Avg("average_rating"))["a"] or 0, 2
-        ),
-        "total_views": Book.objects.aggregate(v=Sum("views"))["v"] or 0,
-        "top": list(Book.objects.order_by("-views").only("id", "title", "views")[:7]),
-        # Book model has no publication_date; new_last_month not available
-        "new_last_month": None,
-    }
-
-    dissertation_stats = {
-        "count": Dissertation.objects.count(),
-        "avg_rating": round(
-            Dissertation.objects.aggregate(a=Avg("average_rating"))["a"] or 0, 2
-        ),
-        "total_views": Dissertation.objects.aggregate(v=Sum("views"))["v"] or 0,
-        "top": list(
-            Dissertation.objects.order_by("-views").only("id", "title", "views")[:7]
-        ),
-        "new_last_month": Dissertation.objects.filter(
-            publication_date__gte=last_month
-        ).count(),
+    bookmarks = data["bookmarks"]
+    generated_at = datetime.fromisoformat(data["generated_at"])
+    context = {
+        "today": timezone.localtime(generated_at).strftime("%Y-%m-%d %H:%M"),
+        "total_materials": sum(stats["count"] for stats in types.values()),
+        "total_articles": article_stats["count"],
+        "total_books": book_stats["count"],
+        "total_dissertations": dissertation_stats["count"],
+        "total_views": sum(stats["total_views"] for stats in types.values()),
+        "total_users": data["users"]["total"],
+        "active_last_week": data["users"]["active_last_week"],
+        "bookmarks_articles": bookmarks["article"],
+        "bookmarks_books": bookmarks["book"],
+        "bookmarks_dissertations": bookmarks["dissertation"],
+        "bookmarks_total": sum(bookmarks.values()),
+        "avg_rating": avg_rating,
+        "avg_article_rating": article_stats["avg_rating"],
+        "avg_book_rating": book_stats["avg_rating"],
+        "avg_dissertation_rating": dissertation_stats["avg_rating"],
+        "tm_count": lang_counts.get("tm", 0),
+        "ru_count": lang_counts.get("ru", 0),
+        "en_count": lang_counts.get("en", 0),
+        "top_articles": article_stats["top"][:5],
+        "top_books": book_stats["top"][:5],
+        "top_dissertations": dissertation_stats["top"][:5],
+        # Only Article and Dissertation have `publication_date`; Book does not.
+        "new_last_month": article_stats["new_last_month"]
+        + dissertation_stats["new_last_month"],
+        "language_distribution": lang_counts,
+        "language_percent": lang_percent,
+        "article_stats": article_stats,
+        "book_stats": book_stats,
+        "dissertation_stats": dissertation_stats,
     }
-
-    context.update(
-        {
-            "article_stats": article_stats,
-            "book_stats": book_stats,
-            "dissertation_stats": dissertation_stats,
-        }
-    )
-
-    # Cache the computed context for a short time
-    try:
-        cache.set("admin_statistics", context, 300)
-    except Exception:
-        pass
-
     return render(request, "admin/statistics.html", context)
 
 
 @staff_member_required
 def admin_statistics_data(request):
     """JSON endpoint with enhanced statistics for admin dashboard (used by frontend charts)."""
-    # Try cached first
-    cached = cache.get("admin_statistics_data")
-    if cached is not None:
-        return JsonResponse(cached)
-
-    today = timezone.now().date()
-    last_30 = today - timedelta(days=29)
-
-    # Basic totals (reuse some of the calculations from admin_statistics)
-    total_articles = Article.objects.count()
-    total_books = Book.objects.count()
-    total_dissertations = Dissertation.objects.count()
-
-    total_views = (
-        (Article.objects.aggregate(v=Sum("views"))["v"] or 0)
-        + (Book.objects.aggregate(v=Sum("views"))["v"] or 0)
-        + (Dissertation.objects.aggregate(v=Sum("views"))["v"] or 0)
-    )
-
-    # Language distribution
-    lang_counts = _aggregate_language_counts([Article, Book, Dissertation])
-
-    # Ratings distribution (1..5) — optimized single-query aggregation
-    ratings_agg = ContentRating.objects.aggregate(
-        r1=Sum(Case(When(rating=1, then=1), output_field=IntegerField())),
-        r2=Sum(Case(When(rating=2, then=1), output_field=IntegerField())),
-        r3=Sum(Case(When(rating=3, then=1), output_field=IntegerField())),
-        r4=Sum(Case(When(rating=4, then=1), output_field=IntegerField())),
-        r5=Sum(Case(When(rating=5, then=1), output_field=IntegerField())),
-    )
-    ratings = {
-        "1": ratings_agg.get("r1") or 0,
-        "2": ratings_agg.get("r2") or 0,
-        "3": ratings_agg.get("r3") or 0,
-        "4": ratings_agg.get("r4") or 0,
-        "5": ratings_agg.get("r5") or 0,
-    }
-
-    # Top items (combine few top from each model)
-    top_list = _merge_top_items(
-        [(Article, "article"), (Book, "book"), (Dissertation, "dissertation")],
-        per_model=7,
-        total_limit=8,
-    )
+    snapshot = statistics_snapshot.latest()
+    data = snapshot["data"]
+    types = data["types"]
+    generated_at = timezone.localtime(datetime.fromisoformat(data["generated_at"]))
 
-    # New items per day (articles + dissertations) for last 30 days
-    counts_map = _publication_counts_map(
-        [Article, Dissertation], "publication_date", last_30
-    )
-    dates, counts = _daily_counts_list_from_map(
-        counts_map, last_30, days=30, date_fmt="%Y-%m-%d"
+    return JsonResponse(
+        {
+            "totals": {
+                "total_materials": sum(stats["count"] for stats in types.values()),
+                "total_articles": types["article"]["count"],
+                "total_books": types["book"]["count"],
+                "total_dissertations": types["dissertation"]["count"],
+                "total_views": sum(stats["total_views"] for stats in types.values()),
+                "total_users": data["users"]["total"],
+            },
+            "language_distribution": data["languages"],
+            "ratings_distribution": data["ratings_histogram"],
+            "top_items": [
+                {k: item[k] for k in ("id", "title", "views", "type")}
+                for item in statistics_snapshot.top_items(types, 8)
+            ],
+            "new_items": data["new_items"],
+            # Headline totals per day, from the snapshot history
+            "history": statistics_snapshot.history(),
+            "generated_at": generated_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
     )
 
-    data = {
-        "totals": {
-            "total_materials": total_articles + total_books + total_dissertations,
-            "total_articles": total_articles,
-            "total_books": total_books,
-            "total_dissertations": total_dissertations,
-            "total_views": total_views,
-            "total_users": User.objects.count(),
-        },
-        "language_distribution": lang_counts,
-        "ratings_distribution": ratings,
-        "top_items": top_list,
-        "new_items": {"dates": dates, "counts": counts},
-        "generated_at": timezone.now().strftime("%Y-%m-%d %H:%M:%S"),
-    }
-
-    try:
-        cache.set("admin_statistics_data", data, 120)
-    except Exception:
-        pass
-
-    return JsonResponse(data)
-
 
 @staff_member_required
 def admin_chart(request, chart_name, fmt="svg"):
-    """Render a chart server-side and return SVG (fmt currently supports only 'svg').
+    """Serve a pre-rendered chart as SVG (fmt currently supports only 'svg').
 
-    chart_name: one of 'lang', 'ratings', 'new', 'top'
+    chart_name: one of ``charts.CHARTS`` ('lang', 'ratings', 'new', 'top',
+    'spark_new', 'spark_ratings', 'spark_users', 'spark_top')
     """
     fmt = (fmt or "svg").lower()
     if fmt != "svg":
         return HttpResponse("Only svg supported", status=400)
 
-    cache_key = f"chart:{chart_name}:svg"
-    cached = cache.get(cache_key)
-    if cached:
-        return HttpResponse(cached, content_type="image/svg+xml")
-
-    # import matplotlib lazily to avoid startup cost
-    try:
-        import matplotlib
-
-        matplotlib.use("Agg")
-        import matplotlib.pyplot as plt
-    except Exception:
-        return HttpResponse("Matplotlib not available", status=500)
-
-    fig = plt.Figure(figsize=(6, 4), dpi=100)
-    ax = fig.subplots()
-
-    if chart_name == "lang":
-        lang_counts_chart = _aggregate_language_counts([Article, Book, Dissertation])
-        vals = [
-            lang_counts_chart.get("tm", 0),
-            lang_counts_chart.get("ru", 0),
-            lang_counts_chart.get("en", 0),
-        ]
-        labels = ["TM", "RU", "EN"]
-        colors = ["#10b981", "#3b82f6", "#7c3aed"]
-        ax.pie(
-            vals,
-            labels=labels,
-            colors=colors,
-            autopct=lambda p: f"{int(round(p * sum(vals) / 100))}",
-            startangle=90,
-        )
-        ax.set_title("Language distribution")
-
-    elif chart_name == "ratings":
-        agg = ContentRating.objects.aggregate(
-            r1=Sum(Case(When(rating=1, then=1), output_field=IntegerField())),
-            r2=Sum(Case(When(rating=2, then=1), output_field=IntegerField())),
-            r3=Sum(Case(When(rating=3, then=1), output_field=IntegerField())),
-            r4=Sum(Case(When(rating=4, then=1), output_field=IntegerField())),
-            r5=Sum(Case(When(rating=5, then=1), output_field=IntegerField())),
-        )
-        vals = [
-            agg.get("r1") or 0,
-            agg.get("r2") or 0,
-            agg.get("r3") or 0,
-            agg.get("r4") or 0,
-            agg.get("r5") or 0,
-        ]
-        labels = ["1", "2", "3", "4", "5"]
-        ax.bar(
-            labels, vals, color=["#ef4444", "#f97316", "#f59e0b", "#10b981", "#3b82f6"]
-        )
-        ax.set_title("Ratings distribution")
-        ax.set_ylabel("Count")
-
-    elif chart_name == "new":
-        today = timezone.now().date()
-        last_30 = today - timedelta(days=29)
-        counts_map = _publication_counts_map(
-            [Article, Dissertation], "publication_date", last_30
-        )
-        dates, counts = _daily_counts_list_from_map(
-            counts_map, last_30, days=30, date_fmt="%m-%d"
-        )
-        ax.plot(dates, counts, color="#3b82f6")
-        ax.set_title("New items (last 30 days)")
-        ax.set_xticks(dates[::5])
-        ax.set_ylabel("Count")
-        plt = matplotlib.pyplot
-        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
-
-    elif chart_name == "top":
-        top_items = _merge_top_items(
-            [(Article, "article"), (Book, "book"), (Dissertation, "dissertation")],
-            per_model=5,
-            total_limit=8,
-            fields=("title", "views"),
-        )
-        labels = [
-            t["title"][:40] + ("…" if len(t["title"]) > 40 else "") for t in top_items
-        ]
-        vals = [t["views"] for t in top_items]
-        ax.barh(range(len(vals))[::-1], vals, color="#3b82f6")
-        ax.set_yticks(range(len(labels)))
-        ax.set_yticklabels(labels[::-1])
-        ax.set_title("Top materials by views")
-
-    # small sparklines
-    elif chart_name == "spark_new":
-        # small sparkline for new items (last 30 days)
-        today = timezone.now().date()
-        last_30 = today - timedelta(days=29)
-        counts_map = _publication_counts_map(
-            [Article, Dissertation], "publication_date", last_30
-        )
-        _, counts = _daily_counts_list_from_map(
-            counts_map, last_30, days=30, date_fmt="%Y-%m-%d"
-        )
-        ax.plot(counts, color="#3b82f6", linewidth=1)
-        ax.axis("off")
-        fig.set_size_inches(3, 0.6)
-
-    elif chart_name == "spark_ratings":
-        # small sparkline for ratings counts over 1..5 (horizontal bar simplified)
-        agg = ContentRating.objects.aggregate(
-            r1=Sum(Case(When(rating=1, then=1), output_field=IntegerField())),
-            r2=Sum(Case(When(rating=2, then=1), output_field=IntegerField())),
-            r3=Sum(Case(When(rating=3, then=1), output_field=IntegerField())),
-            r4=Sum(Case(When(rating=4, then=1), output_field=IntegerField())),
-            r5=Sum(Case(When(rating=5, then=1), output_field=IntegerField())),
-        )
-        vals = [
-            agg.get("r1") or 0,
-            agg.get("r2") or 0,
-            agg.get("r3") or 0,
-            agg.get("r4") or 0,
-            agg.get("r5") or 0,
-        ]
-        ax.bar(range(len(vals)), vals, color="#10b981")
-        ax.axis("off")
-        fig.set_size_inches(3, 0.6)
-
-    elif chart_name == "spark_users":
-        # user registrations per day last 30
-        today = timezone.now().date()
-        last_30 = today - timedelta(days=29)
-        # aggregate user registrations by date to avoid daily queries
-        user_counts_qs = (
-            User.objects.annotate(d=TruncDate("date_joined"))
-            .filter(d__gte=last_30)
-            .values("d")
-            .annotate(c=Count("id"))
-        )
-        user_map = {r["d"]: r["c"] for r in user_counts_qs}
-        counts = []
-        for i in range(30):
-            d = last_30 + timedelta(days=i)
-            counts.append(user_map.get(d, 0))
-        ax.plot(counts, color="#7c3aed", linewidth=1)
-        ax.axis("off")
-        fig.set_size_inches(3, 0.6)
-
-    elif chart_name == "spark_top":
-        # tiny horizontal bars for top items (views)
-        top_items = _merge_top_items(
-            [(Article, "article"), (Book, "book"), (Dissertation, "dissertation")],
-            per_model=5,
-            total_limit=6,
-            fields=("title", "views"),
-        )
-        vals = [t["views"] for t in top_items]
-        ax.bar(range(len(vals)), vals, color="#3b82f6")
-        ax.axis("off")
-        fig.set_size_inches(3, 0.6)
-
-    else:
+    # Rendered by the snapshot task; charts change only with a new snapshot
+    entry = charts.get(chart_name, statistics_snapshot.latest())
+    if entry is None:
         return HttpResponse("Unknown chart", status=400)
-
-    # render to SVG
-    buf = BytesIO()
-    try:
-        fig.savefig(buf, format="svg", bbox_inches="tight")
-        svg = buf.getvalue()
-        cache.set(cache_key, svg, 300)
-        return HttpResponse(svg, content_type="image/svg+xml")
-    finally:
-        buf.close()
+    return conditional_http_response(
+        request, entry["svg"], entry["etag"], "image/svg+xml"
+    )
@@ -190,9 +190,58 @@ SILENCED_SYSTEM_CHECKS = ["ckeditor.W001"]
 ELASTICSEARCH_DSL = {
     "default": {
         "hosts": os.environ.get("ELASTICSEARCH_URL", "http://127.0.0.1:9200"),
+        # Shared client (content.search_utils.get_es_client) pool and retries
+        "connections_per_node": int(os.environ.get("ES_CONNECTIONS_PER_NODE", "10")),
+        "request_timeout": float(os.environ.get("ES_REQUEST_TIMEOUT", "30")),
+        "retry_on_timeout": os.environ.get("ES_RETRY_ON_TIMEOUT", "True").lower()
+        in ("1", "true", "yes"),
+        "max_retries": int(os.environ.get("ES_MAX_RETRIES", "3")),
+        "sniff": os.environ.get("ES_SNIFF", "False").lower() in ("1", "true", "yes"),
     },
 }
 
+# Coalescing index queue: drain early once this many (model, id) pairs are pending
+SEARCH_INDEX_QUEUE_BATCH_SIZE = int(
+    os.environ.get("SEARCH_INDEX_QUEUE_BATCH_SIZE", "500")
+)
+
+# Incremental reindex re-reads rows changed this long before the stored watermark
+SEARCH_SYNC_OVERLAP_SECONDS = int(os.environ.get("SEARCH_SYNC_OVERLAP_SECONDS", "300"))
+
+# Counter-only index changes are logged this long, so a full reindex can
+# resend those that happened during its build
+SEARCH_COUNTER_LOG_SECONDS = int(os.environ.get("SEARCH_COUNTER_LOG_SECONDS", "86400"))
+
+# Search result cache: fresh for SEARCH_CACHE_TTL, then served stale for up to
+# SEARCH_CACHE_STALE_TTL while one request refreshes it
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_STALE_TTL = int(os.environ.get("SEARCH_CACHE_STALE_TTL", "600"))
+SEARCH_CACHE_LOCK_TIMEOUT = int(os.environ.get("SEARCH_CACHE_LOCK_TIMEOUT", "10"))
+
+# Cache-miss coalescing (content.utils.single_flight): lock lifetime and how
+# long other requests wait for the lock holder before computing themselves
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.environ.get("SINGLE_FLIGHT_LOCK_TIMEOUT", "10"))
+SINGLE_FLIGHT_WAIT = float(os.environ.get("SINGLE_FLIGHT_WAIT", "2"))
+
+# List counts (content.utils.counts): exact counts are cached per filter set;
+# on PostgreSQL results estimated above the threshold are not counted
+COUNT_CACHE_TTL = int(os.environ.get("COUNT_CACHE_TTL", "600"))
+COUNT_ESTIMATE_THRESHOLD = int(os.environ.get("COUNT_ESTIMATE_THRESHOLD", "10000"))
+
+# Per-user bookmark id sets used for is_bookmarked on shared cached pages
+BOOKMARK_SET_TTL = int(os.environ.get("BOOKMARK_SET_TTL", str(24 * 60 * 60)))
+
+# In-process L1 in front of the cache for hot keys (version counters, category
+# lists, ES health); kept coherent over Redis pub/sub, off without Redis
+L1_CACHE_ENABLED = os.environ.get("L1_CACHE_ENABLED", "True").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+L1_CACHE_MAX_ENTRIES = int(os.environ.get("L1_CACHE_MAX_ENTRIES", "1024"))
+L1_CACHE_TTL = int(os.environ.get("L1_CACHE_TTL", "30"))
+L1_CACHE_CHANNEL = os.environ.get("L1_CACHE_CHANNEL", "cache:l1:invalidate")
+
 # Celery configuration
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")
 CELERY_TASK_ALWAYS_EAGER = os.environ.get(
@@ -215,6 +264,24 @@ else:
         }
     }
 
+# View-hit counter: "redis", "db" or "auto" (Redis when the cache is Redis-backed)
+VIEW_COUNTER_BACKEND = os.environ.get("VIEW_COUNTER_BACKEND", "auto").lower()
+VIEW_DEDUPE_TTL = int(os.environ.get("VIEW_DEDUPE_TTL", str(24 * 60 * 60)))
+# Daily ViewRecord partitions created ahead of time (PostgreSQL)
+VIEW_RECORD_PARTITIONS_AHEAD = int(os.environ.get("VIEW_RECORD_PARTITIONS_AHEAD", "7"))
+# Per-day view series API: default and maximum range in days
+DAILY_VIEWS_DEFAULT_DAYS = int(os.environ.get("DAILY_VIEWS_DEFAULT_DAYS", "30"))
+DAILY_VIEWS_MAX_DAYS = int(os.environ.get("DAILY_VIEWS_MAX_DAYS", "366"))
+# Trending: activity window, half-life of its weight and what a 5-star
+# vote is worth in views
+TRENDING_WINDOW_DAYS = int(os.environ.get("TRENDING_WINDOW_DAYS", "14"))
+TRENDING_HALF_LIFE_DAYS = float(os.environ.get("TRENDING_HALF_LIFE_DAYS", "3"))
+TRENDING_RATING_WEIGHT = float(os.environ.get("TRENDING_RATING_WEIGHT", "5"))
+# Admin statistics snapshots: days of history kept
+STATISTICS_SNAPSHOT_RETENTION_DAYS = int(
+    os.environ.get("STATISTICS_SNAPSHOT_RETENTION_DAYS", "90")
+)
+
 # Logging configuration
 LOGGING = {
     "version": 1,